@@ -0,0 +1,157 @@
+"""Versión asíncrona de DB/db_control.py para los endpoints async def.
+
+Cada petición recibe una sola sesión a través de la dependencia get_db y todas
+las funciones db_* que llama la comparten, de modo que la conexión se saca del
+pool una vez por petición.
+
+Con ASYNC_DB=1 la sesión es un AsyncSession sobre create_async_engine
+(aiomysql para MariaDB, aiosqlite para SQLite) y la lógica de db_control se
+ejecuta con AsyncSession.run_sync: las consultas van por el driver asíncrono y
+no se ocupa ningún hilo del pool de Starlette mientras se espera a la base de
+datos. Sin ASYNC_DB la sesión es síncrona y las funciones se ejecutan en el
+pool de hilos, igual que los antiguos endpoints síncronos.
+"""
+
+import os
+
+from starlette.concurrency import run_in_threadpool
+
+from DB import db_control
+from DB.structure import DATABASE_URL, ENGINE_OPTIONS, SessionLocal, engine
+from DB.pool_metrics import pool_metrics
+from DB.metrics import instrument_engine
+
+
+ASYNC_DB = os.environ.get("ASYNC_DB", "0") == "1"
+
+
+def async_database_url(url):
+    """Cambia el driver síncrono de la URL por su equivalente asíncrono."""
+    if url.startswith("mysql+pymysql://"):
+        return url.replace("mysql+pymysql://", "mysql+aiomysql://", 1)
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    return url
+
+
+if ASYNC_DB:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_engine = create_async_engine(
+        async_database_url(DATABASE_URL), **ENGINE_OPTIONS
+    )
+    instrument_engine(async_engine.sync_engine)
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, autoflush=False, expire_on_commit=False
+    )
+
+
+async def get_db():
+    """Dependencia de FastAPI: una sesión por petición."""
+    if ASYNC_DB:
+        async with AsyncSessionLocal() as session:
+            yield session
+        return
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def request_pool():
+    return async_engine.sync_engine.pool if ASYNC_DB else engine.pool
+
+
+def _run_sync(db, function, *args, **kwargs):
+    # la primera vez que la petición usa la sesión se mide la espera en el pool
+    if not db.in_transaction():
+        pool_metrics.timed_checkout(db)
+
+    try:
+        result = function(*args, db=db, **kwargs)
+        db.commit()
+        return result
+    except Exception as e:
+        db.rollback()  # Revertir la transacción en caso de error
+        raise e
+
+
+async def run_db(db, function, *args, **kwargs):
+    """Ejecuta una función db_* de db_control en la sesión de la petición."""
+    if not ASYNC_DB:
+        return await run_in_threadpool(_run_sync, db, function, *args, **kwargs)
+
+    return await db.run_sync(
+        lambda session: _run_sync(session, function, *args, **kwargs)
+    )
+
+
+async def db_worker_register(new_worker: dict, db):
+    return await run_db(db, db_control.db_worker_register, new_worker)
+
+
+async def db_healthcheaker_worker(worker_id, db):
+    return await run_db(db, db_control.db_healthcheaker_worker, worker_id)
+
+
+async def db_end_process(process_id, details: str = None, db=None):
+    return await run_db(db, db_control.db_end_process, process_id, details)
+
+
+async def db_matricular_proceso(worker_id, db):
+    return await run_db(db, db_control.db_matricular_proceso, worker_id)
+
+
+async def db_actualizar_task(
+    task_id, new_status_task: str, details=None, db=None, at=None
+):
+    return await run_db(
+        db, db_control.db_actualizar_task, task_id, new_status_task, details, at=at
+    )
+
+
+async def db_actualizar_tasks(updates: list, db):
+    return await run_db(db, db_control.db_actualizar_tasks, updates)
+
+
+async def db_dashboard_task(task_id, db, history=False):
+    return await run_db(db, db_control.db_dashboard_task, task_id, history=history)
+
+
+def _dashboard_response(respond, build, worker_id=None, process_id=None, db=None):
+    version = db_control.db_dashboard_version(
+        worker_id=worker_id, process_id=process_id, db=db
+    )
+    return respond(version, lambda: build(db))
+
+
+async def db_dashboard_response(db, respond, build, worker_id=None, process_id=None):
+    """Respuesta de un dashboard según su versión, en una sola transacción.
+
+    respond(version, load) devuelve la respuesta (304, la de la caché o una
+    nueva) y solo llama a load si la necesita; load ejecuta build(db) en la
+    misma sesión. Versión y datos van en el mismo run_db, así que la petición
+    saca una sola conexión del pool.
+    """
+    return await run_db(
+        db,
+        _dashboard_response,
+        respond,
+        build,
+        worker_id=worker_id,
+        process_id=process_id,
+    )
+
+
+async def db_changes(db, since=None, limit=None):
+    return await run_db(db, db_control.db_changes, since=since, limit=limit)
+
+
+async def db_stats_timeseries(db, **filters):
+    return await run_db(db, db_control.db_stats_timeseries, **filters)
+
+
+async def db_stats_percentiles(db, **filters):
+    return await run_db(db, db_control.db_stats_percentiles, **filters)
@@ -0,0 +1,148 @@
+from sqlalchemy import and_, delete, insert, literal, or_, select, union_all
+
+from DB.pagination import keyset_after
+from DB.crud_changes import next_seq
+from DB.structure import (
+    Process,
+    HistoryTask,
+    Worker,
+    TaskDetail,
+    ProcessError,
+    processes_archive,
+    history_tasks_archive,
+    task_details_archive,
+    process_errors_archive,
+    with_session,
+)
+
+
+def with_archive(model, archive):
+    """Subconsulta con las filas de la tabla principal y las de su archivo.
+
+    Tiene las mismas columnas que la tabla, así que se usa en su lugar cuando
+    se piden datos históricos (history=true).
+    """
+    names = [column.name for column in model.__table__.columns]
+    return union_all(
+        select(*[model.__table__.c[name] for name in names]),
+        select(*[archive.c[name] for name in names]),
+    ).subquery(f"{model.__tablename__}_all")
+
+
+def processes_with_archive():
+    return with_archive(Process, processes_archive)
+
+
+def history_tasks_with_archive():
+    return with_archive(HistoryTask, history_tasks_archive)
+
+
+@with_session
+def get_archived_process(process_id, db=None):
+    query = select(processes_archive).where(processes_archive.c.father == process_id)
+    return db.execute(query).first()
+
+
+@with_session
+def get_archived_task(task_id, db=None):
+    query = select(history_tasks_archive).where(history_tasks_archive.c.uuid == task_id)
+    return db.execute(query).first()
+
+
+@with_session
+def get_archived_task_details(task_id, db=None):
+    query = select(task_details_archive.c.details).where(
+        task_details_archive.c.uuid == task_id
+    )
+    return db.execute(query).scalar()
+
+
+@with_session
+def get_keep_boundaries(keep_per_worker, db=None):
+    """(created, father) del proceso número keep_per_worker de cada worker que llega a él.
+
+    Los procesos del worker posteriores a esa fila (del más reciente al más
+    antiguo) quedan fuera de la política. Es una lectura por worker sobre el
+    índice (process, created, father); la retención la hace una vez por
+    ronda, no en cada lote.
+    """
+    boundaries = {}
+    for worker_id in db.execute(select(Worker.id)).scalars():
+        query = (
+            select(Process.created, Process.father)
+            .where(Process.process == worker_id)
+            .order_by(Process.created.desc(), Process.father.desc())
+            .offset(keep_per_worker - 1)
+            .limit(1)
+        )
+        row = db.execute(query).first()
+        if row is not None:
+            boundaries[worker_id] = tuple(row)
+    return boundaries
+
+
+@with_session
+def get_archive_candidates(cutoff=None, keep_boundaries=None, limit=500, db=None):
+    """Procesos terminados que la política de retención saca de las tablas principales.
+
+    Un proceso terminado se archiva si terminó antes de cutoff o si en su
+    worker va después de la fila de keep_boundaries (ver get_keep_boundaries).
+    Los procesos en curso nunca se archivan.
+    """
+    conditions = [
+        and_(
+            Process.process == worker_id,
+            keyset_after([Process.created, Process.father], boundary, descending=True),
+        )
+        for worker_id, boundary in (keep_boundaries or {}).items()
+    ]
+    if cutoff:
+        conditions.append(Process.finished < cutoff)
+    if not conditions:
+        return []
+
+    query = select(Process.father).where(Process.finished.isnot(None), or_(*conditions))
+    return db.execute(query.limit(limit)).scalars().all()
+
+
+def archive_processes(process_ids, archived, db, seq):
+    """Copia los procesos y sus tareas a las tablas de archivo y los borra de las principales.
+
+    Los detalles de las tareas y el error de los procesos (task_details y
+    process_errors) se mueven con ellos. Los procesos deben estar ya
+    bloqueados (lock_processes); en el archivo llevan el seq del lote, así
+    /changes los devuelve en "archived". Devuelve los workers afectados.
+    """
+    worker_ids = (
+        db.execute(
+            select(Process.process).where(Process.father.in_(process_ids)).distinct()
+        )
+        .scalars()
+        .all()
+    )
+    tasks_with_details = select(HistoryTask.uuid).where(
+        HistoryTask.father.in_(process_ids), HistoryTask.has_details
+    )
+    moves = [
+        (Process, processes_archive, Process.father.in_(process_ids)),
+        (HistoryTask, history_tasks_archive, HistoryTask.father.in_(process_ids)),
+        (TaskDetail, task_details_archive, TaskDetail.uuid.in_(tasks_with_details)),
+        (ProcessError, process_errors_archive, ProcessError.father.in_(process_ids)),
+    ]
+    for model, archive, condition in moves:
+        names = [column.name for column in model.__table__.columns]
+        values = [model.__table__.c[name] for name in names]
+        if model is Process:
+            values[names.index("seq")] = next_seq(Process.seq, seq)
+        db.execute(
+            insert(archive).from_select(
+                names + ["archived"],
+                select(*values, literal(archived)).where(condition),
+            )
+        )
+
+    # al revés: los detalles antes que las tareas que los buscan y las tareas
+    # antes que los procesos, a los que apuntan por processes.father
+    for model, archive, condition in reversed(moves):
+        db.execute(delete(model).where(condition))
+    return worker_ids
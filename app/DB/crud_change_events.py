@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, delete, insert, or_, select
+
+from DB.crud_changes import change_seq
+from DB.structure import ChangeEvent, generate_datetime, with_session
+
+
+def json_ready(row: dict):
+    """Convierte fechas y duraciones de una fila del dashboard a tipos JSON."""
+    ready = {}
+    for key, value in row.items():
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, timedelta):
+            value = value.total_seconds()
+        ready[key] = value
+    return ready
+
+
+def create_change_event(kind, entity_id, payload, db, worker_id=None, process_id=None):
+    db.execute(
+        insert(ChangeEvent).values(
+            created=generate_datetime(),
+            kind=kind,
+            entity_id=entity_id,
+            worker_id=worker_id,
+            process_id=process_id,
+            payload=json_ready(payload),
+            seq=change_seq(db),
+        )
+    )
+
+
+@with_session
+def get_change_events_after(
+    seq, last_id=0, worker_id=None, process_id=None, limit=500, db=None
+):
+    """Eventos posteriores a (seq, last_id) en orden de (seq, id).
+
+    El id solo desempata los eventos de una misma transacción, que comparten
+    seq, para poder leerlos por lotes.
+    """
+    query = select(ChangeEvent).where(
+        or_(
+            ChangeEvent.seq > seq,
+            and_(ChangeEvent.seq == seq, ChangeEvent.id > last_id),
+        )
+    )
+    if worker_id:
+        query = query.where(ChangeEvent.worker_id == worker_id)
+    if process_id:
+        query = query.where(ChangeEvent.process_id == process_id)
+
+    query = query.order_by(ChangeEvent.seq, ChangeEvent.id).limit(limit)
+    return db.execute(query).scalars().all()
+
+
+@with_session
+def get_change_event_seqs_after(seq, db=None):
+    """{id: seq} de los eventos con seq posterior a seq."""
+    query = select(ChangeEvent.id, ChangeEvent.seq).where(ChangeEvent.seq > seq)
+    return dict(db.execute(query).all())
+
+
+@with_session
+def delete_change_events_before(created, db=None):
+    return db.execute(delete(ChangeEvent).where(ChangeEvent.created < created)).rowcount
+
+
+def prune_change_events(seconds):
+    """Borra los eventos de hace más de seconds segundos; devuelve cuántos."""
+    return delete_change_events_before(generate_datetime() - timedelta(seconds=seconds))
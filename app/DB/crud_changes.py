@@ -0,0 +1,237 @@
+"""Secuencia de cambios para sincronizar los dashboards de forma incremental.
+
+Cada transacción de db_control que modifica workers, procesos o tareas
+escribe su seq (change_seq) en la columna seq de las filas que cambia:
+worker_summaries (la fila del worker en el dashboard), processes e
+history_tasks. /changes?since=<seq> devuelve las filas con seq > since usando
+los índices sobre seq.
+
+El seq es la hora (en microsegundos desde 1970) a la que la transacción lo
+pide por primera vez, después de bloquear las filas que va a cambiar. No hay
+contador compartido: cada escritura lo pone en los mismos UPDATE e INSERT que
+ya hace (next_seq), sin bloquear nada más ni sentencias de más.
+
+Una transacción se confirma un poco después de tomar su seq, así que una fila
+con un seq menor puede hacerse visible después de otra con uno mayor ya
+leída. Por eso /changes, cuando no quedan más páginas, no devuelve como
+siguiente since nada posterior a changes_horizon(): CHANGES_LOOKBACK segundos
+antes de ahora. Las filas de esos últimos segundos se vuelven a enviar en la
+siguiente consulta (son la fila entera, así que aplicarlas dos veces no
+cambia nada) y las que se confirmen tarde dentro de esa ventana no se
+pierden.
+
+Límites:
+
+- Una transacción que tarda más de CHANGES_LOOKBACK segundos entre tomar su
+  seq y confirmar, o un servidor de la API con el reloj adelantado más que
+  eso, puede dejar filas que un cliente al día ya no ve. next_seq hace que el
+  seq de una fila nunca baje, así que la versión de los dashboards (ETag)
+  cambia igualmente.
+- Las filas que salen de las tablas solo se ven si dejan un seq: la retención
+  marca con el suyo los procesos que archiva (processes_archive.seq) y
+  /changes los devuelve en "archived", con sus tareas incluidas.
+  `manage.py rebuild-summaries` marca todos los workers y procesos con un
+  mismo seq (stamp_all_summaries). Lo que se borra o corrige a mano no deja
+  seq y los clientes tienen que recargar los dashboards.
+"""
+
+import os
+import time
+
+from sqlalchemy import and_, case, func, select, update
+
+from DB.structure import (
+    HistoryTask,
+    Process,
+    Worker,
+    WorkerSummary,
+    processes_archive,
+    with_session,
+)
+
+
+CHANGES_LOOKBACK = float(os.environ.get("CHANGES_LOOKBACK", 5))  # segundos
+
+SEQ_COLUMNS = (WorkerSummary.seq, Process.seq, HistoryTask.seq, processes_archive.c.seq)
+
+
+def now_seq():
+    return time.time_ns() // 1000
+
+
+def changes_horizon():
+    """seq por debajo del cual ya no queda ninguna transacción sin confirmar."""
+    return now_seq() - int(CHANGES_LOOKBACK * 1_000_000)
+
+
+def change_seq(db):
+    """seq de la transacción en curso de db: la hora de la primera llamada."""
+    transaction = db.get_transaction()
+    cached = db.info.get("change_seq")
+    if cached and cached[0] is transaction:
+        return cached[1]
+
+    seq = now_seq()
+    db.info["change_seq"] = (transaction, seq)
+    return seq
+
+
+def next_seq(column, seq):
+    """Valor de la columna seq para un UPDATE: seq, o el actual + 1 si ya es mayor.
+
+    Así el seq de una fila nunca baja aunque el reloj de otro servidor de la
+    API vaya por delante.
+    """
+    return case((column > seq, column + 1), else_=seq)
+
+
+def stamp(row, seq):
+    # fila cargada en la sesión: el seq se escribe con el UPDATE de su flush
+    row.seq = next_seq(type(row).seq, seq)
+
+
+def stamp_all_summaries(db):
+    """Marca con el seq de la transacción todas las filas de worker_summaries y processes.
+
+    Para después de recalcular los contadores, que ya bloquea todas esas filas.
+    """
+    seq = change_seq(db)
+    for table in (WorkerSummary.__table__, Process.__table__):
+        db.execute(update(table).values(seq=next_seq(table.c.seq, seq)))
+    return seq
+
+
+@with_session
+def get_change_seq(db=None):
+    """Último seq escrito en cualquier fila (0 si aún no ha habido cambios).
+
+    Un máximo por índice de cada tabla con seq, en una sola consulta.
+    """
+    latest = db.execute(
+        select(*[select(func.max(column)).scalar_subquery() for column in SEQ_COLUMNS])
+    ).one()
+    return max(seq or 0 for seq in latest)
+
+
+@with_session
+def get_scope_seq(worker_id=None, process_id=None, db=None):
+    """Último seq de las filas de un proceso, de un worker y sus procesos, o de todo.
+
+    Cada escritura lo cambia en su transacción, haya o no change_events.
+    Una transacción que se confirma tarde con un seq menor no lo cambia: la
+    versión de los dashboards cambia también con el tiempo (ver
+    response_cache.py).
+    """
+    if process_id:
+        return (
+            db.execute(select(Process.seq).where(Process.father == process_id)).scalar()
+            or 0
+        )
+    if not worker_id:
+        return get_change_seq(db=db)
+
+    # los procesos del worker (índice (process, seq)) y su fila de resumen
+    processes, summary = db.execute(
+        select(
+            select(func.max(Process.seq))
+            .where(Process.process == worker_id)
+            .scalar_subquery(),
+            select(WorkerSummary.seq)
+            .where(WorkerSummary.worker_id == worker_id)
+            .scalar_subquery(),
+        )
+    ).one()
+    return max(processes or 0, summary or 0)
+
+
+def seq_range(column, since, upto):
+    condition = column > since
+    return condition if upto is None else and_(condition, column <= upto)
+
+
+@with_session
+def get_changes_bound(since, limit, db=None):
+    """Primer seq que ya no cabe en una página de limit filas por tabla.
+
+    Por cada tabla se lee (en su índice) el seq de la fila limit + 1 después de
+    since; la página acaba antes del menor. None si todo lo pendiente cabe.
+    """
+    bounds = []
+    for column in SEQ_COLUMNS:
+        query = (
+            select(column).where(column > since).order_by(column).offset(limit).limit(1)
+        )
+        bound = db.execute(query).scalar()
+        if bound is not None:
+            bounds.append(bound)
+    return min(bounds) if bounds else None
+
+
+@with_session
+def get_changed_workers(since, upto=None, db=None):
+    """Workers con seq en (since, upto], con las columnas de get_worker_summaries."""
+    query = (
+        select(
+            Worker.id,
+            Worker.last_healthcheker,
+            Worker.status,
+            WorkerSummary.processed,
+            WorkerSummary.running,
+            WorkerSummary.success,
+            WorkerSummary.error,
+            WorkerSummary.duration_sum,
+            WorkerSummary.duration_count,
+            WorkerSummary.seq,
+        )
+        .join(WorkerSummary, WorkerSummary.worker_id == Worker.id)
+        .where(seq_range(WorkerSummary.seq, since, upto))
+        .order_by(WorkerSummary.seq)
+    )
+    return db.execute(query).all()
+
+
+@with_session
+def get_changed_processes(since, upto=None, db=None):
+    """Procesos con seq en (since, upto], con su resumen y el nombre del worker."""
+    query = (
+        select(
+            Process.father,
+            Process.process,
+            Process.tasks_total,
+            Process.tasks_updated,
+            Process.tasks_finished,
+            Process.step,
+            Process.step_status,
+            Process.last_update,
+            Process.seq,
+            Worker.nombre,
+        )
+        .join(Worker, Worker.id == Process.process)
+        .where(seq_range(Process.seq, since, upto), Process.tasks_total > 0)
+        .order_by(Process.seq)
+    )
+    return db.execute(query).all()
+
+
+@with_session
+def get_changed_tasks(since, upto=None, db=None):
+    """Tareas con seq en (since, upto], con tasks_total del proceso (sin los detalles)."""
+    query = (
+        select(HistoryTask.__table__, Process.tasks_total)
+        .join(Process, Process.father == HistoryTask.father)
+        .where(seq_range(HistoryTask.seq, since, upto))
+        .order_by(HistoryTask.seq)
+    )
+    return db.execute(query).all()
+
+
+@with_session
+def get_archived_changes(since, upto=None, db=None):
+    """Procesos archivados con seq en (since, upto]: id, worker y seq."""
+    archive = processes_archive.c
+    query = (
+        select(archive.father, archive.process, archive.seq)
+        .where(seq_range(archive.seq, since, upto))
+        .order_by(archive.seq)
+    )
+    return db.execute(query).all()
@@ -0,0 +1,38 @@
+from sqlalchemy import delete
+
+from DB.structure import TaskDetail, ProcessError, with_session
+
+
+@with_session
+def get_task_details(task_id, db=None):
+    detail = db.get(TaskDetail, task_id)
+    return detail.details if detail else None
+
+
+@with_session
+def set_task_details(task_id, details, db=None):
+    # merge: INSERT o UPDATE según exista ya la fila
+    db.merge(TaskDetail(uuid=task_id, details=details))
+    db.flush()
+
+
+@with_session
+def delete_task_details(task_id, db=None):
+    db.execute(delete(TaskDetail).where(TaskDetail.uuid == task_id))
+
+
+@with_session
+def get_process_error(process_id, db=None):
+    error = db.get(ProcessError, process_id)
+    return error.error if error else None
+
+
+@with_session
+def set_process_error(process_id, error, db=None):
+    db.merge(ProcessError(father=process_id, error=error))
+    db.flush()
+
+
+@with_session
+def delete_process_error(process_id, db=None):
+    db.execute(delete(ProcessError).where(ProcessError.father == process_id))
@@ -1,6 +1,12 @@
-from DB.structure import HistoryTask, get_session
+from sqlalchemy import select
 
+from DB.structure import HistoryTask, with_session
+from DB.crud_details import set_task_details
+from DB.pagination import keyset_after
+from DB.crud_archive import history_tasks_with_archive
 
+
+@with_session
 def create_history_task(
     uuid,
     name,
@@ -12,70 +18,112 @@ def create_history_task(
     update,
     father,
     details=None,
+    db=None,
 ):
-    with get_session() as db:
-        try:
-            nueva_tarea = HistoryTask(
-                uuid=uuid,
-                name=name,
-                status=status,
-                order=order,
-                version=version,
-                create=create,
-                started=started,
-                update=update,
-                father=father,
-                details=details,
-            )
-            db.add(nueva_tarea)
-            db.commit()
-            db.refresh(nueva_tarea)
-            return nueva_tarea
-        except Exception as e:
-            db.rollback()  # Revertir la transacción en caso de error
-            raise e
-
-
-def get_history_tasks():
-    with get_session() as db:
-        try:
-            return db.query(HistoryTask).all()
-        except Exception as e:
-            db.rollback()  # Revertir la transacción en caso de error
-            raise e
-
-
-def get_history_tasks_by_father(father_id):
-    with get_session() as db:
-        try:
-            return db.query(HistoryTask).filter_by(father=father_id).all()
-        except Exception as e:
-            db.rollback()  # Revertir la transacción en caso de error
-            raise e
-
-
-def update_history_task(task_id, **kwargs):
-    with get_session() as db:
-        try:
-            task = db.query(HistoryTask).filter(HistoryTask.uuid == task_id).first()
-            if task:
-                for key, value in kwargs.items():
-                    setattr(task, key, value)
-                db.commit()
-                db.refresh(task)
-            return task
-        except Exception as e:
-            db.rollback()  # Revertir la transacción en caso de error
-            raise e
-
-
-def delete_history_task(task_id):
-    with get_session() as db:
-        try:
-            task = db.query(HistoryTask).filter(HistoryTask.uuid == task_id).first()
-            if task:
-                db.delete(task)
-                db.commit()
-        except Exception as e:
-            db.rollback()  # Revertir la transacción en caso de error
-            raise e
+    nueva_tarea = HistoryTask(
+        uuid=uuid,
+        name=name,
+        status=status,
+        order=order,
+        version=version,
+        create=create,
+        started=started,
+        update=update,
+        father=father,
+        has_details=details is not None,
+    )
+    db.add(nueva_tarea)
+    db.flush()
+    if details is not None:
+        set_task_details(uuid, details, db=db)
+    return nueva_tarea
+
+
+@with_session
+def get_history_tasks(db=None):
+    return db.query(HistoryTask).all()
+
+
+@with_session
+def get_history_tasks_by_father(father_id, db=None):
+    return db.query(HistoryTask).filter_by(father=father_id).all()
+
+
+@with_session
+def get_history_tasks_page(
+    father_id,
+    status=None,
+    since=None,
+    until=None,
+    after=None,
+    limit=None,
+    history=False,
+    db=None,
+):
+    """Tareas de un proceso por (order, uuid), con los mismos filtros que los procesos.
+
+    since/until filtran por create y after = (order, uuid) continúa después de
+    esa tarea. Con limit se devuelve una fila más para saber si hay otra página.
+    Con history se buscan también en las tareas archivadas. Los detalles
+    (comprimidos en task_details) no se leen: has_details dice si la tarea los
+    tiene y se piden de una en una (db_dashboard_task).
+    """
+    source = history_tasks_with_archive() if history else HistoryTask.__table__
+    task = source.c
+
+    query = select(source).where(task.father == father_id)
+
+    if status:
+        query = query.where(task.status == status)
+    if since:
+        query = query.where(task.create >= since)
+    if until:
+        query = query.where(task.create < until)
+    if after:
+        query = query.where(keyset_after([task.order, task.uuid], after))
+
+    query = query.order_by(task.order, task.uuid)
+    if limit:
+        query = query.limit(limit + 1)
+
+    return db.execute(query).all()
+
+
+@with_session
+def get_task_fathers(task_ids, db=None):
+    # el proceso de cada tarea; no cambia nunca, así que se lee sin bloquear
+    if not task_ids:
+        return {}
+    query = select(HistoryTask.uuid, HistoryTask.father).where(
+        HistoryTask.uuid.in_(task_ids)
+    )
+    return dict(db.execute(query).all())
+
+
+@with_session
+def get_history_task_by_id(task_id, db=None, for_update=False):
+    if for_update:
+        # bloquea la fila y la vuelve a leer aunque ya esté en la sesión
+        return db.get(
+            HistoryTask, task_id, with_for_update=True, populate_existing=True
+        )
+    return db.get(HistoryTask, task_id)
+
+
+@with_session
+def update_history_task(task_id, db=None, **kwargs):
+    # db.get reutiliza la tarea si ya está cargada en la sesión
+    task = db.get(HistoryTask, task_id)
+    if task:
+        for key, value in kwargs.items():
+            setattr(task, key, value)
+        db.flush()
+    return task
+
+
+@with_session
+def delete_history_task(task_id, db=None):
+    task = db.get(HistoryTask, task_id)
+    if task:
+        db.delete(task)
+        db.flush()
@@ -1,65 +1,323 @@
-from DB.structure import Process, get_session
-
-
-def create_process(father, process, created, finished, status):
-    with get_session() as db:
-        try:
-            nuevo_process = Process(
-                father=father,
-                process=process,
-                created=created,
-                finished=finished,
-                status=status,
+from sqlalchemy import and_, bindparam, case, func, insert, select, update
+
+from DB.structure import Process, HistoryTask, with_session
+from DB.pagination import keyset_after
+from DB.crud_archive import processes_with_archive
+from DB.crud_changes import next_seq, stamp
+
+
+@with_session
+def create_process(father, process, created, finished, status, db=None):
+    nuevo_process = Process(
+        father=father,
+        process=process,
+        created=created,
+        finished=finished,
+        status=status,
+    )
+    db.add(nuevo_process)
+    db.flush()
+    return nuevo_process
+
+
+@with_session
+def create_process_with_tasks(
+    father, process, created, finished, status, tasks, db=None, seq=0
+):
+    """Crea el proceso y todas sus tareas en una sola transacción.
+
+    Las tareas se insertan con un único INSERT multi-fila, sin el refresh por
+    fila que hace create_history_task. El resumen de tareas del proceso se
+    inicializa con la primera tarea (por orden) como paso actual. El proceso
+    y las tareas llevan el seq de /changes.
+    """
+    first_task = min(tasks, key=lambda task: task["order"]) if tasks else None
+
+    values = dict(
+        father=father,
+        process=process,
+        created=created,
+        finished=finished,
+        status=status,
+        tasks_total=len(tasks),
+        tasks_updated=0,
+        tasks_finished=0,
+        step=first_task["name"] if first_task else None,
+        step_order=first_task["order"] if first_task else None,
+        step_status=first_task["status"] if first_task else None,
+        last_update=None,
+        seq=seq,
+    )
+
+    db.execute(insert(Process).values(**values))
+    if tasks:
+        db.execute(insert(HistoryTask).values([{**task, "seq": seq} for task in tasks]))
+
+    # copia (no ligada a la sesión) de la fila insertada, sin volver a leerla
+    return Process(**values)
+
+
+@with_session
+def get_processes(db=None):
+    return db.query(Process).all()
+
+
+@with_session
+def get_process_by_worker(worker_id, db=None):
+    return db.query(Process).filter_by(process=worker_id).all()
+
+
+@with_session
+def get_process_by_id(process_id, db=None, for_update=False):
+    query = db.query(Process).filter(Process.father == process_id)
+    if for_update:
+        # bloquea la fila para que los contadores no se pisen entre peticiones
+        query = query.with_for_update()
+    return query.first()
+
+
+@with_session
+def get_process_dashboard_by_worker(
+    worker_id,
+    status=None,
+    since=None,
+    until=None,
+    after=None,
+    limit=None,
+    history=False,
+    db=None,
+):
+    """Procesos de un worker con su resumen de tareas, leído de la propia fila.
+
+    Del más reciente al más antiguo por (created, father). status filtra por el
+    estado que muestra el dashboard (step_status), since/until por created y
+    after = (created, father) continúa después de esa fila. Con limit se
+    devuelve una fila más para saber si hay otra página. Con history se
+    incluyen los procesos archivados.
+    """
+    source = processes_with_archive() if history else Process.__table__
+    process = source.c
+
+    query = select(
+        process.father,
+        process.created,
+        process.tasks_total,
+        process.tasks_updated,
+        process.tasks_finished,
+        process.step,
+        process.step_status,
+        process.last_update,
+    ).where(process.process == worker_id, process.tasks_total > 0)
+
+    if status:
+        query = query.where(process.step_status == status)
+    if since:
+        query = query.where(process.created >= since)
+    if until:
+        query = query.where(process.created < until)
+    if after:
+        query = query.where(
+            keyset_after([process.created, process.father], after, descending=True)
+        )
+
+    query = query.order_by(process.created.desc(), process.father.desc())
+    if limit:
+        query = query.limit(limit + 1)
+
+    return db.execute(query).all()
+
+
+def task_summaries_query(*where):
+    """Consulta que calcula el resumen de tareas de los procesos filtrados.
+
+    Por proceso devuelve la última tarea actualizada (o la primera por orden si
+    ninguna se ha actualizado) con su name, order, status y update, y los
+    conteos total, updated (con update) y finished (con update y status
+    distinto de "running"). Es la referencia para reconstruir los contadores.
+    """
+    partition = HistoryTask.father
+    is_updated = HistoryTask.update.isnot(None)
+
+    ranked = (
+        select(
+            Process.father,
+            Process.created,
+            HistoryTask.name,
+            HistoryTask.order,
+            HistoryTask.status,
+            HistoryTask.update,
+            func.row_number()
+            .over(
+                partition_by=partition,
+                # update más reciente primero; empates y tareas sin update por orden
+                order_by=(
+                    HistoryTask.update.is_(None),
+                    HistoryTask.update.desc(),
+                    HistoryTask.order,
+                ),
+            )
+            .label("position"),
+            func.count().over(partition_by=partition).label("total"),
+            func.sum(case((is_updated, 1), else_=0))
+            .over(partition_by=partition)
+            .label("updated"),
+            func.sum(
+                case((and_(is_updated, HistoryTask.status != "running"), 1), else_=0)
             )
-            db.add(nuevo_process)
-            db.commit()
-            db.refresh(nuevo_process)
-            return nuevo_process
-        except Exception as e:
-            db.rollback()  # Revertir la transacción en caso de error
-            raise e
-
-
-def get_processes():
-    with get_session() as db:
-        try:
-            return db.query(Process).all()
-        except Exception as e:
-            db.rollback()  # Revertir la transacción en caso de error
-            raise e
-
-
-def get_process_by_worker(worker_id):
-    with get_session() as db:
-        try:
-            return db.query(Process).filter_by(process=worker_id).all()
-        except Exception as e:
-            db.rollback()  # Revertir la transacción en caso de error
-            raise e
-
-
-def update_process(process_id, **kwargs):
-    with get_session() as db:
-        try:
-            process = db.query(Process).filter(Process.father == process_id).first()
-            if process:
-                for key, value in kwargs.items():
-                    setattr(process, key, value)
-                db.commit()
-                db.refresh(process)
-            return process
-        except Exception as e:
-            db.rollback()  # Revertir la transacción en caso de error
-            raise e
-
-
-def delete_process(process_id):
-    with get_session() as db:
-        try:
-            process = db.query(Process).filter(Process.father == process_id).first()
-            if process:
-                db.delete(process)
-                db.commit()
-        except Exception as e:
-            db.rollback()  # Revertir la transacción en caso de error
-            raise e
+            .over(partition_by=partition)
+            .label("finished"),
+        )
+        .join(HistoryTask, HistoryTask.father == Process.father)
+        .where(*where)
+        .subquery()
+    )
+
+    return (
+        select(ranked)
+        .where(ranked.c.position == 1)
+        .order_by(ranked.c.created, ranked.c.father)
+    )
+
+
+def lock_processes(process_ids, db):
+    """Bloquea los procesos (SELECT ... FOR UPDATE, por father) y los devuelve por id.
+
+    Los procesos se bloquean antes que sus tareas en todas las transacciones
+    que cambian los dos (db_actualizar_task y la retención); con el mismo
+    orden una no espera a la otra mientras la otra la espera a ella.
+    """
+    if not process_ids:
+        return {}
+
+    query = (
+        select(Process)
+        .where(Process.father.in_(sorted(set(process_ids))))
+        .order_by(Process.father)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )
+    return {process.father: process for process in db.execute(query).scalars()}
+
+
+def apply_task_to_process_summary(
+    db, process, task, previous_status, previous_update, seq
+):
+    """Actualiza el resumen del proceso tras un cambio de estado de una tarea.
+
+    Debe llamarse en la misma transacción que el cambio de la tarea, con el
+    proceso bloqueado (lock_processes) y los valores de status y update
+    anteriores de la tarea. El mismo UPDATE escribe el seq de /changes.
+    """
+    if not process:
+        return None
+
+    was_finished = previous_update is not None and previous_status != "running"
+    is_finished = task.update is not None and task.status != "running"
+
+    if previous_update is None and task.update is not None:
+        process.tasks_updated = (process.tasks_updated or 0) + 1
+    process.tasks_finished = (
+        (process.tasks_finished or 0) + int(is_finished) - int(was_finished)
+    )
+
+    # el paso actual es la tarea con el update más reciente (empates: menor orden)
+    is_current_step = process.step_order == task.order
+    is_newer = (
+        process.last_update is None
+        or task.update > process.last_update
+        or (task.update == process.last_update and task.order < process.step_order)
+    )
+    if task.update is not None and (is_current_step or is_newer):
+        process.step = task.name
+        process.step_order = task.order
+        process.step_status = task.status
+        process.last_update = task.update
+
+    stamp(process, seq)
+    db.flush()
+    return process
+
+
+def rebuild_process_summaries(db, batch_size=1000):
+    """Recalcula el resumen de tareas de todos los procesos desde history_tasks.
+
+    Acepta una Session o una Connection; recorre los procesos en lotes por
+    father y no hace commit.
+    """
+    table = Process.__table__
+    statement = (
+        table.update()
+        .where(table.c.father == bindparam("b_father"))
+        .values(
+            tasks_total=bindparam("b_total"),
+            tasks_updated=bindparam("b_updated"),
+            tasks_finished=bindparam("b_finished"),
+            step=bindparam("b_step"),
+            step_order=bindparam("b_order"),
+            step_status=bindparam("b_status"),
+            last_update=bindparam("b_update"),
+        )
+    )
+
+    last_father = None
+    rebuilt = 0
+    while True:
+        query = select(Process.father).order_by(Process.father).limit(batch_size)
+        if last_father is not None:
+            query = query.where(Process.father > last_father)
+        fathers = db.execute(query).scalars().all()
+        if not fathers:
+            return rebuilt
+
+        summaries = {
+            row.father: row
+            for row in db.execute(task_summaries_query(Process.father.in_(fathers)))
+        }
+
+        rows = []
+        for father in fathers:
+            row = summaries.get(father)
+            rows.append(
+                {
+                    "b_father": father,
+                    "b_total": int(row.total) if row else 0,
+                    "b_updated": int(row.updated) if row else 0,
+                    "b_finished": int(row.finished) if row else 0,
+                    "b_step": row.name if row else None,
+                    "b_order": row.order if row else None,
+                    "b_status": row.status if row else None,
+                    "b_update": row.update if row else None,
+                }
+            )
+        db.execute(statement, rows)
+
+        rebuilt += len(fathers)
+        last_father = fathers[-1]
+
+
+@with_session
+def update_process(process_id, db=None, **kwargs):
+    process = db.query(Process).filter(Process.father == process_id).first()
+    if process:
+        for key, value in kwargs.items():
+            setattr(process, key, value)
+        db.flush()
+    return process
+
+
+@with_session
+def delete_process(process_id, db=None):
+    process = db.query(Process).filter(Process.father == process_id).first()
+    if process:
+        db.delete(process)
+        db.flush()
+
+
+def set_processes_status(worker_ids, previous_status, status, db, seq):
+    """Cambia de previous_status a status los procesos de esos workers."""
+    query = (
+        update(Process)
+        .where(Process.process.in_(worker_ids), Process.status == previous_status)
+        .values(status=status, seq=next_seq(Process.seq, seq))
+    )
+    return db.execute(query).rowcount
@@ -0,0 +1,231 @@
+"""Series temporales preagregadas de tareas y procesos (/stats/timeseries).
+
+La tabla stats_rollups tiene un cubo por minuto y otro por hora para cada
+worker y nombre de tarea (kind="task") y para los procesos de cada worker
+(kind="process", name=""). Cada cubo cuenta cuántos empezaron, cuántos
+terminaron bien o con error y la suma de sus duraciones (de started a update
+en las tareas, de created a finished en los procesos).
+
+db_control los actualiza en la misma transacción que cada cambio de estado,
+con un solo INSERT ... ON DUPLICATE KEY UPDATE (ON CONFLICT en SQLite) que
+suma a los dos cubos a la vez. Una tarea o un proceso que vuelve a terminar
+sin empezar de nuevo resta su resultado anterior. Un reintento ("start" tras
+terminar) cuenta como una ejecución más; sin reintentos los cubos coinciden
+con lo que se recalcula desde las tablas (rebuild_stats_rollups).
+"""
+
+from datetime import timedelta
+
+from sqlalchemy import case, delete, func, insert, literal, select
+
+from DB.structure import (
+    StatsRollup,
+    hour_start,
+    milliseconds_between,
+    minute_start,
+    is_mysql,
+    with_session,
+)
+from DB.crud_archive import history_tasks_with_archive, processes_with_archive
+
+
+RESOLUTIONS = {"minute": timedelta(minutes=1), "hour": timedelta(hours=1)}
+FINISHED_STATES = ["success", "error"]
+COUNTERS = ["started", "succeeded", "failed", "duration_ms", "duration_count"]
+KEY = ["resolution", "bucket", "worker_id", "kind", "name"]
+
+
+def bucket_start(moment, resolution):
+    if resolution == "minute":
+        return moment.replace(second=0, microsecond=0)
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def duration_milliseconds(started, finished):
+    return round((finished - started).total_seconds() * 1000)
+
+
+def started_change(worker_id, kind, name, version, started):
+    return (worker_id, kind, name, version, started, {"started": 1})
+
+
+def finished_change(worker_id, kind, name, version, status, started, finished, sign=1):
+    """Un final con status (success o error) en finished; sign=-1 lo deshace.
+
+    version no cuenta en los cubos; la usan los cuantiles (ver crud_sketches.py).
+    """
+    deltas = {"succeeded" if status == "success" else "failed": sign}
+    if started is not None:
+        deltas["duration_ms"] = sign * duration_milliseconds(started, finished)
+        deltas["duration_count"] = sign
+    return (worker_id, kind, name, version, finished, deltas)
+
+
+def upsert_counters(table, rows, key, counters):
+    """INSERT de rows que, si la clave ya existe, suma los contadores a la fila."""
+    if is_mysql:
+        from sqlalchemy.dialects.mysql import insert
+
+        statement = insert(table).values(rows)
+        return statement.on_duplicate_key_update(
+            {name: table.c[name] + statement.inserted[name] for name in counters}
+        )
+
+    from sqlalchemy.dialects.sqlite import insert
+
+    statement = insert(table).values(rows)
+    return statement.on_conflict_do_update(
+        index_elements=key,
+        set_={name: table.c[name] + statement.excluded[name] for name in counters},
+    )
+
+
+def add_to_rollups(db, changes):
+    """Suma los cambios (de started_change / finished_change) a sus cubos.
+
+    Los que caen en el mismo cubo se juntan antes; todo va en una sentencia.
+    """
+    rows = {}
+    for worker_id, kind, name, _, moment, deltas in changes:
+        for resolution in RESOLUTIONS:
+            key = (resolution, bucket_start(moment, resolution), worker_id, kind, name)
+            row = rows.setdefault(key, dict.fromkeys(COUNTERS, 0))
+            for counter, delta in deltas.items():
+                row[counter] += delta
+
+    if rows:
+        db.execute(
+            upsert_counters(
+                StatsRollup.__table__,
+                [{**dict(zip(KEY, key)), **row} for key, row in rows.items()],
+                KEY,
+                COUNTERS,
+            )
+        )
+
+
+@with_session
+def get_rollup_series(
+    resolution, since, until, worker_id=None, kind="task", name=None, by=(), db=None
+):
+    """Cubos de [since, until) sumados por bucket y por las columnas de by.
+
+    by puede tener "worker_id" y "name"; las columnas que no están se suman.
+    """
+    groups = [StatsRollup.bucket] + [getattr(StatsRollup, column) for column in by]
+    query = (
+        select(
+            *groups,
+            *[func.sum(getattr(StatsRollup, c)).label(c) for c in COUNTERS],
+        )
+        .where(
+            StatsRollup.resolution == resolution,
+            StatsRollup.kind == kind,
+            StatsRollup.bucket >= since,
+            StatsRollup.bucket < until,
+        )
+        .group_by(*groups)
+        .order_by(*groups)
+    )
+    if worker_id:
+        query = query.where(StatsRollup.worker_id == worker_id)
+    if name is not None:
+        query = query.where(StatsRollup.name == name)
+
+    return db.execute(query).all()
+
+
+@with_session
+def delete_rollups_before(resolution, bucket, db=None):
+    query = delete(StatsRollup).where(
+        StatsRollup.resolution == resolution, StatsRollup.bucket < bucket
+    )
+    return db.execute(query).rowcount
+
+
+def _rollup_queries(truncate):
+    """(kind, consulta) con los inicios y finales por cubo de tareas y procesos.
+
+    Cada consulta devuelve bucket, worker_id, name y los COUNTERS; incluye las
+    filas archivadas.
+    """
+    tasks, processes = history_tasks_with_archive(), processes_with_archive()
+    task, process = tasks.c, processes.c
+    task_source = tasks.join(processes, process.father == task.father)
+
+    def started():
+        return [func.count(), literal(0), literal(0), literal(0), literal(0)]
+
+    def finished(status, start, end):
+        return [
+            literal(0),
+            func.sum(case((status == "success", 1), else_=0)),
+            func.sum(case((status == "error", 1), else_=0)),
+            func.sum(func.coalesce(milliseconds_between(start, end), 0)),
+            func.count(start),
+        ]
+
+    def query(moment, name, counters, source, *where):
+        # los procesos no tienen nombre (name=None): se devuelve ""
+        bucket = truncate(moment)
+        groups = [bucket, process.process]
+        if name is None:
+            name = literal("")
+        else:
+            groups.append(name)
+        return (
+            select(bucket, process.process, name, *counters)
+            .select_from(source)
+            .where(moment.isnot(None), *where)
+            .group_by(*groups)
+        )
+
+    task_finished = task.status.in_(FINISHED_STATES)
+    process_finished = process.status.in_(FINISHED_STATES)
+    return [
+        ("task", query(task.started, task.name, started(), task_source)),
+        (
+            "task",
+            query(
+                task.update,
+                task.name,
+                finished(task.status, task.started, task.update),
+                task_source,
+                task_finished,
+            ),
+        ),
+        ("process", query(process.created, None, started(), processes)),
+        (
+            "process",
+            query(
+                process.finished,
+                None,
+                finished(process.status, process.created, process.finished),
+                processes,
+                process_finished,
+            ),
+        ),
+    ]
+
+
+def rebuild_stats_rollups(db, batch_size=1000):
+    """Recalcula todos los cubos desde las tareas y procesos, también los archivados.
+
+    La agregación por cubo la hace la base de datos; acepta una Session o una
+    Connection y no hace commit. Devuelve cuántos cubos quedan.
+    """
+    rows = {}
+    for resolution in RESOLUTIONS:
+        truncate = minute_start if resolution == "minute" else hour_start
+        for kind, query in _rollup_queries(truncate):
+            for bucket, worker_id, name, *counters in db.execute(query):
+                key = (resolution, bucket, worker_id, kind, name)
+                row = rows.setdefault(key, dict.fromkeys(COUNTERS, 0))
+                for counter, value in zip(COUNTERS, counters):
+                    row[counter] += int(value or 0)
+
+    values = [{**dict(zip(KEY, key)), **row} for key, row in rows.items()]
+    db.execute(delete(StatsRollup))
+    for start in range(0, len(values), batch_size):
+        db.execute(insert(StatsRollup), values[start : start + batch_size])
+    return len(values)
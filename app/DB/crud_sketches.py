@@ -0,0 +1,177 @@
+"""Cuantiles de duración de tareas y procesos (/stats/percentiles), al estilo DDSketch.
+
+Cada duración cae en un intervalo logarítmico: el bin k cubre de GAMMA**(k-1)
+a GAMMA**k milisegundos, y todo lo que dura 1 ms o menos va al bin 0. La tabla
+duration_sketches guarda cuántas duraciones hay en cada bin por kind, worker,
+nombre de tarea y versión. Cualquier cuantil sale de recorrer los bins en
+orden, con un error relativo de RELATIVE_ACCURACY como mucho, y dos sketches
+se juntan sumando sus bins: el de una tarea en todos los workers o el de todas
+las versiones es un GROUP BY bin.
+
+db_control los actualiza con los mismos cambios que los cubos de
+crud_rollups.py: cada final con duración suma 1 a su bin (y un final que se
+deshace resta 1 al suyo), en un solo upsert por transacción.
+"""
+
+import math
+from itertools import groupby
+
+from sqlalchemy import delete, func, insert, literal, select
+
+from DB.structure import DurationSketch, Worker, with_session
+from DB.crud_archive import history_tasks_with_archive, processes_with_archive
+from DB.crud_rollups import (
+    FINISHED_STATES,
+    duration_milliseconds,
+    upsert_counters,
+)
+
+
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+QUANTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+KEY = ["kind", "worker_id", "name", "version", "bin"]
+
+
+def duration_bin(milliseconds):
+    if milliseconds <= 1:
+        return 0
+    return math.ceil(math.log(milliseconds, GAMMA))
+
+
+def bin_milliseconds(bin):
+    """Valor representativo del bin: a menos de RELATIVE_ACCURACY de todo el intervalo."""
+    return 2 * GAMMA**bin / (GAMMA + 1)
+
+
+def add_to_sketches(db, changes):
+    """Suma a sus bins las duraciones de los cambios (ver crud_rollups.finished_change)."""
+    rows = {}
+    for worker_id, kind, name, version, _, deltas in changes:
+        sign = deltas.get("duration_count")
+        if not sign:
+            continue
+        bin = duration_bin(deltas["duration_ms"] * sign)
+        key = (kind, worker_id, name, version or "", bin)
+        rows[key] = rows.get(key, 0) + sign
+
+    if rows:
+        db.execute(
+            upsert_counters(
+                DurationSketch.__table__,
+                [
+                    {**dict(zip(KEY, key)), "count": count}
+                    for key, count in rows.items()
+                ],
+                KEY,
+                ["count"],
+            )
+        )
+
+
+def quantiles(bins):
+    """QUANTILES en segundos de una lista de (bin, count) ordenada por bin."""
+    total = sum(count for _, count in bins)
+    result = {}
+    for label, quantile in QUANTILES.items():
+        rank, seen = quantile * (total - 1), 0
+        for bin, count in bins:
+            seen += count
+            if seen > rank:
+                break
+        result[label] = bin_milliseconds(bin) / 1000
+    return result
+
+
+@with_session
+def get_sketch_quantiles(
+    kind="task", worker_id=None, name=None, version=None, by=(), db=None
+):
+    """count y QUANTILES de los sketches juntados por las columnas de by.
+
+    by puede tener "worker_id", "name" y "version"; las columnas que no están
+    se suman. Devuelve un dict por grupo con esas columnas.
+    """
+    groups = [getattr(DurationSketch, column) for column in by]
+    count = func.sum(DurationSketch.count)
+    query = (
+        select(*groups, DurationSketch.bin, count.label("count"))
+        .where(DurationSketch.kind == kind)
+        .group_by(*groups, DurationSketch.bin)
+        .having(count > 0)
+        .order_by(*groups, DurationSketch.bin)
+    )
+    if worker_id:
+        query = query.where(DurationSketch.worker_id == worker_id)
+    if name is not None:
+        query = query.where(DurationSketch.name == name)
+    if version is not None:
+        query = query.where(DurationSketch.version == version)
+
+    result = []
+    rows = db.execute(query).all()
+    for group, group_rows in groupby(rows, key=lambda row: tuple(row[: len(by)])):
+        bins = [(row.bin, int(row.count)) for row in group_rows]
+        result.append(
+            {
+                **dict(zip(by, group)),
+                "count": sum(count for _, count in bins),
+                **quantiles(bins),
+            }
+        )
+    return result
+
+
+def _duration_queries():
+    """(kind, consulta) con worker, nombre, versión, inicio y final de lo terminado.
+
+    Las duraciones se calculan en Python con duration_milliseconds, igual que
+    en el incremental. Incluye lo archivado.
+    """
+    tasks, processes = history_tasks_with_archive(), processes_with_archive()
+    task, process = tasks.c, processes.c
+
+    task_query = (
+        select(
+            process.process,
+            task.name,
+            task.version,
+            task.started,
+            task.update,
+        )
+        .select_from(tasks.join(processes, process.father == task.father))
+        .where(task.status.in_(FINISHED_STATES), task.started.isnot(None))
+    )
+    process_query = (
+        select(
+            process.process,
+            literal(""),
+            Worker.version,
+            process.created,
+            process.finished,
+        )
+        .select_from(processes.outerjoin(Worker, Worker.id == process.process))
+        .where(process.status.in_(FINISHED_STATES), process.finished.isnot(None))
+    )
+    return [("task", task_query), ("process", process_query)]
+
+
+def rebuild_duration_sketches(db, batch_size=1000):
+    """Recalcula todos los sketches desde las tareas y procesos, también los archivados.
+
+    Las filas se leen por partes (yield_per); acepta una Session o una
+    Connection y no hace commit. Devuelve cuántos bins quedan.
+    """
+    rows = {}
+    for kind, query in _duration_queries():
+        result = db.execute(query.execution_options(yield_per=batch_size))
+        for worker_id, name, version, started, finished in result:
+            bin = duration_bin(duration_milliseconds(started, finished))
+            key = (kind, worker_id, name, version or "", bin)
+            rows[key] = rows.get(key, 0) + 1
+
+    values = [{**dict(zip(KEY, key)), "count": count} for key, count in rows.items()]
+    db.execute(delete(DurationSketch))
+    for start in range(0, len(values), batch_size):
+        db.execute(insert(DurationSketch), values[start : start + batch_size])
+    return len(values)
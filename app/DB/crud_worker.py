@@ -1,66 +1,73 @@
-from DB.structure import Worker, get_session
-
-
-def create_worker(id, nombre, version, last_healthcheker, datetime, tasks):
-    with get_session() as db:
-        try:
-            nuevo_worker = Worker(
-                id=id,
-                nombre=nombre,
-                version=version,
-                last_healthcheker=last_healthcheker,
-                datetime=datetime,
-                tasks=tasks,
-            )
-            db.add(nuevo_worker)
-            db.commit()
-            db.refresh(nuevo_worker)
-            return nuevo_worker
-        except Exception as e:
-            db.rollback()  # Revertir la transacción en caso de error
-            raise e
-
-
-def get_workers():
-    with get_session() as db:
-        try:
-            return db.query(Worker).all()
-        except Exception as e:
-            db.rollback()  # Revertir la transacción en caso de error
-            raise e
-
-
-def get_worker_by_id(worker_id):
-    with get_session() as db:
-        try:
-            return db.query(Worker).filter_by(id=worker_id).first()
-        except Exception as e:
-            db.rollback()  # Revertir la transacción en caso de error
-            raise e
-
-
-def update_worker(worker_id, **kwargs):
-    with get_session() as db:
-        try:
-            worker = db.query(Worker).filter(Worker.id == worker_id).first()
-            if worker:
-                for key, value in kwargs.items():
-                    setattr(worker, key, value)
-                db.commit()
-                db.refresh(worker)
-            return worker
-        except Exception as e:
-            db.rollback()  # Revertir la transacción en caso de error
-            raise e
-
-
-def delete_worker(worker_id):
-    with get_session() as db:
-        try:
-            worker = db.query(Worker).filter(Worker.id == worker_id).first()
-            if worker:
-                db.delete(worker)
-                db.commit()
-        except Exception as e:
-            db.rollback()  # Revertir la transacción en caso de error
-            raise e
+from sqlalchemy import or_, select, update
+
+from DB.structure import Worker, with_session
+
+
+@with_session
+def create_worker(id, nombre, version, last_healthcheker, datetime, tasks, db=None):
+    nuevo_worker = Worker(
+        id=id,
+        nombre=nombre,
+        version=version,
+        last_healthcheker=last_healthcheker,
+        datetime=datetime,
+        tasks=tasks,
+    )
+    db.add(nuevo_worker)
+    db.flush()
+    return nuevo_worker
+
+
+@with_session
+def get_workers(db=None):
+    return db.query(Worker).all()
+
+
+@with_session
+def get_worker_by_id(worker_id, db=None):
+    return db.query(Worker).filter_by(id=worker_id).first()
+
+
+@with_session
+def update_worker(worker_id, db=None, **kwargs):
+    worker = db.query(Worker).filter(Worker.id == worker_id).first()
+    if worker:
+        for key, value in kwargs.items():
+            setattr(worker, key, value)
+        db.flush()
+    return worker
+
+
+@with_session
+def delete_worker(worker_id, db=None):
+    worker = db.query(Worker).filter(Worker.id == worker_id).first()
+    if worker:
+        db.delete(worker)
+        db.flush()
+
+
+@with_session
+def get_workers_to_sweep(cutoff, for_update=False, db=None):
+    """Workers cuyo status no corresponde a su último latido, como (id, status nuevo).
+
+    Los "online" sin latido desde cutoff pasan a "ofline" y los "ofline" con
+    latido desde cutoff vuelven a "online"; las dos consultas recorren solo
+    su tramo del índice (status, last_healthcheker).
+    """
+    overdue = select(Worker.id).where(
+        Worker.status == "online",
+        or_(Worker.last_healthcheker.is_(None), Worker.last_healthcheker < cutoff),
+    )
+    revived = select(Worker.id).where(
+        Worker.status == "ofline", Worker.last_healthcheker >= cutoff
+    )
+    if for_update:
+        overdue, revived = overdue.with_for_update(), revived.with_for_update()
+
+    return [(id, "ofline") for id in db.execute(overdue).scalars()] + [
+        (id, "online") for id in db.execute(revived).scalars()
+    ]
+
+
+def set_workers_status(worker_ids, status, db):
+    db.execute(update(Worker).where(Worker.id.in_(worker_ids)).values(status=status))
@@ -0,0 +1,120 @@
+from sqlalchemy import case, delete, func, insert, select, update
+
+from DB.structure import Worker, WorkerSummary, with_session, seconds_between
+from DB.crud_archive import processes_with_archive
+from DB.crud_changes import next_seq
+
+
+def create_worker_summary(worker_id, db, seq=0):
+    db.execute(
+        insert(WorkerSummary).values(
+            worker_id=worker_id,
+            processed=0,
+            running=0,
+            success=0,
+            error=0,
+            duration_sum=0,
+            duration_count=0,
+            seq=seq,
+        )
+    )
+
+
+def increment_worker_summary(worker_id, db, seq=None, **deltas):
+    """Suma los deltas a los contadores del worker (processed=1, running=-1, ...).
+
+    Se hace con un UPDATE col = col + delta, así varias peticiones concurrentes
+    no se pisan los contadores. El mismo UPDATE escribe el seq de /changes.
+    """
+    deltas = {key: value for key, value in deltas.items() if value}
+    if not deltas:
+        return
+
+    values = {
+        getattr(WorkerSummary, key): getattr(WorkerSummary, key) + value
+        for key, value in deltas.items()
+    }
+    if seq is not None:
+        values[WorkerSummary.seq] = next_seq(WorkerSummary.seq, seq)
+
+    db.execute(
+        update(WorkerSummary).where(WorkerSummary.worker_id == worker_id).values(values)
+    )
+
+
+def stamp_worker_summaries(worker_ids, seq, db):
+    # seq de /changes en filas cuyos contadores no cambian (estado, retención)
+    db.execute(
+        update(WorkerSummary)
+        .where(WorkerSummary.worker_id.in_(sorted(worker_ids)))
+        .values(seq=next_seq(WorkerSummary.seq, seq))
+    )
+
+
+@with_session
+def get_worker_summaries(worker_id=None, status=None, db=None):
+    """Workers con sus contadores; una fila por worker, sin recorrer sus procesos."""
+    query = select(
+        Worker.id,
+        Worker.last_healthcheker,
+        Worker.status,
+        func.coalesce(WorkerSummary.processed, 0).label("processed"),
+        func.coalesce(WorkerSummary.running, 0).label("running"),
+        func.coalesce(WorkerSummary.success, 0).label("success"),
+        func.coalesce(WorkerSummary.error, 0).label("error"),
+        func.coalesce(WorkerSummary.duration_sum, 0).label("duration_sum"),
+        func.coalesce(WorkerSummary.duration_count, 0).label("duration_count"),
+    ).outerjoin(WorkerSummary, WorkerSummary.worker_id == Worker.id)
+
+    if worker_id is not None:
+        query = query.where(Worker.id == worker_id)
+    if status is not None:
+        query = query.where(Worker.status == status)
+
+    return db.execute(query).all()
+
+
+def rebuild_worker_summaries(db):
+    """Recalcula los contadores de todos los workers desde la tabla processes.
+
+    Cuenta también los procesos archivados. Acepta una Session o una
+    Connection y no hace commit.
+    """
+    processes = processes_with_archive()
+    process = processes.c
+
+    def count_status(*statuses):
+        counted = case((process.status.in_(statuses), 1), else_=0)
+        return func.coalesce(func.sum(counted), 0)
+
+    duration = seconds_between(process.created, process.finished)
+
+    counters = (
+        select(
+            Worker.id,
+            func.count(process.father),
+            count_status("running", "stale"),  # stale: en marcha en un worker ofline
+            count_status("success"),
+            count_status("error"),
+            func.coalesce(func.sum(duration), 0),
+            func.count(duration),
+        )
+        .outerjoin(processes, process.process == Worker.id)
+        .group_by(Worker.id)
+    )
+
+    db.execute(delete(WorkerSummary))
+    db.execute(
+        insert(WorkerSummary).from_select(
+            [
+                "worker_id",
+                "processed",
+                "running",
+                "success",
+                "error",
+                "duration_sum",
+                "duration_count",
+            ],
+            counters,
+        )
+    )
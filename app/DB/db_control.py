@@ -1,21 +1,298 @@
-from datetime import datetime
-from DB.structure import generate_datetime
-from DB.crud_worker import create_worker, update_worker, get_worker_by_id, get_workers
+from datetime import datetime, timedelta
+from DB.structure import generate_datetime, new_id, with_session
+from DB.crud_worker import (
+    create_worker,
+    get_worker_by_id,
+    get_workers_to_sweep,
+    set_workers_status,
+)
 from DB.crud_history_tasks import (
-    create_history_task,
+    get_history_task_by_id,
+    get_task_fathers,
     update_history_task,
-    get_history_tasks_by_father,
+    get_history_tasks_page,
+)
+from DB.crud_process import (
+    create_process_with_tasks,
+    get_process_by_id,
+    get_process_dashboard_by_worker,
+    apply_task_to_process_summary,
+    lock_processes,
+    rebuild_process_summaries,
+    set_processes_status,
+)
+from DB.crud_worker_summary import (
+    create_worker_summary,
+    increment_worker_summary,
+    get_worker_summaries,
+    rebuild_worker_summaries,
+    stamp_worker_summaries,
+)
+from DB.crud_change_events import create_change_event
+from DB.crud_changes import (
+    change_seq,
+    changes_horizon,
+    stamp,
+    stamp_all_summaries,
+    get_scope_seq,
+    get_changes_bound,
+    get_changed_workers,
+    get_changed_processes,
+    get_changed_tasks,
+    get_archived_changes,
+)
+from DB.crud_rollups import (
+    FINISHED_STATES,
+    add_to_rollups,
+    started_change,
+    finished_change,
+    get_rollup_series,
+    bucket_start,
+    RESOLUTIONS,
+    rebuild_stats_rollups,
+)
+from DB.crud_sketches import (
+    add_to_sketches,
+    get_sketch_quantiles,
+    rebuild_duration_sketches,
+)
+from DB.crud_archive import (
+    get_archived_process,
+    get_archived_task,
+    get_archived_task_details,
 )
-from DB.crud_process import create_process, get_process_by_worker, update_process
-import uuid
-from collections import Counter
+from DB.crud_details import (
+    get_task_details,
+    set_task_details,
+    delete_task_details,
+    set_process_error,
+    delete_process_error,
+)
+from DB.pagination import decode_cursor, split_page
+import os
+from DB.heartbeat_buffer import heartbeat_buffer, HEARTBEAT_FLUSH_INTERVAL
 
 
 MAX_HEALTHCHECK = 30
 PERMIT_TASK_STATES = ["start", "error", "success"]
+WORKER_STATES = ["online", "ofline"]
+# procesos en marcha de un worker ofline; en los contadores siguen como "running"
+STALE_STATUS = "stale"
+
+# cada cambio de worker, proceso o tarea deja un evento para /stream (ver live_updates.py)
+EVENTS_ENABLED = os.environ.get("EVENTS_ENABLED", "1") == "1"
+# inicios y finales sumados por minuto y hora para /stats/timeseries (ver crud_rollups.py)
+# y cuantiles de duración para /stats/percentiles (ver crud_sketches.py)
+STATS_ENABLED = os.environ.get("STATS_ENABLED", "1") == "1"
+
+# la base de datos puede ir hasta HEARTBEAT_FLUSH_INTERVAL segundos por detrás del
+# último latido; debe quedar margen para no marcar como "ofline" a un worker vivo
+assert (
+    HEARTBEAT_FLUSH_INTERVAL < MAX_HEALTHCHECK
+), f"HEARTBEAT_FLUSH_INTERVAL debe ser menor que MAX_HEALTHCHECK ({MAX_HEALTHCHECK}s)"
+
+
+# Todas las funciones db_* aceptan db=<sesión>: sin ella abren una sesión propia y
+# hacen commit al terminar (ver with_session en DB/structure.py)
+
+
+# Filas de los dashboards (las mismas que devuelven los endpoints y los eventos)
+
+
+def task_dashboard_row(task, tasks_total):
+    # las listas y los eventos no leen task_details ni llevan details:
+    # has_details dice si hay y solo /dashboard_task/{id} (TaskWithDetailsOut)
+    # los lee
+    return {
+        "id": task.uuid,
+        "name": task.name,
+        "version": task.version,
+        "state": task.status,
+        "received": task.create,
+        "started": task.started,
+        "runtime": (
+            task.create - task.update
+            if task.update
+            else generate_datetime() - task.create
+        ),
+        "father": task.father,
+        "has_details": bool(task.has_details),
+        "step": f"{task.order}/{tasks_total}",
+        "order": f"{task.order}",
+    }
+
+
+def process_dashboard_row(process, worker_name):
+    progress = 0
+    if process.step_status != "pending":
+        if process.tasks_updated and not process.tasks_finished:
+            progress = 0.01
+        else:
+            progress = process.tasks_finished / process.tasks_total
+
+    return {
+        "id": process.father,
+        "worker": worker_name,
+        "step": process.step,
+        "status": process.step_status,
+        "last_update": process.last_update,
+        "progress": f"{int(progress*100)}%",
+    }
+
+
+def worker_dashboard_row(worker):
+    return {
+        "id": worker.id,
+        "status": worker.status,  # lo mantiene db_sweep_workers
+        "processed": worker.processed,
+        "active": worker.running,
+        "successed": worker.success,
+        "failed": worker.error,
+        "load_average": (
+            "NA"
+            if worker.duration_count == 0
+            else str(worker.duration_sum / worker.duration_count)
+        ),
+    }
+
+
+# Eventos para los dashboards en vivo, en la misma transacción que el cambio
+
+_workers = {}  # worker_id -> (nombre, versión); no cambian una vez registrado
+
+
+def worker_info(worker_id, db):
+    if worker_id not in _workers:
+        worker = get_worker_by_id(worker_id, db=db)
+        if worker:
+            _workers[worker_id] = (worker.nombre, worker.version)
+    return _workers.get(worker_id, (None, None))
+
+
+def worker_name(worker_id, db):
+    return worker_info(worker_id, db)[0]
+
+
+def emit_worker_event(worker_id, db):
+    if not EVENTS_ENABLED:
+        return
+
+    for worker in get_worker_summaries(worker_id=worker_id, db=db):
+        create_change_event(
+            "worker", worker_id, worker_dashboard_row(worker), db, worker_id=worker_id
+        )
 
 
-def db_worker_register(new_worker: dict):
+def emit_process_event(process, db):
+    if not EVENTS_ENABLED or not process.tasks_total:
+        return
+
+    create_change_event(
+        "process",
+        process.father,
+        process_dashboard_row(process, worker_name(process.process, db)),
+        db,
+        worker_id=process.process,
+        process_id=process.father,
+    )
+
+
+def emit_task_event(task, process, db):
+    # la fila de las listas, con has_details: los detalles se piden aparte a
+    # /dashboard_task/{id}
+    if not EVENTS_ENABLED:
+        return
+
+    create_change_event(
+        "task",
+        task.uuid,
+        task_dashboard_row(task, process.tasks_total),
+        db,
+        worker_id=process.process,
+        process_id=process.father,
+    )
+
+
+# Series temporales y cuantiles, también en la misma transacción que el cambio
+
+
+def save_stats_changes(db, changes):
+    add_to_rollups(db, changes)
+    add_to_sketches(db, changes)
+
+
+def task_stats_changes(task, process, previous_status, previous_update):
+    if not STATS_ENABLED:
+        return []
+
+    worker_id = process.process
+    if task.status not in FINISHED_STATES:
+        changes = [
+            started_change(worker_id, "task", task.name, task.version, task.started)
+        ]
+    else:
+        changes = [
+            finished_change(
+                worker_id,
+                "task",
+                task.name,
+                task.version,
+                task.status,
+                task.started,
+                task.update,
+            )
+        ]
+        if previous_update is not None and previous_status in FINISHED_STATES:
+            # vuelve a terminar sin un "start" entre medias: se deshace el final anterior
+            changes.append(
+                finished_change(
+                    worker_id,
+                    "task",
+                    task.name,
+                    task.version,
+                    previous_status,
+                    task.started,
+                    previous_update,
+                    sign=-1,
+                )
+            )
+    return changes
+
+
+def record_process_stats(process, previous_status, previous_finished, db):
+    if not STATS_ENABLED:
+        return
+
+    version = worker_info(process.process, db)[1]
+    changes = [
+        finished_change(
+            process.process,
+            "process",
+            "",
+            version,
+            process.status,
+            process.created,
+            process.finished,
+        )
+    ]
+    if previous_finished is not None and previous_status in FINISHED_STATES:
+        changes.append(
+            finished_change(
+                process.process,
+                "process",
+                "",
+                version,
+                previous_status,
+                process.created,
+                previous_finished,
+                sign=-1,
+            )
+        )
+    save_stats_changes(db, changes)
+
+
+@with_session
+def db_worker_register(new_worker: dict, db=None):
 
     # se valida que existan las claves: ["name", "version", "tasks"] en new_worker
     assert all(
@@ -32,7 +309,7 @@ def db_worker_register(new_worker: dict):
         ]
     ), f"Las taks deben tener las claves: {', '.join(['name', 'version', 'tasks'])}, pero alguna tarea no tiene una o mas de esas claves"
 
-    new_worker_id = "worker_" + str(uuid.uuid1())
+    new_worker_id = new_id("worker")
 
     real_new_tasks = [
         {"name": taks["name"], "version": taks["version"], "order": task_id + 1}
@@ -41,211 +318,593 @@ def db_worker_register(new_worker: dict):
 
     datetime_created = generate_datetime()
 
-    nuevo_worker = create_worker(
+    create_worker(
         id=new_worker_id,
         nombre=new_worker["name"],
         version=new_worker["version"],
         last_healthcheker=datetime_created,
         datetime=datetime_created,
         tasks=real_new_tasks,
+        db=db,
     )
+    create_worker_summary(new_worker_id, db=db, seq=change_seq(db))
+    emit_worker_event(new_worker_id, db)
 
-    return nuevo_worker.id
+    return new_worker_id
 
 
-def db_healthcheaker_worker(worker_id):
-    worker = update_worker(worker_id=worker_id, last_healthcheker=generate_datetime())
+@with_session
+def db_healthcheaker_worker(worker_id, db=None):
+    # solo se consulta la base de datos la primera vez que este proceso ve al worker
+    if not heartbeat_buffer.is_known(worker_id) and not get_worker_by_id(
+        worker_id, db=db
+    ):
+        return "error"
 
-    if worker:
-        worker_health = (generate_datetime() - worker.last_healthcheker).seconds
+    heartbeat_buffer.beat(worker_id, generate_datetime())
 
-    return MAX_HEALTHCHECK > worker_health if worker else "error"
+    worker_health = (generate_datetime() - heartbeat_buffer.latest(worker_id)).seconds
 
+    return MAX_HEALTHCHECK > worker_health
 
-def db_end_process(process_id, details: str = None):
-    process = update_process(
-        process_id=process_id,
-        finished=generate_datetime(),
-        error=details,
-        status="success" if len(details) < 5 else "error",
-    )
+
+@with_session
+def db_end_process(process_id, details: str = None, db=None):
+    process = get_process_by_id(process_id, db=db, for_update=True)
+
+    if process:
+        seq = change_seq(db)
+        stamp(process, seq)
+        previous_status = process.status
+        previous_finished = process.finished
+
+        process.finished = generate_datetime()
+        process.status = "success" if details is None or len(details) < 5 else "error"
+
+        duration = int((process.finished - process.created).total_seconds())
+        previous_duration = (
+            int((previous_finished - process.created).total_seconds())
+            if previous_finished
+            else 0
+        )
+
+        changes = {
+            "duration_sum": duration - previous_duration,
+            "duration_count": 0 if previous_finished else 1,
+        }
+        if previous_status != process.status:
+            counted = "running" if previous_status == STALE_STATUS else previous_status
+            changes[counted] = -1
+            changes[process.status] = 1
+
+        increment_worker_summary(process.process, db=db, seq=seq, **changes)
+        record_process_stats(process, previous_status, previous_finished, db)
+        emit_worker_event(process.process, db)
+
+        # el texto del error va comprimido en process_errors, fuera de la fila
+        if details is not None:
+            set_process_error(process_id, details, db=db)
+        elif previous_finished:
+            delete_process_error(process_id, db=db)
 
     return {"status": True if process else False}
 
 
-def db_matricular_proceso(worker_id):
+@with_session
+def db_matricular_proceso(worker_id, db=None):
 
-    worker = get_worker_by_id(worker_id)
+    worker = get_worker_by_id(worker_id, db=db)
     if worker:
         tasks = worker.tasks
 
-        new_process_id = "process_" + str(uuid.uuid4())
+        new_process_id = new_id("process")
+        datetime_created = generate_datetime()
+        seq = change_seq(db)
 
-        nuevo_proceso = create_process(
+        new_tasks = [
+            {
+                "uuid": new_id("task"),
+                "name": task["name"],
+                "status": "pending",
+                "order": task["order"],
+                "version": task["version"],
+                "create": datetime_created,
+                "started": None,
+                "update": None,
+                "father": new_process_id,
+                "has_details": False,
+            }
+            for task in tasks
+        ]
+
+        # proceso, tareas (un INSERT multi-fila) y contadores en una sola transacción
+        nuevo_proceso = create_process_with_tasks(
             father=new_process_id,
             process=worker_id,
-            created=generate_datetime(),
+            created=datetime_created,
             finished=None,
             status="running",
+            tasks=new_tasks,
+            db=db,
+            seq=seq,
         )
+        increment_worker_summary(worker_id, db=db, seq=seq, processed=1, running=1)
+        _workers[worker_id] = (worker.nombre, worker.version)
 
-        tasks_ids = []
-        for task in tasks:
-            new_task_id = "task_" + str(uuid.uuid4())
-
-            nueva_tarea = create_history_task(
-                uuid=new_task_id,
-                name=task["name"],
-                status="pending",
-                order=task["order"],
-                version=task["version"],
-                create=generate_datetime(),
-                started=None,
-                update=None,
-                father=new_process_id,
+        if STATS_ENABLED:
+            started = started_change(
+                worker_id, "process", "", worker.version, datetime_created
             )
+            add_to_rollups(db, [started])
+
+        emit_process_event(nuevo_proceso, db)
+        emit_worker_event(worker_id, db)
+
+        tasks_ids = [{"name": task["name"], "id": task["uuid"]} for task in new_tasks]
+
+        return {"father": new_process_id, "sons": tasks_ids}
 
-            tasks_ids.append({"name": task["name"], "id": nueva_tarea.uuid})
 
-        return {"father": nuevo_proceso.father, "sons": tasks_ids}
+def change_datetime(at, now, earliest=None):
+    """Hora de un cambio que manda el cliente, en hora local del servidor.
 
+    Sin at es now. Una hora con zona se pasa a la local; nunca queda después
+    de now ni antes de earliest (p. ej. el inicio de la tarea).
+    """
+    if at is None:
+        return now
+    if at.tzinfo is not None:
+        at = at.astimezone().replace(tzinfo=None)
+    at = min(at, now)
+    return max(at, earliest) if earliest else at
 
-def db_actualizar_task(task_id, new_status_task: str, details=None):
+
+@with_session
+def db_actualizar_task(
+    task_id,
+    new_status_task: str,
+    details=None,
+    db=None,
+    stats_changes=None,
+    at=None,
+    processes=None,
+):
+    """Aplica un cambio de estado de una tarea.
+
+    at es la hora a la que ocurrió el cambio en el worker (el cliente envía
+    las actualizaciones por lotes, así que puede llegar un segundo tarde);
+    sin at se usa la hora del servidor. processes son los procesos ya
+    bloqueados por el lote (lock_processes).
+    """
 
     assert (
         new_status_task in PERMIT_TASK_STATES
     ), "Estado de tarea no valido, solo son permitidos los estados : {', '.join(PERMIT_STATES)}"
 
+    # primero el proceso, como la retención (ver lock_processes), y después la
+    # tarea, así dos cambios a la vez de la misma tarea no leen los mismos
+    # valores anteriores ni cuentan dos veces en el resumen
+    if processes is None:
+        processes = lock_processes(get_task_fathers([task_id], db=db).values(), db)
+    task = get_history_task_by_id(task_id, db=db, for_update=True)
+    if not task:
+        return None
+
+    previous_status, previous_update = task.status, task.update
+    had_details = task.has_details
+    # el seq de /changes va en los UPDATE de la tarea y del proceso
+    seq = change_seq(db)
+    stamp(task, seq)
+
     if new_status_task == "start":
+        started = change_datetime(at, generate_datetime(), task.create)
         task = update_history_task(
             task_id=task_id,
+            db=db,
             status="running",
-            started=generate_datetime(),
-            update=generate_datetime(),
+            started=started,
+            update=started,
         )
+        # los detalles no cambian; solo se leen si la tarea ya tenía
+        details = get_task_details(task_id, db=db) if had_details else None
     else:
         task = update_history_task(
             task_id=task_id,
+            db=db,
             status=new_status_task,
-            update=generate_datetime(),
-            details=details,
+            update=change_datetime(
+                at, generate_datetime(), task.started or task.create
+            ),
+            has_details=details is not None,
         )
+        if details is not None:
+            set_task_details(task_id, details, db=db)
+        elif had_details:
+            delete_task_details(task_id, db=db)
+
+    process = apply_task_to_process_summary(
+        db, processes.get(task.father), task, previous_status, previous_update, seq
+    )
+
+    if process:
+        changes = task_stats_changes(task, process, previous_status, previous_update)
+        if stats_changes is None:
+            save_stats_changes(db, changes)
+        else:
+            stats_changes.extend(changes)  # el lote los escribe todos juntos
+        emit_task_event(task, process, db)
+        emit_process_event(process, db)
 
     return task
 
 
-def db_dashboard_tasks(father_id):
-    tasks = get_history_tasks_by_father(father_id)
+@with_session
+def db_actualizar_tasks(updates: list, db=None):
+    """Aplica varias actualizaciones de tareas en una sola transacción.
 
-    tasks_dashboard = []
+    Cada elemento de updates es un dict con las claves task_id, status,
+    details y, opcional, at (hora del cambio en el worker). Devuelve el estado de cada elemento, en el mismo orden:
+    "ok", "not_found" o "invalid_status".
+    """
+    results = []
+    stats_changes = []
 
-    for task in tasks:
+    # los procesos de todo el lote de una vez, antes que las tareas
+    task_ids = [
+        update["task_id"]
+        for update in updates
+        if update["status"] in PERMIT_TASK_STATES
+    ]
+    processes = lock_processes(get_task_fathers(task_ids, db=db).values(), db)
+
+    for update in updates:
+        if update["status"] not in PERMIT_TASK_STATES:
+            results.append({"task_id": update["task_id"], "status": "invalid_status"})
+            continue
+
+        task = db_actualizar_task(
+            update["task_id"],
+            update["status"],
+            update.get("details"),
+            db=db,
+            stats_changes=stats_changes,
+            at=update.get("at"),
+            processes=processes,
+        )
 
-        tasks_dashboard.append(
+        results.append(
             {
-                "id": task.uuid,
-                "name": task.name,
-                "version": task.version,
-                "state": task.status,
-                "received": task.create,
-                "started": task.started,
-                "runtime": (
-                    task.create - task.update
-                    if task.update
-                    else generate_datetime() - task.create
-                ),
-                "father": task.father,
-                "details": task.details,
-                "step": f"{task.order}/{len(tasks)}",
-                "order": f"{task.order}",
+                "task_id": update["task_id"],
+                "status": "ok" if task else "not_found",
             }
         )
 
-    return tasks_dashboard
+    save_stats_changes(db, stats_changes)
+    return results
+
+
+@with_session
+def db_dashboard_tasks(
+    father_id,
+    status=None,
+    since=None,
+    until=None,
+    cursor=None,
+    limit=None,
+    history=False,
+    db=None,
+):
+    """Una página de tareas del proceso y el cursor de la siguiente (None si no hay más)."""
+    after = decode_cursor(cursor, int, str) if cursor else None
+
+    tasks = get_history_tasks_page(
+        father_id, status, since, until, after, limit, history, db=db
+    )
+    tasks, next_cursor = split_page(tasks, limit, lambda t: (t.order, t.uuid))
+
+    process = get_process_by_id(father_id, db=db)
+    if process is None and history:
+        process = get_archived_process(father_id, db=db)
+    tasks_total = process.tasks_total if process else len(tasks)
+
+    return [task_dashboard_row(task, tasks_total) for task in tasks], next_cursor
+
+
+@with_session
+def db_dashboard_task(task_id, history=False, db=None):
+    """Fila del dashboard de una tarea con sus detalles; None si no existe.
+
+    Con history se busca también en las tareas archivadas.
+    """
+    task = get_history_task_by_id(task_id, db=db)
+    archived = task is None and history
+    if archived:
+        task = get_archived_task(task_id, db=db)
+    if task is None:
+        return None
+
+    process = get_process_by_id(task.father, db=db)
+    if process is None and history:
+        process = get_archived_process(task.father, db=db)
+    tasks_total = process.tasks_total if process else task.order
+
+    details = None
+    if task.has_details:
+        read_details = get_archived_task_details if archived else get_task_details
+        details = read_details(task_id, db=db)
+    return {**task_dashboard_row(task, tasks_total), "details": details}
+
+
+@with_session
+def db_dashboard_process(
+    worker_id: str,
+    status=None,
+    since=None,
+    until=None,
+    cursor=None,
+    limit=None,
+    history=False,
+    db=None,
+):
+    """Una página de procesos del worker y el cursor de la siguiente (None si no hay más)."""
+    after = decode_cursor(cursor, datetime, str) if cursor else None
+
+    worker = get_worker_by_id(worker_id, db=db)
+
+    assert worker, "Worker not found"
+
+    processes = get_process_dashboard_by_worker(
+        worker_id, status, since, until, after, limit, history, db=db
+    )
+    processes, next_cursor = split_page(
+        processes, limit, lambda p: (p.created, p.father)
+    )
 
+    return [process_dashboard_row(p, worker.nombre) for p in processes], next_cursor
+
+
+@with_session
+def db_dashboard_workers(status=None, db=None):
+    if status is not None and status not in WORKER_STATES:
+        raise ValueError(f"status debe ser uno de: {', '.join(WORKER_STATES)}")
+
+    workers = get_worker_summaries(status=status, db=db)
+    return [worker_dashboard_row(worker) for worker in workers]
+
+
+@with_session
+def db_sweep_workers(db=None):
+    """Pone workers.status de acuerdo con el último latido de cada worker.
+
+    Los workers sin latido en MAX_HEALTHCHECK segundos pasan a "ofline" y sus
+    procesos "running" a "stale"; los que vuelven a tener latido pasan a
+    "online" y sus procesos "stale" a "running". Cada worker que cambia lleva
+    el seq de /changes y su evento. Devuelve {"ofline": [...], "online": [...]}.
+    """
+    cutoff = generate_datetime() - timedelta(seconds=MAX_HEALTHCHECK)
+    swept = {status: [] for status in ["ofline", "online"]}
+
+    # lo normal es que no haya nada que cambiar: sin bloqueos ni seq
+    if not get_workers_to_sweep(cutoff, db=db):
+        return swept
+
+    # con varios procesos de gunicorn solo uno cambia cada worker y los demás lo
+    # ven ya cambiado
+    for worker_id, status in get_workers_to_sweep(cutoff, for_update=True, db=db):
+        swept[status].append(worker_id)
+
+    seq = change_seq(db)
+    for status, worker_ids in swept.items():
+        if not worker_ids:
+            continue
+        set_workers_status(worker_ids, status, db)
+        if status == "ofline":
+            set_processes_status(worker_ids, "running", STALE_STATUS, db, seq)
+        else:
+            set_processes_status(worker_ids, STALE_STATUS, "running", db, seq)
+        # el estado está en workers: la fila de resumen solo cambia de seq
+        stamp_worker_summaries(worker_ids, seq, db)
+        for worker_id in worker_ids:
+            emit_worker_event(worker_id, db)
+
+    return swept
+
+
+@with_session
+def db_dashboard_version(worker_id=None, process_id=None, db=None):
+    """Versión de los datos de un dashboard: cambia con cada escritura que le afecta.
+
+    Es el último seq de /changes del ámbito (todo, un worker o un proceso),
+    compartido por todos los procesos de gunicorn. No depende de change_events,
+    así que también vale con EVENTS_ENABLED=0.
+    """
+    return get_scope_seq(worker_id=worker_id, process_id=process_id, db=db)
+
+
+@with_session
+def db_changes(since=None, limit=None, db=None):
+    """Workers, procesos y tareas que han cambiado después de since.
+
+    Cada fila es la misma que en su dashboard más su seq (y worker_id en los
+    procesos); en archived van los procesos que la retención ha sacado de las
+    tablas principales. Devuelve también el seq desde el que pedir la página
+    siguiente y si quedan más cambios; las filas de los últimos
+    CHANGES_LOOKBACK segundos se repiten en la consulta siguiente. Sin since
+    solo devuelve el seq desde el que seguir después de cargar los dashboards
+    completos.
+    """
+    # una transacción con un seq posterior a horizon puede no estar confirmada
+    # aún: la siguiente consulta vuelve a leer desde ahí (ver DB/crud_changes.py)
+    horizon = changes_horizon()
+    if since is None:
+        return {
+            "seq": horizon,
+            "more": False,
+            "workers": [],
+            "processes": [],
+            "tasks": [],
+            "archived": [],
+        }
+
+    # las filas de una transacción comparten seq y nunca se reparten en dos páginas
+    bound = get_changes_bound(since, limit, db=db) if limit else None
+    upto = bound - 1 if bound is not None else None
+
+    def fetch(upto):
+        return (
+            get_changed_workers(since, upto, db=db),
+            get_changed_processes(since, upto, db=db),
+            get_changed_tasks(since, upto, db=db),
+            get_archived_changes(since, upto, db=db),
+        )
 
-def db_dashboard_process(worker_id: str):
+    workers, processes, tasks, archived = fetch(upto)
+    if bound is not None and not (workers or processes or tasks or archived):
+        # una sola transacción con más de limit filas en una tabla
+        upto = bound
+        workers, processes, tasks, archived = fetch(upto)
+
+    if upto is None:
+        upto = max(
+            [
+                row.seq
+                for rows in (workers, processes, tasks, archived)
+                for row in rows[-1:]
+            ],
+            default=since,
+        )
 
-    worker = get_worker_by_id(worker_id)
+    return {
+        "seq": upto if bound is not None else min(upto, horizon),
+        "more": bound is not None,
+        "workers": [
+            {**worker_dashboard_row(worker), "seq": worker.seq} for worker in workers
+        ],
+        "processes": [
+            {
+                **process_dashboard_row(process, process.nombre),
+                "worker_id": process.process,
+                "seq": process.seq,
+            }
+            for process in processes
+        ],
+        "tasks": [
+            {
+                **task_dashboard_row(task, task.tasks_total),
+                "seq": task.seq,
+            }
+            for task in tasks
+        ],
+        "archived": [
+            {"id": process.father, "worker_id": process.process, "seq": process.seq}
+            for process in archived
+        ],
+    }
 
-    assert worker, "Worker not found"
 
-    process_dashboard = []
-    process = get_process_by_worker(worker_id)
+STATS_SERIES_BY = {"worker": "worker_id", "name": "name"}
+
+
+@with_session
+def db_stats_timeseries(
+    resolution="minute",
+    since=None,
+    until=None,
+    worker_id=None,
+    kind="task",
+    name=None,
+    by=("worker", "name"),
+    db=None,
+):
+    """Inicios, finales y duración media por minuto u hora en [since, until).
+
+    Las series se separan por las columnas de by ("worker" y/o "name"); sin by
+    se suma todo. Sin since se devuelven los últimos 60 cubos hasta until.
+    """
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"resolution debe ser uno de: {', '.join(RESOLUTIONS)}")
+    if kind not in ["task", "process"]:
+        raise ValueError("kind debe ser task o process")
+    unknown = [column for column in by if column not in STATS_SERIES_BY]
+    if unknown:
+        raise ValueError(f"by solo admite: {', '.join(STATS_SERIES_BY)}")
+
+    until = until or generate_datetime()
+    if since is None:
+        since = bucket_start(until, resolution) - 59 * RESOLUTIONS[resolution]
+
+    columns = [STATS_SERIES_BY[column] for column in by]
+    rows = get_rollup_series(
+        resolution, since, until, worker_id, kind, name, columns, db=db
+    )
 
-    if process:
+    series = []
+    for row in rows:
+        point = {"bucket": row.bucket}
+        point.update({column: getattr(row, column) for column in columns})
+        point.update(
+            started=int(row.started),
+            succeeded=int(row.succeeded),
+            failed=int(row.failed),
+            duration_count=int(row.duration_count),
+            duration_avg=(
+                int(row.duration_ms) / int(row.duration_count) / 1000
+                if row.duration_count
+                else None
+            ),
+        )
+        series.append(point)
+    return series
 
-        for p in process:
 
-            tasks = get_history_tasks_by_father(p.father)
-            tasks = [
-                (task.name, task.order, task.status, task.update) for task in tasks
-            ]
-            tasks = sorted(tasks, key=lambda x: x[1])
-            tasks_updated = [(task) for task in tasks if task[3]]
-            tasks_finished = [task for task in tasks_updated if task[2] != "running"]
+STATS_PERCENTILES_BY = {**STATS_SERIES_BY, "version": "version"}
 
-            last_task = (
-                tasks[0]
-                if len(tasks_updated) == 0
-                else sorted(tasks_updated, key=lambda x: x[3], reverse=True)[0]
-            )
 
-            progress = 0
-            if last_task[2] != "pending":
-                if tasks_updated and not tasks_finished:
-                    progress = 0.01
-                else:
-                    progress = len(tasks_finished) / len(tasks)
-
-            process_dashboard.append(
-                {
-                    "id": p.father,
-                    "worker": worker.nombre,
-                    "step": last_task[0],
-                    "status": last_task[2],
-                    "last_update": last_task[3],
-                    "progress": f"{int(progress*100)}%",
-                }
-            )
+@with_session
+def db_stats_percentiles(
+    kind="task",
+    worker_id=None,
+    name=None,
+    version=None,
+    by=("worker", "name", "version"),
+    db=None,
+):
+    """Número de duraciones y p50, p90 y p99 (en segundos) de tareas o procesos.
 
-    return process_dashboard
+    Los grupos se separan por las columnas de by ("worker", "name" y/o
+    "version"); sin by se juntan todos los sketches del kind.
+    """
+    if kind not in ["task", "process"]:
+        raise ValueError("kind debe ser task o process")
+    unknown = [column for column in by if column not in STATS_PERCENTILES_BY]
+    if unknown:
+        raise ValueError(f"by solo admite: {', '.join(STATS_PERCENTILES_BY)}")
 
+    columns = [STATS_PERCENTILES_BY[column] for column in by]
+    return get_sketch_quantiles(kind, worker_id, name, version, columns, db=db)
 
-def db_dashboard_workers():
-    workers = get_workers()
 
-    worker_dashboard = []
+@with_session
+def db_rebuild_stats(db=None):
+    """Recalcula los cubos de /stats/timeseries y los cuantiles de /stats/percentiles.
 
-    for worker in workers:
-        worker_health = generate_datetime() - worker.last_healthcheker
-        worker_status = (
-            "online" if worker_health.seconds < MAX_HEALTHCHECK else "ofline"
-        )
+    Devuelve cuántos cubos y cuántos bins quedan.
+    """
+    return rebuild_stats_rollups(db), rebuild_duration_sketches(db)
 
-        process = get_process_by_worker(worker.id)
-        process_status = dict(Counter([p.status for p in process]))
-        process_time = [(p.finished - p.created).seconds for p in process if p.finished]
 
-        print(worker_status)
+@with_session
+def db_rebuild_summaries(db=None):
+    """Recalcula desde cero los contadores de workers y procesos.
 
-        worker_dashboard.append(
-            {
-                "id": worker.id,
-                "status": worker_status,
-                "processed": len(process),
-                "active": process_status.get("running", 0),
-                "successed": process_status.get("success", 0),
-                "failed": process_status.get("error", 0),
-                "load_average": (
-                    "NA"
-                    if len(process_time) == 0
-                    else str(sum(process_time) / len(process_time))
-                ),
-            }
-        )
+    Todas las filas recalculadas llevan un seq nuevo, así /changes y las
+    versiones de los dashboards (ETag) reflejan los contadores corregidos.
+    """
+    rebuilt = rebuild_process_summaries(db)
+    rebuild_worker_summaries(db)
+    stamp_all_summaries(db)
 
-    return worker_dashboard
+    return rebuilt
 
 
 if __name__ == "__main__":
@@ -304,7 +963,7 @@ if __name__ == "__main__":
 
     print(worker_dashboard)
 
-    process_dashboard = db_dashboard_process(worker_id)
+    process_dashboard, _ = db_dashboard_process(worker_id)
     process_dashboard = [
         {
             "id": "process_624f10f5-e697-469d-8d59-ed4eee3cdd75",
@@ -327,5 +986,5 @@ if __name__ == "__main__":
     print(process_dashboard)
     print()
 
-    tasks_dashboard = db_dashboard_tasks(father_data)
+    tasks_dashboard, _ = db_dashboard_tasks(father_data)
     print(tasks_dashboard)
@@ -0,0 +1,205 @@
+"""Exportación de las tareas (con su proceso y worker) en CSV, Arrow o Parquet.
+
+Las filas se leen con un cursor del lado del servidor (stream_results) en
+lotes de EXPORT_BATCH_SIZE y cada lote se escribe y se entrega antes de leer
+el siguiente: ni la API ni el CLI tienen nunca el resultado completo en
+memoria. Arrow y Parquet necesitan pyarrow, que es opcional.
+"""
+
+import io
+import os
+import csv
+
+from sqlalchemy import select
+
+from DB.structure import Process, HistoryTask, TaskDetail, Worker, engine
+from DB.crud_archive import processes_with_archive, history_tasks_with_archive
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # opcional: solo para arrow y parquet
+    pa = None
+    pq = None
+
+
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", 10000))
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+# (nombre de la columna exportada, tipo en Arrow)
+EXPORT_COLUMNS = [
+    ("worker_id", "string"),
+    ("worker_name", "string"),
+    ("process_id", "string"),
+    ("process_status", "string"),
+    ("process_created", "timestamp"),
+    ("process_finished", "timestamp"),
+    ("task_id", "string"),
+    ("task_name", "string"),
+    ("task_version", "string"),
+    ("task_order", "int"),
+    ("task_status", "string"),
+    ("task_created", "timestamp"),
+    ("task_started", "timestamp"),
+    ("task_updated", "timestamp"),
+    ("task_details", "string"),
+]
+
+
+def export_query(since, until, worker_id=None, history=False):
+    """Tareas de los procesos creados en [since, until), por proceso y orden."""
+    processes = processes_with_archive() if history else Process.__table__
+    tasks = history_tasks_with_archive() if history else HistoryTask.__table__
+    process, task = processes.c, tasks.c
+
+    query = (
+        select(
+            Worker.id.label("worker_id"),
+            Worker.nombre.label("worker_name"),
+            process.father.label("process_id"),
+            process.status.label("process_status"),
+            process.created.label("process_created"),
+            process.finished.label("process_finished"),
+            task.uuid.label("task_id"),
+            task.name.label("task_name"),
+            task.version.label("task_version"),
+            task.order.label("task_order"),
+            task.status.label("task_status"),
+            task.create.label("task_created"),
+            task.started.label("task_started"),
+            task.update.label("task_updated"),
+            TaskDetail.details.label("task_details"),
+        )
+        .select_from(processes)
+        .join(tasks, task.father == process.father)
+        .join(Worker, Worker.id == process.process)
+        .outerjoin(TaskDetail, TaskDetail.uuid == task.uuid)
+        .where(process.created >= since, process.created < until)
+    )
+    if worker_id:
+        query = query.where(process.process == worker_id)
+
+    return query.order_by(process.created, process.father, task.order)
+
+
+def iter_export_batches(
+    since, until, worker_id=None, history=False, batch_size=EXPORT_BATCH_SIZE
+):
+    """Genera listas de como mucho batch_size filas leídas con un cursor de servidor."""
+    with engine.connect() as conn:
+        result = conn.execution_options(
+            stream_results=True, yield_per=batch_size
+        ).execute(export_query(since, until, worker_id, history))
+
+        for batch in result.partitions():
+            yield batch
+
+
+def csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow([name for name, _ in EXPORT_COLUMNS])
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink:
+    """Destino de pyarrow que guarda lo escrito hasta que se recoge con drain()."""
+
+    closed = False
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def arrow_schema():
+    types = {
+        "string": pa.string(),
+        "int": pa.int32(),
+        "timestamp": pa.timestamp("us"),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in EXPORT_COLUMNS])
+
+
+def check_export_format(file_format):
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(
+            f"Formato no válido: {file_format} ({', '.join(EXPORT_FORMATS)})"
+        )
+    if file_format != "csv" and pa is None:
+        raise ValueError("Arrow y Parquet necesitan pyarrow (pip install pyarrow)")
+
+
+def arrow_chunks(batches, file_format="arrow"):
+    """Arrow IPC (stream) o Parquet, un record batch / row group por lote."""
+    schema = arrow_schema()
+    sink = _ChunkSink()
+    output = pa.PythonFile(sink, mode="w")
+    if file_format == "parquet":
+        writer = pq.ParquetWriter(output, schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_stream(output, schema)
+
+    for batch in batches:
+        columns = list(zip(*batch))
+        record_batch = pa.RecordBatch.from_arrays(
+            [
+                pa.array(values, type=field.type)
+                for values, field in zip(columns, schema)
+            ],
+            schema=schema,
+        )
+        writer.write_batch(record_batch)
+        yield sink.drain()
+
+    writer.close()
+    yield sink.drain()
+
+
+def export_chunks(
+    since,
+    until,
+    worker_id=None,
+    history=False,
+    file_format="csv",
+    batch_size=EXPORT_BATCH_SIZE,
+):
+    """Bytes del fichero exportado, trozo a trozo."""
+    check_export_format(file_format)
+
+    batches = iter_export_batches(since, until, worker_id, history, batch_size)
+    if file_format == "csv":
+        return csv_chunks(batches)
+    return arrow_chunks(batches, file_format)
@@ -0,0 +1,132 @@
+import os
+import atexit
+import threading
+
+from sqlalchemy import bindparam, or_
+
+from DB.structure import Worker, get_session
+from DB.metrics import current_function
+
+
+# segundos entre escrituras en bloque de los latidos; 0 escribe en cada latido
+HEARTBEAT_FLUSH_INTERVAL = float(os.environ.get("HEARTBEAT_FLUSH_INTERVAL", 5))
+
+
+class HeartbeatBuffer:
+    """Buffer en memoria (write-behind) de los latidos de los workers.
+
+    Los latidos se combinan por worker (solo se guarda el más reciente) y se
+    escriben en bloque cada flush_interval segundos con un único UPDATE
+    ejecutado como executemany. El valor en la base de datos nunca va más de
+    flush_interval segundos por detrás del último latido recibido por este
+    proceso; las lecturas del mismo proceso usan latest() y ven el valor al
+    instante.
+    """
+
+    def __init__(self, flush_interval=HEARTBEAT_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+
+        self._pending = {}  # worker_id -> latido aún no escrito en la base de datos
+        self._latest = {}  # worker_id -> último latido visto por este proceso
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def is_known(self, worker_id):
+        return worker_id in self._latest
+
+    def beat(self, worker_id, when):
+        with self._lock:
+            if self._latest.get(worker_id) is None or self._latest[worker_id] < when:
+                self._latest[worker_id] = when
+                self._pending[worker_id] = when
+
+        if self.flush_interval <= 0:
+            self.flush()
+        else:
+            self._start()
+
+    def latest(self, worker_id, default=None):
+        """Devuelve el latido más reciente entre el buffer y el valor recibido."""
+        buffered = self._latest.get(worker_id)
+        if buffered is None:
+            return default
+        if default is None:
+            return buffered
+        return max(buffered, default)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+
+            if not pending:
+                return 0
+
+            table = Worker.__table__
+            statement = (
+                table.update()
+                .where(table.c.id == bindparam("b_id"))
+                # otro proceso de gunicorn pudo escribir ya un latido más nuevo
+                .where(
+                    or_(
+                        table.c.last_healthcheker.is_(None),
+                        table.c.last_healthcheker < bindparam("b_last"),
+                    )
+                )
+                .values(last_healthcheker=bindparam("b_last"))
+            )
+            rows = [
+                {"b_id": worker_id, "b_last": when}
+                for worker_id, when in pending.items()
+            ]
+
+            with get_session() as db:
+                try:
+                    db.execute(statement, rows)
+                    db.commit()
+                except Exception as e:
+                    db.rollback()  # Revertir la transacción en caso de error
+
+                    # se devuelven al buffer sin pisar latidos más nuevos
+                    with self._lock:
+                        for worker_id, when in pending.items():
+                            if self._pending.get(worker_id) is None:
+                                self._pending[worker_id] = when
+                    raise e
+
+            return len(rows)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _start(self):
+        if self._thread is not None:
+            return
+
+        with self._lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name="heartbeat-flush", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        # en /metrics las escrituras en bloque aparecen con su propia etiqueta
+        current_function.set("heartbeat_buffer.flush")
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error al escribir los latidos: {e}")
+
+
+heartbeat_buffer = HeartbeatBuffer()
+
+atexit.register(heartbeat_buffer.flush)
@@ -0,0 +1,75 @@
+"""Estado online/ofline de los workers, guardado en workers.status.
+
+Un hilo de la API llama cada LIVENESS_INTERVAL segundos a db_sweep_workers
+(DB/db_control.py): marca "ofline" los workers sin latido en MAX_HEALTHCHECK
+segundos y "stale" sus procesos en marcha, y vuelve a marcar "online" (y
+"running") los que han vuelto. Los dashboards y /changes leen la columna, así
+que "workers ofline" o "procesos en marcha en workers caídos" son consultas
+sobre los índices (status, last_healthcheker) y (process, status, created).
+
+El estado puede ir hasta LIVENESS_INTERVAL segundos por detrás de los
+latidos. Con LIVENESS_INTERVAL=0 no hay hilo y el estado solo cambia con
+`python manage.py sweep-workers`.
+
+El mismo hilo borra cada EVENTS_PRUNE_INTERVAL segundos los change_events de
+hace más de EVENTS_RETENTION segundos, haya o no clientes en /stream. Sin hilo
+hay que borrarlos con `python manage.py prune-events`.
+"""
+
+import os
+import time
+import threading
+
+from DB.db_control import db_sweep_workers
+from DB.crud_change_events import prune_change_events
+
+
+LIVENESS_INTERVAL = float(os.environ.get("LIVENESS_INTERVAL", 5))  # 0: desactivado
+EVENTS_RETENTION = float(os.environ.get("EVENTS_RETENTION", 3600))  # segundos
+EVENTS_PRUNE_INTERVAL = 60
+
+
+class LivenessSweeper:
+    def __init__(self, interval=LIVENESS_INTERVAL):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_prune = None
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+
+        self._thread = threading.Thread(
+            target=self._run, name="liveness-sweeper", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                swept = db_sweep_workers()
+                for status, worker_ids in swept.items():
+                    if worker_ids:
+                        print(f"Workers {status}: {', '.join(worker_ids)}")
+            except Exception as e:
+                print(f"Error al revisar los latidos: {e}")
+
+            self._prune_events()
+
+    def _prune_events(self):
+        now = time.monotonic()
+        if self._last_prune and now - self._last_prune < EVENTS_PRUNE_INTERVAL:
+            return
+
+        self._last_prune = now
+        try:
+            prune_change_events(EVENTS_RETENTION)
+        except Exception as e:
+            print(f"Error al borrar los eventos antiguos: {e}")
+
+
+liveness_sweeper = LivenessSweeper()
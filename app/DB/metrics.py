@@ -0,0 +1,257 @@
+"""Métricas del proceso en el formato de texto de Prometheus (/metrics).
+
+Sin dependencias: contadores, gauges e histogramas con etiquetas, protegidos
+por un lock y exportados con render(). Las consultas SQL se miden con los
+eventos before/after_cursor_execute del engine (instrument_engine) y se
+etiquetan con la función de acceso a datos en curso, que fija with_session a
+través de la variable de contexto current_function. El middleware de
+request_metrics.py suma además las consultas y su tiempo a la petición HTTP
+en curso (request_queries).
+
+Cada proceso de gunicorn tiene sus propias métricas; Prometheus las recoge
+por separado. Con METRICS_ENABLED=0 no se registra ningún evento.
+"""
+
+import os
+import time
+import bisect
+import threading
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+# función de acceso a datos (módulo.función) que está ejecutando consultas
+current_function = ContextVar("current_function", default="other")
+# [consultas, segundos] de la petición HTTP en curso, o None fuera de una
+request_queries = ContextVar("request_queries", default=None)
+
+
+def function_label(function):
+    return f"{function.__module__.rsplit('.', 1)[-1]}.{function.__qualname__}"
+
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    escaped = (
+        str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        for value in values
+    )
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{format_labels(self.labels, key)} {format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=HTTP_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, *labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # [cuenta por cubo (el último es +Inf), suma]
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        with self._lock:
+            values = sorted((key, (list(c), s)) for key, (c, s) in self._values.items())
+
+        lines = self.header()
+        bucket_labels = self.labels + ("le",)
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = bound if bound == "+Inf" else format_value(float(bound))
+                lines.append(
+                    f"{self.name}_bucket{format_labels(bucket_labels, key + (le,))} "
+                    f"{cumulative}"
+                )
+            suffix = format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{suffix} {format_value(total)}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self, extra=()):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        lines.extend(extra)
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_requests = registry.register(
+    Counter(
+        "http_requests_total",
+        "Peticiones HTTP atendidas",
+        ("method", "route", "status"),
+    )
+)
+http_duration = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "Duración de las peticiones HTTP",
+        ("method", "route"),
+    )
+)
+http_in_progress = registry.register(
+    Gauge(
+        "http_requests_in_progress",
+        "Peticiones HTTP en curso",
+        ("method",),
+    )
+)
+http_db_queries = registry.register(
+    Histogram(
+        "http_request_db_queries",
+        "Consultas SQL por petición HTTP",
+        ("route",),
+        QUERY_COUNT_BUCKETS,
+    )
+)
+http_db_duration = registry.register(
+    Histogram(
+        "http_request_db_duration_seconds",
+        "Tiempo en consultas SQL por petición HTTP",
+        ("route",),
+    )
+)
+db_query_duration = registry.register(
+    Histogram(
+        "db_query_duration_seconds",
+        "Duración de las consultas SQL por función de acceso a datos",
+        ("function",),
+        QUERY_BUCKETS,
+    )
+)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_start
+    db_query_duration.observe(current_function.get(), value=elapsed)
+
+    totals = request_queries.get()
+    if totals is not None:
+        # la lista la comparten la petición y el hilo del pool que ejecuta la consulta
+        totals[0] += 1
+        totals[1] += elapsed
+
+
+def instrument_engine(engine):
+    """Mide todas las consultas de un engine síncrono (o async_engine.sync_engine)."""
+    if not METRICS_ENABLED:
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def pool_metric_lines(snapshot):
+    """Ocupación del pool y esperas (de PoolMetrics.snapshot) como gauges/contadores."""
+    gauges = [
+        ("db_pool_size", "Conexiones del pool", snapshot["size"]),
+        ("db_pool_checked_out", "Conexiones en uso", snapshot["checked_out"]),
+        (
+            "db_pool_overflow",
+            "Conexiones por encima de pool_size",
+            snapshot["overflow"],
+        ),
+        (
+            "db_pool_wait_max_seconds",
+            "Espera máxima por una conexión",
+            snapshot["wait_max"],
+        ),
+        (
+            "db_pool_wait_p99_seconds",
+            "Percentil 99 de las últimas esperas",
+            snapshot["wait_p99"],
+        ),
+    ]
+    lines = []
+    for name, help, value in gauges:
+        if value is None:  # NullPool/StaticPool
+            continue
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+        lines.append(f"{name} {format_value(value)}")
+
+    wait_total = snapshot["wait_avg"] * snapshot["checkouts"]
+    lines += [
+        "# HELP db_pool_checkouts_total Conexiones obtenidas del pool por las peticiones",
+        "# TYPE db_pool_checkouts_total counter",
+        f"db_pool_checkouts_total {snapshot['checkouts']}",
+        "# HELP db_pool_wait_seconds_total Tiempo total esperando una conexión",
+        "# TYPE db_pool_wait_seconds_total counter",
+        f"db_pool_wait_seconds_total {format_value(float(wait_total))}",
+    ]
+    return lines
@@ -0,0 +1,522 @@
+"""Migraciones versionadas del esquema.
+
+Base.metadata.create_all solo crea las tablas que faltan, nunca modifica las
+existentes. Cada migración de MIGRATIONS se aplica una sola vez, en orden, y
+queda registrada en la tabla schema_migrations. Las migraciones deben ser
+idempotentes (comprobar antes de crear), porque en una base de datos nueva
+create_all ya deja el esquema en su última versión.
+
+En una base de datos existente create_all va después de las migraciones, y
+cada migración crea las tablas que necesita: una tabla nueva con una clave
+foránea BINARY(16) hacia workers.id o processes.father no puede crearse
+mientras esas columnas sigan siendo VARCHAR (MariaDB la rechaza con el
+errno 150), así que worker_summaries, processes e history_tasks solo se
+crean de nuevo en la 0006, tras convertir los ids.
+"""
+
+from datetime import datetime
+from contextlib import contextmanager
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    column,
+    delete,
+    insert,
+    inspect,
+    select,
+    text,
+)
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.sql import sqltypes
+
+
+migrations_metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    migrations_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String(255)),
+    Column("applied", DateTime),
+)
+
+
+# Helpers para escribir migraciones idempotentes
+
+
+def create_index_if_missing(conn, index):
+    existing = [i["name"] for i in inspect(conn).get_indexes(index.table.name)]
+    if index.name not in existing:
+        index.create(bind=conn)
+
+
+def create_named_indexes(conn, table, *names):
+    """Crea los índices names de table (definidos en el modelo) que falten.
+
+    Cada migración nombra solo los índices que introduce: el modelo va
+    sumando índices sobre columnas que añaden migraciones posteriores.
+    """
+    indexes = {index.name: index for index in table.indexes}
+    for name in names:
+        create_index_if_missing(conn, indexes[name])
+
+
+def drop_index_if_exists(conn, table_name, index_name):
+    existing = [i["name"] for i in inspect(conn).get_indexes(table_name)]
+    if index_name in existing:
+        on = f" ON {table_name}" if conn.dialect.name == "mysql" else ""
+        conn.execute(text(f"DROP INDEX {index_name}{on}"))
+
+
+def create_tables_if_missing(conn, metadata, *names):
+    # solo tablas sin claves foráneas hacia ids que aún puedan ser texto
+    metadata.create_all(bind=conn, tables=[metadata.tables[name] for name in names])
+
+
+def add_column_if_missing(conn, table, column_name):
+    existing = [c["name"] for c in inspect(conn).get_columns(table.name)]
+    if column_name not in existing:
+        column = CreateColumn(table.c[column_name]).compile(dialect=conn.dialect)
+        conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column}"))
+
+
+# Migraciones
+
+
+def _migration_0001_hot_indexes(conn, metadata):
+    # get_process_by_worker filtra por processes.process y
+    # get_history_tasks_by_father por history_tasks.father
+    create_named_indexes(
+        conn, metadata.tables["processes"], "ix_processes_process_status_created"
+    )
+    create_named_indexes(
+        conn, metadata.tables["history_tasks"], "ix_history_tasks_father_order"
+    )
+
+
+def _migration_0002_summary_counters(conn, metadata):
+    # columnas nuevas de processes; worker_summaries (con clave foránea a
+    # workers.id) se crea aquí solo si los ids ya son binarios, y si no en la 0006
+    processes = metadata.tables["processes"]
+    for column_name in [
+        "tasks_total",
+        "tasks_updated",
+        "tasks_finished",
+        "step",
+        "step_order",
+        "step_status",
+        "last_update",
+    ]:
+        add_column_if_missing(conn, processes, column_name)
+
+    if _stores_text_ids(conn, processes):
+        # los modelos ya usan ids binarios: se recalculan en la 0006 tras convertirlos
+        return
+
+    from DB.crud_process import rebuild_process_summaries
+    from DB.crud_worker_summary import rebuild_worker_summaries
+
+    create_tables_if_missing(conn, metadata, "worker_summaries")
+    rebuild_process_summaries(conn)
+    rebuild_worker_summaries(conn)
+
+
+def _migration_0003_dashboard_keyset(conn, metadata):
+    # paginación de /dashboard_process/{id} por (created, father) dentro del worker
+    create_named_indexes(
+        conn, metadata.tables["processes"], "ix_processes_process_created_father"
+    )
+
+
+def _migration_0004_retention(conn, metadata):
+    # tablas *_archive (sin claves foráneas); la retención busca por finished
+    create_tables_if_missing(
+        conn, metadata, "processes_archive", "history_tasks_archive"
+    )
+    create_named_indexes(conn, metadata.tables["processes"], "ix_processes_finished")
+
+
+def _migration_0005_export_range(conn, metadata):
+    # la exportación filtra todos los procesos por rango de created
+    create_named_indexes(conn, metadata.tables["processes"], "ix_processes_created")
+
+
+def _id_columns(table):
+    # columnas con ids "<prefijo>_<uuid>" (tipo PrefixedUUID): nombre -> prefijo
+    return {
+        column.name: column.type.prefix
+        for column in table.columns
+        if getattr(column.type, "prefix", None)
+    }
+
+
+def _stores_text_ids(conn, table):
+    # True si la tabla existe y sus ids aún son texto (esquema anterior a 0006)
+    inspector = inspect(conn)
+    if not inspector.has_table(table.name):
+        return False
+    types = {c["name"]: c["type"] for c in inspector.get_columns(table.name)}
+    return any(
+        isinstance(types.get(name), sqltypes.String) for name in _id_columns(table)
+    )
+
+
+def _id_to_bytes_sql(conn, column, prefix):
+    # el mismo cálculo que PrefixedUUID.process_bind_param, en SQL
+    if conn.dialect.name == "mysql":
+        return f"UNHEX(REPLACE(SUBSTRING({column}, {len(prefix) + 2}), '-', ''))"
+    return f"id_to_bytes({column}, '{prefix}')"
+
+
+def _migration_0006_binary_ids(conn, metadata):
+    # ids de workers, procesos y tareas como BINARY(16) en lugar de VARCHAR(100):
+    # las tablas se copian a <tabla>_pre_0006, se crean de nuevo con create_all
+    # (claves, foráneas e índices nuevos) y se rellenan convirtiendo los ids.
+    # En MySQL/MariaDB cada CREATE/DROP/ALTER hace commit, así que la migración
+    # no es atómica: cada paso comprueba lo que ya está hecho y, si una
+    # ejecución anterior se cortó, la siguiente continúa donde se quedó
+    from DB.structure import id_to_bytes
+
+    if conn.dialect.name == "sqlite":
+        conn.connection.dbapi_connection.create_function(
+            "id_to_bytes", 2, id_to_bytes, deterministic=True
+        )
+
+    tables = [table for table in metadata.sorted_tables if _id_columns(table)]
+    preparer = conn.dialect.identifier_preparer
+    inspector = inspect(conn)
+
+    pending = [table for table in tables if _stores_text_ids(conn, table)]
+    for table in pending:
+        backup = f"{table.name}_pre_0006"
+        if not inspector.has_table(backup):
+            conn.execute(text(f"CREATE TABLE {backup} AS SELECT * FROM {table.name}"))
+    # primero las tablas hijas, por las claves foráneas
+    for table in reversed(pending):
+        table.drop(bind=conn)
+    metadata.create_all(bind=conn, tables=tables)
+
+    for table in tables:
+        backup = f"{table.name}_pre_0006"
+        if not inspect(conn).has_table(backup):
+            continue
+
+        id_columns = _id_columns(table)
+        old_columns = inspect(conn).get_columns(backup)
+        existing = [c["name"] for c in inspect(conn).get_columns(table.name)]
+        for old in old_columns:
+            # columnas que ya no están en el modelo: las migra una versión posterior
+            if old["name"] not in existing:
+                conn.execute(
+                    text(
+                        f"ALTER TABLE {table.name} ADD COLUMN "
+                        f"{preparer.quote(old['name'])} "
+                        f"{old['type'].compile(dialect=conn.dialect)}"
+                    )
+                )
+        names = [old["name"] for old in old_columns]
+        target = ", ".join(preparer.quote(name) for name in names)
+        source = ", ".join(
+            _id_to_bytes_sql(conn, preparer.quote(name), id_columns[name])
+            if name in id_columns
+            else preparer.quote(name)
+            for name in names
+        )
+
+        # si una ejecución anterior se cortó tras copiar, la tabla ya tiene filas
+        if conn.execute(select(table).limit(1)).first() is None:
+            conn.execute(
+                text(
+                    f"INSERT INTO {table.name} ({target}) SELECT {source} FROM {backup}"
+                )
+            )
+        conn.execute(text(f"DROP TABLE {backup}"))
+
+    # siempre: si la ejecución anterior se cortó después de borrar las copias,
+    # ya no queda nada pendiente pero los contadores siguen sin calcular
+    from DB.crud_process import rebuild_process_summaries
+    from DB.crud_worker_summary import rebuild_worker_summaries
+
+    rebuild_process_summaries(conn)
+    rebuild_worker_summaries(conn)
+
+
+def _move_to_side_table(conn, table, name, side_table, flag=None, batch_size=1000):
+    # copia los valores no nulos de table.<name> (que ya no está en el modelo) a
+    # side_table, comprimidos por su tipo, marca flag y quita la columna
+    if name not in [c["name"] for c in inspect(conn).get_columns(table.name)]:
+        return
+
+    key = table.primary_key.columns.values()[0]
+    side_key = side_table.primary_key.columns.values()[0]
+    value = column(name)
+
+    last = None
+    while True:
+        query = (
+            select(key, value)
+            .select_from(table)
+            .where(value.isnot(None))
+            .order_by(key)
+            .limit(batch_size)
+        )
+        if last is not None:
+            query = query.where(key > last)
+        rows = conn.execute(query).all()
+        if not rows:
+            break
+
+        keys = [row[0] for row in rows]
+        # por si una ejecución anterior se cortó a medias
+        conn.execute(delete(side_table).where(side_key.in_(keys)))
+        conn.execute(
+            insert(side_table),
+            [{side_key.name: row[0], name: row[1]} for row in rows],
+        )
+        last = keys[-1]
+
+    if flag:
+        conn.execute(
+            text(f"UPDATE {table.name} SET {flag} = 1 WHERE {name} IS NOT NULL")
+        )
+    conn.execute(text(f"ALTER TABLE {table.name} DROP COLUMN {name}"))
+
+
+def _migration_0007_side_details(conn, metadata):
+    # history_tasks.details y processes.error pasan a task_details y
+    # process_errors, comprimidos y fuera de las filas calientes
+    create_tables_if_missing(conn, metadata, "task_details", "process_errors")
+    task_details = metadata.tables["task_details"]
+    process_errors = metadata.tables["process_errors"]
+
+    for name in ["history_tasks", "history_tasks_archive"]:
+        table = metadata.tables[name]
+        add_column_if_missing(conn, table, "has_details")
+        _move_to_side_table(conn, table, "details", task_details, "has_details")
+
+    for name in ["processes", "processes_archive"]:
+        _move_to_side_table(conn, metadata.tables[name], "error", process_errors)
+
+
+def _migration_0008_change_seq(conn, metadata):
+    # columna seq (con su índice) en las filas que devuelve /changes; las filas
+    # existentes quedan con 0 (ver DB/crud_changes.py). La tabla del contador
+    # que creaba esta migración la quita la 0013
+    for name in ["worker_summaries", "processes", "history_tasks"]:
+        table = metadata.tables[name]
+        add_column_if_missing(conn, table, "seq")
+        create_named_indexes(conn, table, f"ix_{name}_seq")
+    for name in ["processes_archive", "history_tasks_archive"]:
+        add_column_if_missing(conn, metadata.tables[name], "seq")
+
+
+def _migration_0009_worker_status(conn, metadata):
+    # estado persistido de los workers; todos empiezan "online" y la primera
+    # pasada de DB/liveness.py marca los que llevan tiempo sin latido
+    workers = metadata.tables["workers"]
+    add_column_if_missing(conn, workers, "status")
+    create_named_indexes(conn, workers, "ix_workers_status_last_healthcheker")
+
+
+def _migration_0010_worker_seq(conn, metadata):
+    # último seq de los procesos de un worker por índice: versión (ETag) de su
+    # dashboard, ver db_dashboard_version
+    create_named_indexes(conn, metadata.tables["processes"], "ix_processes_process_seq")
+
+
+def _migration_0011_archived_seq(conn, metadata):
+    # los procesos archivados llevan el seq de su archivo: /changes los
+    # devuelve en "archived" para que los clientes quiten sus filas
+    processes_archive = metadata.tables["processes_archive"]
+    create_named_indexes(conn, processes_archive, "ix_processes_archive_seq")
+
+
+def _migration_0012_archive_side_tables(conn, metadata):
+    # task_details y process_errors de los procesos ya archivados pasan a sus
+    # tablas de archivo, como hace la retención desde esta versión
+    create_tables_if_missing(
+        conn, metadata, "task_details_archive", "process_errors_archive"
+    )
+    for side, archive, rows in [
+        ("task_details", "task_details_archive", "history_tasks_archive"),
+        ("process_errors", "process_errors_archive", "processes_archive"),
+    ]:
+        side_table = metadata.tables[side]
+        key = side_table.primary_key.columns.values()[0]
+        archived = metadata.tables[rows]
+        archived_key = archived.c[key.name]
+        names = [c.name for c in side_table.columns]
+        conn.execute(
+            insert(metadata.tables[archive]).from_select(
+                names + ["archived"],
+                select(
+                    *[side_table.c[name] for name in names], archived.c.archived
+                ).join(archived, archived_key == key),
+            )
+        )
+        conn.execute(delete(side_table).where(key.in_(select(archived_key))))
+
+
+def _migration_0013_drop_change_sequence(conn, metadata):
+    # el seq es la hora de cada transacción y ya no sale de un contador: los
+    # seq nuevos (microsegundos desde 1970) son mayores que todos los de antes
+    if inspect(conn).has_table("change_sequence"):
+        conn.execute(text("DROP TABLE change_sequence"))
+
+
+def _migration_0014_change_events_seq(conn, metadata):
+    # /stream lee los eventos por el seq de su transacción, no por el id
+    # autoincremental (se asigna al insertar y no al confirmar); los eventos
+    # que ya había quedan con 0. En una base de datos anterior a change_events
+    # la tabla la crea create_all al final
+    change_events = metadata.tables["change_events"]
+    if not inspect(conn).has_table(change_events.name):
+        return
+
+    add_column_if_missing(conn, change_events, "seq")
+    for name in ["ix_change_events_worker_id", "ix_change_events_process_id"]:
+        drop_index_if_exists(conn, change_events.name, name)
+    create_named_indexes(
+        conn,
+        change_events,
+        "ix_change_events_seq",
+        "ix_change_events_worker_seq",
+        "ix_change_events_process_seq",
+    )
+
+
+MIGRATIONS = [
+    (
+        1,
+        "indices (process, status, created) y (father, order)",
+        _migration_0001_hot_indexes,
+    ),
+    (
+        2,
+        "contadores de resumen por worker y por proceso",
+        _migration_0002_summary_counters,
+    ),
+    (
+        3,
+        "índice (process, created, father) para paginar los procesos",
+        _migration_0003_dashboard_keyset,
+    ),
+    (
+        4,
+        "tablas de archivo e índice processes.finished para la retención",
+        _migration_0004_retention,
+    ),
+    (
+        5,
+        "índice processes.created para exportar por rango de fechas",
+        _migration_0005_export_range,
+    ),
+    (
+        6,
+        "ids de workers, procesos y tareas como UUID binario de 16 bytes",
+        _migration_0006_binary_ids,
+    ),
+    (
+        7,
+        "details y error comprimidos en task_details y process_errors",
+        _migration_0007_side_details,
+    ),
+    (
+        8,
+        "secuencia de cambios (seq) para /changes",
+        _migration_0008_change_seq,
+    ),
+    (
+        9,
+        "estado de los workers (online/ofline) en workers.status",
+        _migration_0009_worker_status,
+    ),
+    (
+        10,
+        "índice (process, seq) para la versión del dashboard de un worker",
+        _migration_0010_worker_seq,
+    ),
+    (
+        11,
+        "índice processes_archive.seq para los procesos archivados de /changes",
+        _migration_0011_archived_seq,
+    ),
+    (
+        12,
+        "task_details_archive y process_errors_archive para la retención",
+        _migration_0012_archive_side_tables,
+    ),
+    (
+        13,
+        "seq por hora de la transacción, sin la tabla change_sequence",
+        _migration_0013_drop_change_sequence,
+    ),
+    (
+        14,
+        "seq de la transacción en change_events para /stream",
+        _migration_0014_change_events_seq,
+    ),
+]
+
+
+@contextmanager
+def _migration_lock(conn):
+    # varios procesos de gunicorn arrancan a la vez; en MySQL/MariaDB solo uno migra
+    if conn.dialect.name != "mysql":
+        yield
+        return
+
+    conn.execute(text("SELECT GET_LOCK('schema_migrations', 60)"))
+    try:
+        yield
+    finally:
+        conn.execute(text("SELECT RELEASE_LOCK('schema_migrations')"))
+
+
+def applied_migrations(engine):
+    migrations_metadata.create_all(bind=engine)
+
+    with engine.connect() as conn:
+        return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+def run_migrations(engine, metadata):
+    """Aplica las migraciones pendientes y devuelve las versiones aplicadas.
+
+    Una base de datos nueva se crea entera con create_all antes de migrar (las
+    migraciones no cambian nada); en una existente, create_all va al final y
+    solo crea las tablas que ninguna migración ha creado.
+    """
+    inspector = inspect(engine)
+    if not any(inspector.has_table(name) for name in metadata.tables):
+        metadata.create_all(bind=engine)
+    migrations_metadata.create_all(bind=engine)
+
+    applied_now = []
+    with engine.connect() as conn:
+        with _migration_lock(conn):
+            applied = set(conn.execute(select(schema_migrations.c.version)).scalars())
+            conn.commit()
+
+            for version, description, migration in MIGRATIONS:
+                if version in applied:
+                    continue
+
+                with conn.begin():
+                    migration(conn, metadata)
+                    conn.execute(
+                        schema_migrations.insert().values(
+                            version=version,
+                            description=description,
+                            applied=datetime.now(),
+                        )
+                    )
+                applied_now.append(version)
+
+    metadata.create_all(bind=engine)
+    return applied_now
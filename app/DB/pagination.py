@@ -0,0 +1,58 @@
+"""Paginación por cursor (keyset) para las consultas de los dashboards.
+
+En lugar de OFFSET, cada página continúa desde los valores de la última fila
+de la anterior: WHERE (a, b) > (x, y) ORDER BY a, b LIMIT n. Con un índice
+sobre (a, b) el coste de una página no depende de cuántas filas haya antes.
+El cursor que recibe el cliente son esos valores codificados en base64.
+"""
+
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(*values):
+    raw = [
+        value.isoformat() if isinstance(value, datetime) else value for value in values
+    ]
+    return urlsafe_b64encode(json.dumps(raw).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, *types):
+    """Devuelve los valores del cursor convertidos a types; ValueError si no es válido."""
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        raw = json.loads(urlsafe_b64decode(cursor + padding))
+        assert isinstance(raw, list) and len(raw) == len(types)
+        return tuple(
+            datetime.fromisoformat(value) if kind is datetime else kind(value)
+            for kind, value in zip(types, raw)
+        )
+    except Exception:
+        raise ValueError(f"Cursor no válido: {cursor}")
+
+
+def keyset_after(columns, values, descending=False):
+    """Condición (columns) > (values), o < con descending, escrita sin tuplas.
+
+    Se expande a a > x OR (a = x AND b > y) porque MariaDB no usa el índice
+    con comparaciones de tuplas.
+    """
+    conditions = []
+    for i, (column, value) in enumerate(zip(columns, values)):
+        step = column < value if descending else column > value
+        previous = [c == v for c, v in zip(columns[:i], values[:i])]
+        conditions.append(and_(*previous, step))
+
+    return or_(*conditions)
+
+
+def split_page(rows, limit, cursor_values):
+    """Separa la fila extra (se piden limit + 1) y calcula el cursor siguiente."""
+    if limit is None or len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    return rows, encode_cursor(*cursor_values(rows[-1]))
@@ -0,0 +1,65 @@
+import time
+import threading
+from collections import deque
+
+
+class PoolMetrics:
+    """Tiempos de espera para obtener una conexión del pool y su ocupación.
+
+    Las esperas se miden al abrir la conexión de la sesión de cada petición;
+    los percentiles se calculan sobre las últimas `window` esperas.
+    """
+
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=window)
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record_wait(self, seconds):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            self._recent.append(seconds)
+
+    def timed_checkout(self, db):
+        """Obtiene la conexión de la sesión midiendo la espera en el pool."""
+        start = time.perf_counter()
+        db.connection()
+        self.record_wait(time.perf_counter() - start)
+
+    def snapshot(self, pool):
+        with self._lock:
+            recent = sorted(self._recent)
+            checkouts = self.checkouts
+            wait_total = self.wait_total
+            wait_max = self.wait_max
+
+        def percentile(q):
+            if not recent:
+                return 0.0
+            return recent[min(len(recent) - 1, int(q * len(recent)))]
+
+        # NullPool/StaticPool no tienen todos estos contadores
+        def pool_value(name):
+            value = getattr(pool, name, None)
+            return value() if callable(value) else None
+
+        return {
+            "pool": pool.__class__.__name__,
+            "size": pool_value("size"),
+            "checked_out": pool_value("checkedout"),
+            "checked_in": pool_value("checkedin"),
+            "overflow": pool_value("overflow"),
+            "checkouts": checkouts,
+            "wait_avg": wait_total / checkouts if checkouts else 0.0,
+            "wait_max": wait_max,
+            "wait_p50": percentile(0.50),
+            "wait_p95": percentile(0.95),
+            "wait_p99": percentile(0.99),
+        }
+
+
+pool_metrics = PoolMetrics()
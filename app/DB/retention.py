@@ -0,0 +1,143 @@
+"""Retención: archiva los procesos terminados y sus tareas.
+
+Los procesos terminados que salen de la política pasan, con sus tareas, a
+processes_archive e history_tasks_archive (sus detalles y errores, a
+task_details_archive y process_errors_archive). La política es RETENTION_DAYS días
+desde que terminaron y/o RETENTION_KEEP_PER_WORKER procesos por worker.
+Se mueven en lotes de RETENTION_BATCH_SIZE procesos, cada uno en su propia
+transacción, así las tablas principales solo se bloquean lo que dura un lote.
+Los dashboards leen solo las tablas principales salvo con history=true.
+Cada lote toma un seq de /changes: los procesos archivados lo llevan y
+/changes los devuelve en "archived".
+
+Se ejecuta con `python manage.py archive` o, con RETENTION_INTERVAL > 0, en un
+hilo de la API cada RETENTION_INTERVAL segundos. El mismo hilo borra los cubos
+por minuto de /stats/timeseries de más de STATS_MINUTE_RETENTION_DAYS días
+(`python manage.py prune-stats`); los cubos por hora se conservan.
+"""
+
+import os
+import time
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from sqlalchemy import text
+
+from DB.structure import engine, generate_datetime, get_session
+from DB.crud_archive import (
+    archive_processes,
+    get_archive_candidates,
+    get_keep_boundaries,
+)
+from DB.crud_changes import change_seq
+from DB.crud_process import lock_processes
+from DB.crud_worker_summary import stamp_worker_summaries
+from DB.crud_rollups import delete_rollups_before
+
+
+RETENTION_DAYS = float(os.environ.get("RETENTION_DAYS", 0))  # 0: sin límite
+RETENTION_KEEP_PER_WORKER = int(os.environ.get("RETENTION_KEEP_PER_WORKER", 0))
+RETENTION_BATCH_SIZE = int(os.environ.get("RETENTION_BATCH_SIZE", 500))
+RETENTION_PAUSE = float(os.environ.get("RETENTION_PAUSE", 0.1))  # segundos entre lotes
+RETENTION_INTERVAL = float(os.environ.get("RETENTION_INTERVAL", 0))  # 0: desactivado
+STATS_MINUTE_RETENTION_DAYS = float(os.environ.get("STATS_MINUTE_RETENTION_DAYS", 7))
+
+
+@contextmanager
+def _retention_lock():
+    # con varios procesos de gunicorn solo uno archiva; los demás se saltan la ronda
+    if engine.dialect.name != "mysql":
+        yield True
+        return
+
+    with engine.connect() as conn:
+        locked = conn.execute(text("SELECT GET_LOCK('retention', 0)")).scalar()
+        try:
+            yield bool(locked)
+        finally:
+            if locked:
+                conn.execute(text("SELECT RELEASE_LOCK('retention')"))
+
+
+def archive_finished_processes(
+    days=RETENTION_DAYS,
+    keep_per_worker=RETENTION_KEEP_PER_WORKER,
+    batch_size=RETENTION_BATCH_SIZE,
+    pause=RETENTION_PAUSE,
+    max_batches=None,
+):
+    """Archiva por lotes lo que queda fuera de la política y devuelve cuántos procesos movió."""
+    cutoff = generate_datetime() - timedelta(days=days) if days else None
+    archived = 0
+    batches = 0
+
+    with _retention_lock() as locked:
+        if not locked:
+            return 0
+
+        # el límite por worker se calcula una vez por ronda, no en cada lote
+        boundaries = get_keep_boundaries(keep_per_worker) if keep_per_worker else None
+
+        while max_batches is None or batches < max_batches:
+            with get_session() as db:
+                process_ids = get_archive_candidates(
+                    cutoff, boundaries, limit=batch_size, db=db
+                )
+                if not process_ids:
+                    break
+
+                # los procesos antes que sus tareas, en el mismo orden que
+                # db_actualizar_task (ver lock_processes)
+                lock_processes(process_ids, db)
+                seq = change_seq(db)
+                worker_ids = archive_processes(
+                    process_ids, generate_datetime(), db, seq
+                )
+
+                # la fila de cada worker afectado cambia de versión
+                stamp_worker_summaries(worker_ids, seq, db)
+                db.commit()
+
+            archived += len(process_ids)
+            batches += 1
+            time.sleep(pause)
+
+    return archived
+
+
+def prune_minute_rollups(days=STATS_MINUTE_RETENTION_DAYS):
+    """Borra los cubos por minuto de hace más de days días y devuelve cuántos."""
+    if not days:
+        return 0
+    return delete_rollups_before("minute", generate_datetime() - timedelta(days=days))
+
+
+class RetentionJob:
+    def __init__(self, interval=RETENTION_INTERVAL):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                archived = archive_finished_processes()
+                if archived:
+                    print(f"Retención: {archived} procesos archivados")
+                prune_minute_rollups()
+            except Exception as e:
+                print(f"Error en la retención: {e}")
+
+
+retention_job = RetentionJob()
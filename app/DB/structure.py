@@ -1,4 +1,8 @@
 import os
+import time
+import uuid
+import zlib
+import functools
 
 from datetime import datetime
 
@@ -6,64 +10,194 @@ from sqlalchemy import (
     create_engine,
     Column,
     Integer,
+    BigInteger,
+    Boolean,
     String,
     Date,
     JSON,
     ForeignKey,
     DateTime,
+    Index,
+    LargeBinary,
+    Table,
+    TypeDecorator,
 )
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
 from sqlalchemy.orm import sessionmaker, relationship
 from sqlalchemy.dialects.mysql import JSON as MySQLJSON  # Importar JSON para MySQL
+from sqlalchemy.dialects.mysql import BINARY, MEDIUMBLOB
+
+from DB.metrics import current_function, function_label, instrument_engine
 
 
 Base = declarative_base()
 
 
-is_sqlite = False
-is_mysql = True
+# Claves de workers, procesos y tareas
+
+
+def id_to_bytes(value, prefix):
+    """Los 16 bytes del UUID de un id "<prefijo>_<uuid>", o None si no lo es."""
+    if not isinstance(value, str) or not value.startswith(prefix + "_"):
+        return None
+    try:
+        return uuid.UUID(value[len(prefix) + 1 :]).bytes
+    except ValueError:
+        return None
+
+
+class PrefixedUUID(TypeDecorator):
+    """Id "<prefijo>_<uuid>" de la API guardado como los 16 bytes del UUID.
+
+    En la base de datos las claves primarias, las foráneas y los índices que
+    las contienen ocupan 16 bytes en lugar de unos 45 caracteres; fuera de
+    ella (consultas, resultados, API) el id sigue siendo el mismo texto. Un
+    valor que no tiene el formato se convierte en NULL y no coincide con
+    ninguna fila.
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def __init__(self, prefix):
+        super().__init__(length=16)
+        self.prefix = prefix
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "mysql":
+            return dialect.type_descriptor(BINARY(16))
+        return dialect.type_descriptor(LargeBinary(16))
+
+    def process_bind_param(self, value, dialect):
+        return id_to_bytes(value, self.prefix)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return f"{self.prefix}_{uuid.UUID(bytes=bytes(value))}"
+
+
+WorkerId = PrefixedUUID("worker")
+ProcessId = PrefixedUUID("process")
+TaskId = PrefixedUUID("task")
+
+
+class CompressedText(TypeDecorator):
+    """Texto guardado comprimido con zlib (MEDIUMBLOB en MySQL/MariaDB)."""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "mysql":
+            return dialect.type_descriptor(MEDIUMBLOB())
+        return dialect.type_descriptor(LargeBinary())
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return zlib.compress(value.encode("utf-8"))
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return zlib.decompress(value).decode("utf-8")
+
+
+def uuid7():
+    """UUID versión 7: los primeros 48 bits son los milisegundos desde 1970.
+
+    Las claves nuevas son crecientes y se insertan al final del índice de la
+    clave primaria en lugar de en una página al azar.
+    """
+    value = (time.time_ns() // 1_000_000) << 80 | int.from_bytes(os.urandom(10), "big")
+    value = value & ~(0xF << 76) | (0x7 << 76)  # versión
+    value = value & ~(0x3 << 62) | (0x2 << 62)  # variante RFC 4122
+    return uuid.UUID(int=value)
+
+
+def new_id(prefix):
+    return f"{prefix}_{uuid7()}"
+
+
+# "mysql" (MariaDB, por defecto) o "sqlite" para uso local
+DB_ENGINE = os.environ.get("DB_ENGINE", "mysql")
+
+is_sqlite = DB_ENGINE == "sqlite"
+is_mysql = not is_sqlite
 
 
 MYSQL_USER = os.environ.get("MYSQL_USER")
 MYSQL_PASSWORD = os.environ.get("MYSQL_PASSWORD")
 MYSQL_DATABASE = os.environ.get("MYSQL_DATABASE")
 SERVER = os.environ.get("SERVER")
+SQLITE_PATH = os.environ.get("SQLITE_PATH", "example.db")
 
 
 if is_sqlite:
     # Configuración de la base de datos
-    DATABASE_URL = "sqlite:///example.db"  # ./example.db
-    # DATABASE_URL = "sqlite:////backup_db/example.db"  # /backup_db/example.db
+    DATABASE_URL = f"sqlite:///{SQLITE_PATH}"  # ./example.db
+    # SQLITE_PATH=/backup_db/example.db  # /backup_db/example.db
 
     # Clase para la tabla Workers
     class Worker(Base):
         __tablename__ = "workers"
 
-        id = Column(String, primary_key=True, index=True)  # UUID
+        id = Column(WorkerId, primary_key=True, index=True)
         nombre = Column(String)
         version = Column(String)
         last_healthcheker = Column(DateTime)
         datetime = Column(DateTime)
         tasks = Column(JSON)  # Lista de tareas almacenadas como JSON
+        # "online" u "ofline", lo mantiene DB/liveness.py
+        status = Column(String(10), nullable=False, server_default="online")
+
+        __table_args__ = (
+            Index("ix_workers_status_last_healthcheker", "status", "last_healthcheker"),
+        )
 
     # Clase para la tabla Processes
     class Process(Base):
         __tablename__ = "processes"
 
-        father = Column(String, primary_key=True)
-        process = Column(String, ForeignKey("workers.id"))
+        father = Column(ProcessId, primary_key=True)
+        process = Column(WorkerId, ForeignKey("workers.id"))
         created = Column(DateTime)
         finished = Column(DateTime, nullable=True)  # Nullable por si no se ha terminado
         status = Column(String)
-        error = Column(String)
+
+        # resumen de las tareas, mantenido por db_control en cada cambio de estado
+        tasks_total = Column(Integer, default=0)
+        tasks_updated = Column(Integer, default=0)
+        tasks_finished = Column(Integer, default=0)
+        step = Column(String, nullable=True)
+        step_order = Column(Integer, nullable=True)
+        step_status = Column(String, nullable=True)
+        last_update = Column(DateTime, nullable=True)
+        seq = Column(BigInteger, nullable=False, server_default="0")  # ver /changes
 
         worker = relationship("Worker")
 
+        __table_args__ = (
+            Index(
+                "ix_processes_process_status_created", "process", "status", "created"
+            ),
+            Index(
+                "ix_processes_process_created_father", "process", "created", "father"
+            ),
+            Index("ix_processes_finished", "finished"),
+            Index("ix_processes_created", "created"),
+            Index("ix_processes_seq", "seq"),
+            Index("ix_processes_process_seq", "process", "seq"),
+        )
+
     # Clase para la tabla HistoryTask
     class HistoryTask(Base):
         __tablename__ = "history_tasks"
 
-        uuid = Column(String, primary_key=True)
+        uuid = Column(TaskId, primary_key=True)
         name = Column(String)
         status = Column(String)
         order = Column(Integer)
@@ -71,11 +205,52 @@ if is_sqlite:
         create = Column(DateTime)
         started = Column(DateTime)
         update = Column(DateTime)
-        details = Column(String, nullable=True)
-        father = Column(String, ForeignKey("processes.father"))
+        has_details = Column(Boolean, default=False)  # texto en task_details
+        seq = Column(BigInteger, nullable=False, server_default="0")  # ver /changes
+        father = Column(ProcessId, ForeignKey("processes.father"))
 
         process_relation = relationship("Process")
 
+        __table_args__ = (
+            Index("ix_history_tasks_father_order", "father", "order"),
+            Index("ix_history_tasks_seq", "seq"),
+        )
+
+    # Clase para la tabla WorkerSummary (contadores de procesos por worker)
+    class WorkerSummary(Base):
+        __tablename__ = "worker_summaries"
+
+        worker_id = Column(WorkerId, ForeignKey("workers.id"), primary_key=True)
+        processed = Column(Integer, default=0)
+        running = Column(Integer, default=0)
+        success = Column(Integer, default=0)
+        error = Column(Integer, default=0)
+        duration_sum = Column(Integer, default=0)  # segundos
+        duration_count = Column(Integer, default=0)
+        seq = Column(BigInteger, nullable=False, server_default="0")  # ver /changes
+
+        __table_args__ = (Index("ix_worker_summaries_seq", "seq"),)
+
+    # Clase para la tabla ChangeEvent (cambios que se envían a los dashboards)
+    class ChangeEvent(Base):
+        __tablename__ = "change_events"
+
+        id = Column(Integer, primary_key=True, autoincrement=True)
+        created = Column(DateTime)
+        kind = Column(String)  # "worker", "process" o "task"
+        entity_id = Column(String)
+        worker_id = Column(WorkerId, nullable=True)
+        process_id = Column(ProcessId, nullable=True)
+        payload = Column(JSON)  # fila del dashboard correspondiente
+        seq = Column(BigInteger, nullable=False, server_default="0")  # ver /changes
+
+        __table_args__ = (
+            Index("ix_change_events_created", "created"),
+            Index("ix_change_events_seq", "seq"),
+            Index("ix_change_events_worker_seq", "worker_id", "seq"),
+            Index("ix_change_events_process_seq", "process_id", "seq"),
+        )
+
 elif is_mysql:
     DATABASE_URL = (
         f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{SERVER}/{MYSQL_DATABASE}"
@@ -85,37 +260,59 @@ elif is_mysql:
     class Worker(Base):
         __tablename__ = "workers"
 
-        id = Column(
-            String(100), primary_key=True, index=True
-        )  # UUID con longitud especificada
+        id = Column(WorkerId, primary_key=True, index=True)
         nombre = Column(String(255))  # Especifica la longitud
         version = Column(String(50))  # Especifica la longitud
         last_healthcheker = Column(DateTime)
         datetime = Column(DateTime)
         tasks = Column(MySQLJSON)  # Cambia a MySQL JSON si es necesario
+        # "online" u "ofline", lo mantiene DB/liveness.py
+        status = Column(String(10), nullable=False, server_default="online")
+
+        __table_args__ = (
+            Index("ix_workers_status_last_healthcheker", "status", "last_healthcheker"),
+        )
 
     # Clase para la tabla Processes
     class Process(Base):
         __tablename__ = "processes"
 
-        father = Column(String(100), primary_key=True)  # Especifica la longitud
-        process = Column(
-            String(100), ForeignKey("workers.id")
-        )  # Especifica la longitud
+        father = Column(ProcessId, primary_key=True)
+        process = Column(WorkerId, ForeignKey("workers.id"))
         created = Column(DateTime)
         finished = Column(DateTime, nullable=True)  # Nullable por si no se ha terminado
         status = Column(String(50))  # Especifica la longitud
-        error = Column(
-            String(4096), nullable=True
-        )  # Especifica la longitud y permite nulos
+
+        # resumen de las tareas, mantenido por db_control en cada cambio de estado
+        tasks_total = Column(Integer, default=0)
+        tasks_updated = Column(Integer, default=0)
+        tasks_finished = Column(Integer, default=0)
+        step = Column(String(255), nullable=True)
+        step_order = Column(Integer, nullable=True)
+        step_status = Column(String(50), nullable=True)
+        last_update = Column(DateTime, nullable=True)
+        seq = Column(BigInteger, nullable=False, server_default="0")  # ver /changes
 
         worker = relationship("Worker")
 
+        __table_args__ = (
+            Index(
+                "ix_processes_process_status_created", "process", "status", "created"
+            ),
+            Index(
+                "ix_processes_process_created_father", "process", "created", "father"
+            ),
+            Index("ix_processes_finished", "finished"),
+            Index("ix_processes_created", "created"),
+            Index("ix_processes_seq", "seq"),
+            Index("ix_processes_process_seq", "process", "seq"),
+        )
+
     # Clase para la tabla HistoryTask
     class HistoryTask(Base):
         __tablename__ = "history_tasks"
 
-        uuid = Column(String(100), primary_key=True)  # Especifica la longitud
+        uuid = Column(TaskId, primary_key=True)
         name = Column(String(255))  # Especifica la longitud
         status = Column(String(50))  # Especifica la longitud
         order = Column(Integer)
@@ -123,22 +320,162 @@ elif is_mysql:
         create = Column(DateTime)
         started = Column(DateTime)
         update = Column(DateTime)
-        details = Column(
-            String(4096), nullable=True
-        )  # Especifica la longitud y permite nulos
-        father = Column(
-            String(100), ForeignKey("processes.father")
-        )  # Especifica la longitud
+        has_details = Column(Boolean, default=False)  # texto en task_details
+        seq = Column(BigInteger, nullable=False, server_default="0")  # ver /changes
+        father = Column(ProcessId, ForeignKey("processes.father"))
 
         process_relation = relationship("Process")
 
+        __table_args__ = (
+            Index("ix_history_tasks_father_order", "father", "order"),
+            Index("ix_history_tasks_seq", "seq"),
+        )
+
+    # Clase para la tabla WorkerSummary (contadores de procesos por worker)
+    class WorkerSummary(Base):
+        __tablename__ = "worker_summaries"
 
-engine = create_engine(DATABASE_URL, echo=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        worker_id = Column(WorkerId, ForeignKey("workers.id"), primary_key=True)
+        processed = Column(Integer, default=0)
+        running = Column(Integer, default=0)
+        success = Column(Integer, default=0)
+        error = Column(Integer, default=0)
+        duration_sum = Column(BigInteger, default=0)  # segundos
+        duration_count = Column(Integer, default=0)
+        seq = Column(BigInteger, nullable=False, server_default="0")  # ver /changes
 
+        __table_args__ = (Index("ix_worker_summaries_seq", "seq"),)
+
+    # Clase para la tabla ChangeEvent (cambios que se envían a los dashboards)
+    class ChangeEvent(Base):
+        __tablename__ = "change_events"
+
+        id = Column(BigInteger, primary_key=True, autoincrement=True)
+        created = Column(DateTime)
+        kind = Column(String(20))  # "worker", "process" o "task"
+        entity_id = Column(String(100))
+        worker_id = Column(WorkerId, nullable=True)
+        process_id = Column(ProcessId, nullable=True)
+        payload = Column(MySQLJSON)  # fila del dashboard correspondiente
+        seq = Column(BigInteger, nullable=False, server_default="0")  # ver /changes
 
-# Crear las tablas en la base de datos
-Base.metadata.create_all(bind=engine)
+        __table_args__ = (
+            Index("ix_change_events_created", "created"),
+            Index("ix_change_events_seq", "seq"),
+            Index("ix_change_events_worker_seq", "worker_id", "seq"),
+            Index("ix_change_events_process_seq", "process_id", "seq"),
+        )
+
+
+# Textos largos (detalles de las tareas y error de los procesos) fuera de las filas
+# que recorren los dashboards: se guardan comprimidos y solo se leen por clave.
+
+
+class TaskDetail(Base):
+    __tablename__ = "task_details"
+
+    uuid = Column(TaskId, primary_key=True)
+    details = Column(CompressedText)
+
+
+class ProcessError(Base):
+    __tablename__ = "process_errors"
+
+    father = Column(ProcessId, primary_key=True)
+    error = Column(CompressedText)
+
+
+# Series temporales preagregadas por minuto y por hora (ver DB/crud_rollups.py)
+
+
+class StatsRollup(Base):
+    __tablename__ = "stats_rollups"
+
+    resolution = Column(String(10), primary_key=True)  # "minute" o "hour"
+    bucket = Column(DateTime, primary_key=True)  # inicio del minuto o de la hora
+    worker_id = Column(WorkerId, primary_key=True)
+    kind = Column(String(10), primary_key=True)  # "task" o "process"
+    name = Column(String(255), primary_key=True)  # nombre de la tarea; "" en procesos
+    started = Column(Integer, nullable=False, default=0)
+    succeeded = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    duration_ms = Column(BigInteger, nullable=False, default=0)  # suma
+    duration_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_stats_rollups_worker_bucket", "resolution", "worker_id", "bucket"),
+    )
+
+
+class DurationSketch(Base):
+    # una fila por intervalo logarítmico de duración (ver DB/crud_sketches.py)
+    __tablename__ = "duration_sketches"
+
+    kind = Column(String(10), primary_key=True)  # "task" o "process"
+    worker_id = Column(WorkerId, primary_key=True)
+    name = Column(String(255), primary_key=True)  # nombre de la tarea; "" en procesos
+    version = Column(String(50), primary_key=True)  # de la tarea o del worker
+    bin = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+# Tablas de archivo: procesos terminados y sus tareas que la retención saca de las
+# tablas principales (ver DB/retention.py). Mismas columnas, sin claves foráneas.
+
+
+def archive_table(model, name, *indexes):
+    columns = [
+        Column(column.name, column.type, primary_key=column.primary_key)
+        for column in model.__table__.columns
+    ]
+    return Table(name, Base.metadata, *columns, Column("archived", DateTime), *indexes)
+
+
+processes_archive = archive_table(
+    Process,
+    "processes_archive",
+    Index("ix_processes_archive_process_created", "process", "created", "father"),
+    Index("ix_processes_archive_seq", "seq"),
+)
+history_tasks_archive = archive_table(
+    HistoryTask,
+    "history_tasks_archive",
+    Index("ix_history_tasks_archive_father_order", "father", "order"),
+)
+task_details_archive = archive_table(TaskDetail, "task_details_archive")
+process_errors_archive = archive_table(ProcessError, "process_errors_archive")
+
+
+# Pool de conexiones: por proceso de gunicorn se usan hasta
+# DB_POOL_SIZE + DB_MAX_OVERFLOW conexiones (con -w 4, cuatro veces eso)
+DB_ECHO = os.environ.get("DB_ECHO", "0") == "1"
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 3600))
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "1") == "1"
+
+ENGINE_OPTIONS = {
+    "echo": DB_ECHO,
+    "pool_pre_ping": DB_POOL_PRE_PING,
+    "pool_recycle": DB_POOL_RECYCLE,
+}
+# con SQLite SQLAlchemy usa su propio pool (uno por hilo o por fichero) y no
+# acepta estas opciones: DB_POOL_SIZE, DB_MAX_OVERFLOW y DB_POOL_TIMEOUT no se usan
+if is_mysql:
+    ENGINE_OPTIONS.update(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+    )
+
+
+engine = create_engine(DATABASE_URL, **ENGINE_OPTIONS)
+instrument_engine(engine)  # métricas de /metrics, ver DB/metrics.py
+# expire_on_commit=False: los objetos devueltos siguen legibles tras el commit
+SessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, expire_on_commit=False, bind=engine
+)
 
 
 # Función para obtener la sesión de la base de datos
@@ -146,9 +483,140 @@ def get_session():
     return SessionLocal()
 
 
+def with_session(function):
+    """Permite llamar a una función de acceso a datos con o sin sesión.
+
+    Si se recibe db=<sesión> la función la usa y el commit queda a cargo de
+    quien la abrió; si no, se abre una sesión propia, se hace commit al
+    terminar y rollback si hay un error.
+
+    Mientras se ejecuta, las consultas SQL se atribuyen a esta función en las
+    métricas (la más interna si unas llaman a otras).
+    """
+
+    label = function_label(function)
+
+    @functools.wraps(function)
+    def wrapper(*args, db=None, **kwargs):
+        token = current_function.set(label)
+        try:
+            if db is not None:
+                return function(*args, db=db, **kwargs)
+
+            with get_session() as db:
+                try:
+                    result = function(*args, db=db, **kwargs)
+                    db.commit()
+                    return result
+                except Exception as e:
+                    db.rollback()  # Revertir la transacción en caso de error
+                    raise e
+        finally:
+            current_function.reset(token)
+
+    return wrapper
+
+
 # datetime
 
 
+class seconds_between(FunctionElement):
+    """Segundos enteros entre dos columnas DateTime, calculados en la base de datos."""
+
+    type = Integer()
+    inherit_cache = True
+
+
+@compiles(seconds_between)
+def _seconds_between_sqlite(element, compiler, **kw):
+    start, end = list(element.clauses)
+    # julianday trabaja en días; se redondea a milisegundos antes de truncar
+    return (
+        "CAST(ROUND((julianday(%s) - julianday(%s)) * 86400000) / 1000 AS INTEGER)"
+        % (
+            compiler.process(end, **kw),
+            compiler.process(start, **kw),
+        )
+    )
+
+
+@compiles(seconds_between, "mysql")
+def _seconds_between_mysql(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return "TIMESTAMPDIFF(SECOND, %s, %s)" % (
+        compiler.process(start, **kw),
+        compiler.process(end, **kw),
+    )
+
+
+class milliseconds_between(FunctionElement):
+    """Milisegundos enteros entre dos columnas DateTime."""
+
+    type = BigInteger()
+    inherit_cache = True
+
+
+@compiles(milliseconds_between)
+def _milliseconds_between_sqlite(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return "CAST(ROUND((julianday(%s) - julianday(%s)) * 86400000) AS INTEGER)" % (
+        compiler.process(end, **kw),
+        compiler.process(start, **kw),
+    )
+
+
+@compiles(milliseconds_between, "mysql")
+def _milliseconds_between_mysql(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return "TIMESTAMPDIFF(MICROSECOND, %s, %s) DIV 1000" % (
+        compiler.process(start, **kw),
+        compiler.process(end, **kw),
+    )
+
+
+class minute_start(FunctionElement):
+    """Una columna DateTime truncada al minuto, igual que bucket_start en Python."""
+
+    type = DateTime()
+    inherit_cache = True
+    # formatos de strftime (SQLite, con el formato en que SQLAlchemy guarda las
+    # fechas) y de DATE_FORMAT (MySQL)
+    sqlite_format = "%Y-%m-%d %H:%M:00.000000"
+    mysql_format = "%Y-%m-%d %H:%i:00"
+
+
+class hour_start(minute_start):
+    """Una columna DateTime truncada a la hora."""
+
+    inherit_cache = True
+    sqlite_format = "%Y-%m-%d %H:00:00.000000"
+    mysql_format = "%Y-%m-%d %H:00:00"
+
+
+@compiles(minute_start)
+@compiles(hour_start)
+def _bucket_start_sqlite(element, compiler, **kw):
+    (moment,) = list(element.clauses)
+    return "strftime('%s', %s)" % (
+        element.sqlite_format,
+        compiler.process(moment, **kw),
+    )
+
+
+@compiles(minute_start, "mysql")
+@compiles(hour_start, "mysql")
+def _bucket_start_mysql(element, compiler, **kw):
+    (moment,) = list(element.clauses)
+    mysql_format = element.mysql_format
+    if compiler.dialect.paramstyle in ("format", "pyformat"):
+        # pymysql y aiomysql sustituyen los parámetros con %: se duplican
+        mysql_format = mysql_format.replace("%", "%%")
+    return "CAST(DATE_FORMAT(%s, '%s') AS DATETIME)" % (
+        compiler.process(moment, **kw),
+        mysql_format,
+    )
+
+
 def generate_datetime():
     """Genera la fecha actual como un objeto datetime."""
     return datetime.now()
@@ -176,3 +644,10 @@ def compare_dates_in_seconds(date_string1, date_string2):
         (date2 - date1).total_seconds()
     )  # Se usa abs para obtener un valor positivo
     return difference
+
+
+# crea las tablas y aplica las migraciones pendientes (ver DB/migrations.py): en
+# una base de datos existente las migraciones van antes que create_all
+from DB.migrations import run_migrations
+
+run_migrations(engine, Base.metadata)
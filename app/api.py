@@ -1,26 +1,59 @@
 import os
-from fastapi import FastAPI, HTTPException, Depends, Header
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 
 from pydantic import BaseModel
 from typing import List, Optional
 from uuid import uuid4
 from datetime import datetime, timedelta
 
-from DB.db_control import (
+from DB import db_control
+from DB.db_control import MAX_HEALTHCHECK
+from DB.async_db_control import (
     db_worker_register,
     db_matricular_proceso,
     db_healthcheaker_worker,
     db_actualizar_task,
-    db_dashboard_workers,
-    db_dashboard_process,
-    db_dashboard_tasks,
+    db_actualizar_tasks,
+    db_dashboard_task,
     db_end_process,
-    MAX_HEALTHCHECK,
+    db_dashboard_response,
+    db_changes,
+    db_stats_timeseries,
+    db_stats_percentiles,
+    get_db,
+    request_pool,
 )
-
-
-app = FastAPI(title="Process monitor")
+from DB.pool_metrics import pool_metrics
+from DB.metrics import registry, pool_metric_lines
+from DB.heartbeat_buffer import heartbeat_buffer
+from DB.retention import retention_job
+from DB.liveness import liveness_sweeper
+from DB.export import EXPORT_FORMATS, export_chunks
+from live_updates import live_updates
+from response_cache import dashboard_cache
+from serialization import STRICT_RESPONSES, FastJSONResponse, serialize_rows
+from request_metrics import RequestMetricsMiddleware
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # solo con RETENTION_INTERVAL > 0 (ver DB/retention.py)
+    retention_job.start()
+    # estado online/ofline de los workers (ver DB/liveness.py)
+    liveness_sweeper.start()
+    yield
+    # escribe los latidos pendientes antes de que el proceso termine
+    heartbeat_buffer.stop()
+    retention_job.stop()
+    liveness_sweeper.stop()
+
+
+app = FastAPI(title="Process monitor", lifespan=lifespan)
 
 
 # Configura CORS
@@ -30,15 +63,22 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Permite todos los métodos (GET, POST, etc.)
     allow_headers=["*"],  # Permite todos los encabezados
+    expose_headers=["X-Next-Cursor", "ETag"],  # cursor de la página siguiente
 )
+# peticiones, latencias y consultas SQL por ruta para /metrics
+app.add_middleware(RequestMetricsMiddleware)
 
 
 # Example token for authentication
 VALID_TOKEN = os.environ.get("TOKEN", "mysecrettoken")
 VERSION = "v1.1"
 
+# tamaño de página por defecto y máximo de /dashboard_process y /dashboard_tasks
+DASHBOARD_PAGE_SIZE = int(os.environ.get("DASHBOARD_PAGE_SIZE", 100))
+MAX_PAGE_SIZE = 1000
+
 
-def authenticate(authorization: Optional[str] = Header(None)):
+async def authenticate(authorization: Optional[str] = Header(None)):
     if authorization != f"Bearer {VALID_TOKEN}":
         raise HTTPException(status_code=401, detail="Unauthorized")
 
@@ -96,6 +136,14 @@ class TaskUpdateIn(BaseModel):
     task_id: str
     status: str
     details: str = None
+    at: datetime = (
+        None  # hora del cambio en el worker (nunca después de la del servidor)
+    )
+
+
+class TaskUpdateOut(BaseModel):
+    task_id: str
+    status: str
 
 
 class TaskDetailOut(BaseModel):
@@ -107,10 +155,14 @@ class TaskDetailOut(BaseModel):
     started: Optional[datetime]
     runtime: timedelta
     father: str
-    details: Optional[str]
+    has_details: bool  # los detalles se piden con /dashboard_task/{id}
     step: str
 
 
+class TaskWithDetailsOut(TaskDetailOut):
+    details: Optional[str]
+
+
 class ProcessDetailOut(BaseModel):
     id: str
     worker: str
@@ -130,26 +182,77 @@ class WorkerDetailOut(BaseModel):
     load_average: str
 
 
+class ChangedTaskOut(TaskDetailOut):
+    seq: int
+
+
+class ChangedProcessOut(ProcessDetailOut):
+    worker_id: str
+    seq: int
+
+
+class ChangedWorkerOut(WorkerDetailOut):
+    seq: int
+
+
+class ArchivedProcessOut(BaseModel):
+    id: str
+    worker_id: str
+    seq: int
+
+
+class ChangesOut(BaseModel):
+    seq: int  # siguiente since
+    more: bool
+    workers: List[ChangedWorkerOut]
+    processes: List[ChangedProcessOut]
+    tasks: List[ChangedTaskOut]
+    archived: List[ArchivedProcessOut]  # procesos (con sus tareas) que ya no están
+
+
+class TimeseriesPointOut(BaseModel):
+    bucket: datetime
+    worker_id: Optional[str] = None
+    name: Optional[str] = None
+    started: int
+    succeeded: int
+    failed: int
+    duration_count: int
+    duration_avg: Optional[float]  # segundos
+
+
+class PercentilesOut(BaseModel):
+    worker_id: Optional[str] = None
+    name: Optional[str] = None
+    version: Optional[str] = None
+    count: int
+    p50: float  # segundos
+    p90: float
+    p99: float
+
+
 @app.get("/version")
-def read_root():
+async def read_root():
     return {"version": VERSION}
 
 
 @app.post("/matricula", response_model=ProcessOut)
-def api_worker_register(process: ProcessIn, auth: str = Depends(authenticate)):
+async def api_worker_register(
+    process: ProcessIn, auth: str = Depends(authenticate), db=Depends(get_db)
+):
 
-    new_worker = process.dict()
+    new_worker = process.model_dump()
 
-    worker_id = db_worker_register(new_worker=new_worker)
+    worker_id = await db_worker_register(new_worker=new_worker, db=db)
 
     return {"id": worker_id}
 
 
 @app.post("/healthchecker", response_model=HealthCheckerOut)
-def api_healthcheaker_worker(
-    request: HealthCheckerIn, auth: str = Depends(authenticate)
+async def api_healthcheaker_worker(
+    request: HealthCheckerIn, auth: str = Depends(authenticate), db=Depends(get_db)
 ):
-    worker_health = db_healthcheaker_worker(worker_id=request.id)
+    worker_health = await db_healthcheaker_worker(worker_id=request.id, db=db)
 
     return {
         "health": (
@@ -161,47 +264,315 @@ def api_healthcheaker_worker(
 
 
 @app.post("/newprocess", response_model=NewProcessOut)
-def api_new_process(request: NewProcessIn, auth: str = Depends(authenticate)):
+async def api_new_process(
+    request: NewProcessIn, auth: str = Depends(authenticate), db=Depends(get_db)
+):
     worker_id = request.id
-    father_data = db_matricular_proceso(worker_id=worker_id)
+    father_data = await db_matricular_proceso(worker_id=worker_id, db=db)
 
     return father_data
 
 
 #
 @app.post("/endprocess", response_model=EndProcessOut)
-def api_new_process(request: EndProcessIn, auth: str = Depends(authenticate)):
+async def api_new_process(
+    request: EndProcessIn, auth: str = Depends(authenticate), db=Depends(get_db)
+):
     process_id = request.id
     details = request.details
-    status = db_end_process(process_id=process_id, details=details)
+    status = await db_end_process(process_id=process_id, details=details, db=db)
 
     return status
 
 
 @app.post("/actualizar_task", response_model=dict)
-def api_actualizar_task(request: TaskUpdateIn, auth: str = Depends(authenticate)):
-    db_actualizar_task(request.task_id, request.status, request.details)
+async def api_actualizar_task(
+    request: TaskUpdateIn, auth: str = Depends(authenticate), db=Depends(get_db)
+):
+    await db_actualizar_task(
+        request.task_id, request.status, request.details, db=db, at=request.at
+    )
 
     return {"status": "ok"}
 
 
+@app.post("/actualizar_tasks", response_model=List[TaskUpdateOut])
+async def api_actualizar_tasks(
+    request: List[TaskUpdateIn],
+    auth: str = Depends(authenticate),
+    db=Depends(get_db),
+):
+    updates = [
+        {
+            "task_id": task.task_id,
+            "status": task.status,
+            "details": task.details,
+            "at": task.at,
+        }
+        for task in request
+    ]
+
+    return await db_actualizar_tasks(updates, db=db)
+
+
+class PageFilters:
+    """Filtros y paginación por cursor de los dashboards de procesos y tareas."""
+
+    def __init__(
+        self,
+        status: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+        limit: int = Query(DASHBOARD_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        history: bool = False,  # incluir los procesos archivados por la retención
+    ):
+        self.filters = {
+            "status": status,
+            "since": since,
+            "until": until,
+            "cursor": cursor,
+            "limit": limit,
+            "history": history,
+        }
+
+
+def cache_key(request: Request):
+    return f"{request.url.path}?{sorted(request.query_params.multi_items())}"
+
+
+async def dashboard_page(request, db_function, model, id, page: PageFilters, db, scope):
+    def build(db):
+        try:
+            data, next_cursor = db_function(id, db=db, **page.filters)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        # la página siguiente se pide con ?cursor=<X-Next-Cursor> y los mismos filtros
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+        return serialize_rows(model, data), headers
+
+    def respond(version, load):
+        return dashboard_cache.respond(request, cache_key(request), version, load)
+
+    return await db_dashboard_response(db, respond, build, **{scope: id})
+
+
 @app.get("/dashboard_tasks/{id}", response_model=List[TaskDetailOut])
-def api_dashboard_tasks(id: str):
-    return db_dashboard_tasks(id)
+async def api_dashboard_tasks(
+    id: str, request: Request, page: PageFilters = Depends(), db=Depends(get_db)
+):
+    return await dashboard_page(
+        request,
+        db_control.db_dashboard_tasks,
+        TaskDetailOut,
+        id,
+        page,
+        db,
+        "process_id",
+    )
+
+
+@app.get("/dashboard_task/{id}", response_model=TaskWithDetailsOut)
+async def api_dashboard_task(id: str, history: bool = False, db=Depends(get_db)):
+    # una tarea con sus detalles; las listas solo dicen si los tiene (has_details)
+    task = await db_dashboard_task(id, db=db, history=history)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Tarea no encontrada")
+    if STRICT_RESPONSES:
+        return task
+    return FastJSONResponse(serialize_rows(TaskWithDetailsOut, [task])[0])
 
 
 @app.get("/dashboard_process/{id}", response_model=List[ProcessDetailOut])
-def api_dashboard_process(id: str):
-    data = db_dashboard_process(id)
+async def api_dashboard_process(
+    id: str, request: Request, page: PageFilters = Depends(), db=Depends(get_db)
+):
+    return await dashboard_page(
+        request,
+        db_control.db_dashboard_process,
+        ProcessDetailOut,
+        id,
+        page,
+        db,
+        "worker_id",
+    )
 
-    # breakpoint()
 
-    return data
+@app.get("/dashboard_workers", response_model=List[WorkerDetailOut])
+async def api_dashboard_workers(
+    request: Request, status: Optional[str] = None, db=Depends(get_db)
+):
+    def build(db):
+        try:
+            workers = db_control.db_dashboard_workers(db=db, status=status)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return serialize_rows(WorkerDetailOut, workers), {}
 
+    def respond(version, load):
+        return dashboard_cache.respond(request, cache_key(request), version, load)
 
-@app.get("/dashboard_workers", response_model=List[WorkerDetailOut])
-def api_dashboard_workers():
-    return db_dashboard_workers()
+    return await db_dashboard_response(db, respond, build)
+
+
+@app.get("/changes", response_model=ChangesOut)
+async def api_changes(
+    since: Optional[int] = None,
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db=Depends(get_db),
+):
+    """Filas de los dashboards modificadas después de since; sin since, el seq de inicio.
+
+    El seq es la hora de cada transacción (DB/crud_changes.py): las filas de
+    los últimos CHANGES_LOOKBACK segundos se repiten en la consulta siguiente.
+    Los procesos archivados por la retención llegan en archived; lo que se
+    borra o corrige a mano no aparece.
+    """
+    changes = await db_changes(db, since=since, limit=limit)
+    if STRICT_RESPONSES:
+        return changes
+
+    # mismo JSON que ChangesOut, sin validar otra vez cada fila (ver serialization.py)
+    return FastJSONResponse(
+        {
+            **changes,
+            "workers": serialize_rows(ChangedWorkerOut, changes["workers"]),
+            "processes": serialize_rows(ChangedProcessOut, changes["processes"]),
+            "tasks": serialize_rows(ChangedTaskOut, changes["tasks"]),
+            "archived": serialize_rows(ArchivedProcessOut, changes["archived"]),
+        }
+    )
+
+
+@app.get("/stats/timeseries", response_model=List[TimeseriesPointOut])
+async def api_stats_timeseries(
+    resolution: str = "minute",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    worker: Optional[str] = None,
+    kind: str = "task",
+    name: Optional[str] = None,
+    by: str = "worker,name",
+    db=Depends(get_db),
+):
+    # cubos preagregados por minuto u hora; by="" suma todas las series
+    try:
+        return await db_stats_timeseries(
+            db,
+            resolution=resolution,
+            since=since,
+            until=until,
+            worker_id=worker,
+            kind=kind,
+            name=name,
+            by=[column for column in by.split(",") if column],
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/stats/percentiles", response_model=List[PercentilesOut])
+async def api_stats_percentiles(
+    kind: str = "task",
+    worker: Optional[str] = None,
+    name: Optional[str] = None,
+    version: Optional[str] = None,
+    by: str = "worker,name,version",
+    db=Depends(get_db),
+):
+    # cuantiles de duración desde los sketches; by="" junta todo el kind
+    try:
+        return await db_stats_percentiles(
+            db,
+            kind=kind,
+            worker_id=worker,
+            name=name,
+            version=version,
+            by=[column for column in by.split(",") if column],
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/cache_stats", response_model=dict)
+async def api_cache_stats():
+    # aciertos de la caché de dashboards de este proceso y respuestas 304
+    return dashboard_cache.snapshot()
+
+
+STREAM_ROW_MODELS = {
+    "task": TaskDetailOut,
+    "process": ProcessDetailOut,
+    "worker": WorkerDetailOut,
+}
+
+
+def encode_stream_row(kind, row):
+    # mismas filas (y mismo formato) que devuelven los endpoints /dashboard_*
+    return jsonable_encoder(STREAM_ROW_MODELS[kind](**row))
+
+
+@app.get("/stream")
+async def api_stream(
+    request: Request,
+    worker: Optional[str] = None,
+    process: Optional[str] = None,
+    last_event_id: Optional[str] = Header(None),
+):
+    # Server-Sent Events: filas de los dashboards que han cambiado
+    return StreamingResponse(
+        live_updates.stream(
+            request,
+            worker_id=worker,
+            process_id=process,
+            last_event_id=last_event_id,
+            encode=encode_stream_row,
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/export/tasks")
+async def api_export_tasks(
+    since: datetime,
+    until: datetime,
+    worker: Optional[str] = None,
+    format: str = "csv",
+    history: bool = False,
+    auth: str = Depends(authenticate),
+):
+    # tareas con su proceso y worker de los procesos creados en [since, until)
+    try:
+        chunks = export_chunks(since, until, worker, history, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"tasks_{since:%Y%m%d}_{until:%Y%m%d}.{extension}"
+
+    # generador síncrono: Starlette lo recorre en el pool de hilos
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@app.get("/pool_stats", response_model=dict)
+async def api_pool_stats():
+    # ocupación del pool de conexiones de este proceso y esperas para obtener una
+    return pool_metrics.snapshot(request_pool())
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def api_metrics():
+    # formato de texto de Prometheus; métricas de este proceso de gunicorn
+    return PlainTextResponse(
+        registry.render(pool_metric_lines(pool_metrics.snapshot(request_pool()))),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
 
 
 # Ejecutar solo si el script es llamado directamente
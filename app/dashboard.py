@@ -8,6 +8,24 @@ import requests
 API_WORKERS_URL = "http://localhost:8418/dashboard_workers"
 API_PROCESS_URL = "http://localhost:8418/dashboard_process"
 API_TASK_URL = "http://localhost:8418/dashboard_tasks"
+API_TASK_DETAIL_URL = "http://localhost:8418/dashboard_task"
+
+
+# las listas de procesos y tareas vienen por páginas (cursor en la cabecera
+# X-Next-Cursor); PAGE_SIZE es el máximo que acepta la API
+PAGE_SIZE = 1000
+
+
+def fetch_all_pages(url):
+    rows, params = [], {"limit": PAGE_SIZE}
+    while True:
+        response = requests.get(url, params=params)
+        response.raise_for_status()
+        rows.extend(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return rows
+        params = {"limit": PAGE_SIZE, "cursor": cursor}
 
 
 # Función para obtener los datos desde la API de trabajadores
@@ -25,9 +43,7 @@ def fetch_workers_data():
 # Función para obtener los datos desde la API de procesos
 def fetch_process_data(worker_id):
     try:
-        response = requests.get(f"{API_PROCESS_URL}/{worker_id}")
-        response.raise_for_status()
-        data = response.json()
+        data = fetch_all_pages(f"{API_PROCESS_URL}/{worker_id}")
         return pd.DataFrame(data)
     except requests.exceptions.RequestException as e:
         print(f"Error al obtener datos de la API de procesos: {e}")
@@ -37,15 +53,24 @@ def fetch_process_data(worker_id):
 # Función para obtener los datos desde la API de tareas
 def fetch_task_data(process_id):
     try:
-        response = requests.get(f"{API_TASK_URL}/{process_id}")
-        response.raise_for_status()
-        data = response.json()
+        data = fetch_all_pages(f"{API_TASK_URL}/{process_id}")
         return pd.DataFrame(data)
     except requests.exceptions.RequestException as e:
         print(f"Error al obtener datos de la API de tareas: {e}")
         return pd.DataFrame([])
 
 
+# Detalles de una tarea: la lista de tareas solo dice si los tiene (has_details)
+def fetch_task_details(task_id):
+    try:
+        response = requests.get(f"{API_TASK_DETAIL_URL}/{task_id}")
+        response.raise_for_status()
+        return response.json()["details"]
+    except requests.exceptions.RequestException as e:
+        print(f"Error al obtener los detalles de la tarea: {e}")
+        return None
+
+
 # Obtener los datos iniciales de trabajadores
 df_workers = fetch_workers_data()
 
@@ -117,6 +142,7 @@ app.layout = html.Div(
                         )  # Placeholder inicial vacío
                     ],
                 ),
+                html.Div(id="task-details"),  # Detalles de la tarea seleccionada
             ],
             className="my-4",
         ),
@@ -227,6 +253,7 @@ def display_tasks(selected_rows, process_data):
             id="task_table",
             columns=[{"name": i.capitalize(), "id": i} for i in df_tasks.columns],
             data=df_tasks.to_dict("records"),
+            row_selectable="single",  # al seleccionar una tarea se ven sus detalles
             style_table={"overflowX": "auto"},
             style_header={
                 "backgroundColor": "rgb(230, 230, 230)",
@@ -249,6 +276,26 @@ def display_tasks(selected_rows, process_data):
     return dash.no_update
 
 
+# Callback para mostrar los detalles de la tarea seleccionada: solo se piden a la
+# API (/dashboard_task/{id}) si la tarea los tiene
+@app.callback(
+    Output("task-details", "children"),
+    Input("task_table", "selected_rows"),
+    State("task_table", "data"),
+    prevent_initial_call=True,
+)
+def display_task_details(selected_rows, data):
+    if not selected_rows or not data:
+        return None
+
+    task = data[selected_rows[0]]
+    if not task.get("has_details"):
+        return html.P(
+            f"No details for Task ID: {task['id']}", className="text-center my-2"
+        )
+    return html.Pre(fetch_task_details(task["id"]) or "", className="my-2")
+
+
 # Ejecutar la aplicación
 if __name__ == "__main__":
     app.run_server(debug=True)
@@ -6,6 +6,22 @@ import requests
 API_WORKERS_URL = "http://localhost:8418/dashboard_workers"
 API_PROCESS_URL = "http://localhost:8418/dashboard_process"
 API_TASK_URL = "http://localhost:8418/dashboard_tasks"
+API_TASK_DETAIL_URL = "http://localhost:8418/dashboard_task"
+
+# las listas de procesos y tareas vienen por páginas (cursor en la cabecera
+# X-Next-Cursor); PAGE_SIZE es el máximo que acepta la API
+PAGE_SIZE = 1000
+
+def fetch_all_pages(url):
+    rows, params = [], {"limit": PAGE_SIZE}
+    while True:
+        response = requests.get(url, params=params)
+        response.raise_for_status()
+        rows.extend(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return rows
+        params = {"limit": PAGE_SIZE, "cursor": cursor}
 
 # Función para obtener los datos desde la API de trabajadores
 def fetch_workers_data():
@@ -21,9 +37,7 @@ def fetch_workers_data():
 # Función para obtener los datos desde la API de procesos
 def fetch_process_data(worker_id):
     try:
-        response = requests.get(f"{API_PROCESS_URL}/{worker_id}")
-        response.raise_for_status()
-        data = response.json()
+        data = fetch_all_pages(f"{API_PROCESS_URL}/{worker_id}")
         return pd.DataFrame(data)
     except requests.exceptions.RequestException as e:
         print(f"Error al obtener datos de la API de procesos: {e}")
@@ -32,14 +46,22 @@ def fetch_process_data(worker_id):
 # Función para obtener los datos desde la API de tareas
 def fetch_task_data(process_id):
     try:
-        response = requests.get(f"{API_TASK_URL}/{process_id}")
-        response.raise_for_status()
-        data = response.json()
+        data = fetch_all_pages(f"{API_TASK_URL}/{process_id}")
         return pd.DataFrame(data)
     except requests.exceptions.RequestException as e:
         print(f"Error al obtener datos de la API de tareas: {e}")
         return pd.DataFrame([])
 
+# Detalles de una tarea: la lista de tareas solo dice si los tiene (has_details)
+def fetch_task_details(task_id):
+    try:
+        response = requests.get(f"{API_TASK_DETAIL_URL}/{task_id}")
+        response.raise_for_status()
+        return response.json()["details"] or ""
+    except requests.exceptions.RequestException as e:
+        print(f"Error al obtener los detalles de la tarea: {e}")
+        return ""
+
 # Función para obtener los IDs de trabajadores
 def get_worker_ids():
     df = fetch_workers_data()
@@ -81,6 +103,7 @@ def create_interface():
         worker_select = gr.Dropdown(label="Select Worker", choices=get_worker_ids())
         process_select = gr.Dropdown(label="Select Process", choices=[])
         task_select = gr.Dropdown(label="Select Task", choices=[])
+        task_details = gr.Textbox(label="Task Details", interactive=False)
 
         # Botón de actualización
         refresh_button = gr.Button("Refresh Data")
@@ -96,6 +119,10 @@ def create_interface():
             task_ids = get_task_ids(process_id)
             return tasks_df, task_ids
 
+        def on_task_select(task_id):
+            # los detalles solo se piden para la tarea seleccionada
+            return fetch_task_details(task_id) if task_id else ""
+
         def refresh():
             workers_df, processes_df, tasks_df = update_tables(
                 worker_select.value if worker_select.value else None,
@@ -106,6 +133,7 @@ def create_interface():
         # Conectar los callbacks
         worker_select.change(on_worker_select, inputs=worker_select, outputs=[processes_table, process_select])
         process_select.change(on_process_select, inputs=process_select, outputs=[tasks_table, task_select])
+        task_select.change(on_task_select, inputs=task_select, outputs=task_details)
         refresh_button.click(refresh, outputs=[workers_table, processes_table, tasks_table])
 
     return demo
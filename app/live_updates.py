@@ -0,0 +1,229 @@
+"""Difusión en vivo de los cambios de workers, procesos y tareas (Server-Sent Events).
+
+Las funciones de escritura de DB/db_control.py guardan cada cambio en la tabla
+change_events, en la misma transacción y con el seq de la transacción (ver
+DB/crud_changes.py). Cada proceso de gunicorn tiene un solo LiveUpdates que
+lee los eventos nuevos una vez por EVENTS_POLL_INTERVAL (una consulta por
+índice, seq > posición) y los reparte entre todos sus clientes conectados a
+/stream. La carga en la base de datos no depende del número de dashboards
+abiertos.
+
+El id autoincremental de change_events no sirve de cursor: se asigna al
+insertar y la fila se ve al confirmar, así que un evento con un id menor
+puede aparecer después de haber leído uno mayor. El seq tampoco llega en
+orden, pero una transacción no tarda más de CHANGES_LOOKBACK segundos en
+confirmar: la posición del sondeo se queda en changes_horizon() y cada
+lectura vuelve a pasar por esos últimos segundos, saltándose los eventos que
+ya ha enviado (seen).
+
+El id de cada evento enviado (el Last-Event-ID con el que reconecta el
+cliente) es un seq hasta el que el cliente lo tiene todo. Al reconectar se le
+envía todo lo posterior, así que puede recibir otra vez algún evento de los
+últimos CHANGES_LOOKBACK segundos; cada evento lleva la fila entera y
+aplicarlo dos veces no cambia nada.
+
+Los eventos antiguos no se borran aquí, sino en el hilo de DB/liveness.py,
+haya o no clientes conectados.
+"""
+
+import os
+import json
+import asyncio
+
+from starlette.concurrency import run_in_threadpool
+
+from DB.crud_changes import changes_horizon
+from DB.crud_change_events import get_change_event_seqs_after, get_change_events_after
+
+
+EVENTS_POLL_INTERVAL = float(os.environ.get("EVENTS_POLL_INTERVAL", 1))
+EVENTS_BATCH_SIZE = 500
+EVENTS_QUEUE_SIZE = 1000
+KEEPALIVE_INTERVAL = 15
+
+
+def event_to_dict(event):
+    return {
+        "id": event.id,
+        "seq": event.seq,
+        "kind": event.kind,
+        "entity_id": event.entity_id,
+        "worker_id": event.worker_id,
+        "process_id": event.process_id,
+        "payload": event.payload,
+    }
+
+
+def load_events_after(seq, last_id=0, worker_id=None, process_id=None):
+    events = get_change_events_after(
+        seq,
+        last_id,
+        worker_id=worker_id,
+        process_id=process_id,
+        limit=EVENTS_BATCH_SIZE,
+    )
+    return [event_to_dict(event) for event in events]
+
+
+def resume_position(event, position):
+    # seq hasta el que el cliente lo tiene todo después de recibir event: lo
+    # leído hasta position y, de la misma lectura, lo anterior al seq de event
+    return min(event["seq"] - 1, position)
+
+
+class Subscriber:
+    def __init__(self, worker_id=None, process_id=None):
+        self.worker_id = worker_id
+        self.process_id = process_id
+        self.queue = asyncio.Queue(maxsize=EVENTS_QUEUE_SIZE)
+
+    def matches(self, event):
+        if self.worker_id and event["worker_id"] != self.worker_id:
+            return False
+        if self.process_id and event["process_id"] != self.process_id:
+            return False
+        return True
+
+
+class LiveUpdates:
+    def __init__(self):
+        self.subscribers = set()
+        self.position = None  # seq hasta el que ya se ha leído todo
+        self.seen = {}  # id -> seq de los eventos enviados con seq > position
+        self._task = None
+
+    def subscribe(self, worker_id=None, process_id=None):
+        subscriber = Subscriber(worker_id, process_id)
+        self.subscribers.add(subscriber)
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    def publish(self, event):
+        for subscriber in list(self.subscribers):
+            if not subscriber.matches(event):
+                continue
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # cliente demasiado lento: se cierra y reconecta con Last-Event-ID
+                self.unsubscribe(subscriber)
+                subscriber.queue = asyncio.Queue(maxsize=1)
+                subscriber.queue.put_nowait(None)
+
+    def _start(self):
+        # cada arranque empieza ahora: lo anterior lo tienen los clientes en su
+        # carga inicial o lo piden con Last-Event-ID. Los eventos de la ventana
+        # que ya se ven cuentan como enviados
+        position = changes_horizon()
+        self.seen = get_change_event_seqs_after(position)
+        self.position = position
+
+    async def poll(self):
+        """Publica los eventos confirmados desde la última lectura; devuelve cuántos.
+
+        Lee por lotes todo lo posterior a la posición y, al acabar, la avanza
+        hasta el horizonte tomado antes de leer: lo que tenga un seq menor ya
+        estaba confirmado y se ha leído.
+        """
+        position = max(self.position, changes_horizon())
+        cursor = (self.position, 0)
+        published = 0
+        while True:
+            events = await run_in_threadpool(load_events_after, *cursor)
+            for event in events:
+                if event["id"] in self.seen:
+                    continue
+                self.seen[event["id"]] = event["seq"]
+                event["position"] = resume_position(event, position)
+                self.publish(event)
+                published += 1
+            if len(events) < EVENTS_BATCH_SIZE:
+                break
+            cursor = (events[-1]["seq"], events[-1]["id"])
+
+        self.position = position
+        self.seen = {id: seq for id, seq in self.seen.items() if seq > position}
+        return published
+
+    async def _run(self):
+        await run_in_threadpool(self._start)
+
+        # el sondeo se detiene cuando ya no queda ningún cliente conectado
+        while self.subscribers:
+            try:
+                await self.poll()
+            except Exception as e:
+                print(f"Error al leer los eventos: {e}")
+
+            await asyncio.sleep(EVENTS_POLL_INTERVAL)
+
+    async def stream(
+        self, request, worker_id=None, process_id=None, last_event_id=None, encode=None
+    ):
+        """Generador de Server-Sent Events para un cliente.
+
+        Con last_event_id se envían primero los eventos guardados con un seq
+        posterior, así un cliente que reconecta no pierde cambios. Se leen por
+        lotes hasta el último: la cola solo recibe lo que el sondeo lee después
+        de suscribirse el cliente, y de ella se saltan los ya enviados.
+        """
+        subscriber = self.subscribe(worker_id, process_id)
+        sent = set()
+
+        try:
+            if last_event_id and last_event_id.isdigit():
+                since = int(last_event_id)
+                position = max(since, changes_horizon())
+                cursor = (since, 0)
+                while True:
+                    backlog = await run_in_threadpool(
+                        load_events_after, *cursor, worker_id, process_id
+                    )
+                    for event in backlog:
+                        event["position"] = resume_position(event, position)
+                        yield format_event(event, encode)
+                        sent.add(event["id"])
+                    if len(backlog) < EVENTS_BATCH_SIZE:
+                        break
+                    cursor = (backlog[-1]["seq"], backlog[-1]["id"])
+
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(
+                        subscriber.queue.get(), KEEPALIVE_INTERVAL
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+
+                if event is None:
+                    break
+                if event["id"] in sent:
+                    continue
+
+                yield format_event(event, encode)
+        finally:
+            self.unsubscribe(subscriber)
+
+
+def format_event(event, encode=None):
+    payload = encode(event["kind"], event["payload"]) if encode else event["payload"]
+    data = json.dumps(
+        {
+            "kind": event["kind"],
+            "id": event["entity_id"],
+            "worker_id": event["worker_id"],
+            "process_id": event["process_id"],
+            "row": payload,
+        }
+    )
+    return f"id: {event['position']}\nevent: {event['kind']}\ndata: {data}\n\n"
+
+
+live_updates = LiveUpdates()
@@ -0,0 +1,198 @@
+"""Comandos de mantenimiento de la base de datos.
+
+Uso (desde la carpeta app):
+
+    python manage.py migrate
+    python manage.py rebuild-summaries
+    python manage.py rebuild-stats
+    python manage.py prune-stats --days 7
+    python manage.py sweep-workers
+    python manage.py prune-events
+    python manage.py archive --days 30 --keep-per-worker 1000
+    python manage.py export --since 2024-09-01 --until 2024-10-01 --format parquet -o tasks.parquet
+"""
+
+import argparse
+
+
+def command_migrate(args):
+    # importar DB.structure crea las tablas y aplica las migraciones pendientes
+    from DB.structure import engine, Base
+    from DB.migrations import MIGRATIONS, applied_migrations, run_migrations
+
+    applied_now = run_migrations(engine, Base.metadata)
+    applied = applied_migrations(engine)
+
+    for version, description, _ in MIGRATIONS:
+        state = "aplicada" if version in applied else "pendiente"
+        print(f"{version:04d} [{state}] {description}")
+
+    if not applied_now:
+        print("El esquema ya estaba al día")
+
+
+def command_rebuild_summaries(args):
+    from DB.db_control import db_rebuild_summaries
+
+    rebuilt = db_rebuild_summaries()
+    print(f"Contadores recalculados ({rebuilt} procesos)")
+
+
+def command_rebuild_stats(args):
+    from DB.db_control import db_rebuild_stats
+
+    buckets, bins = db_rebuild_stats()
+    print(f"Series de /stats/timeseries recalculadas ({buckets} cubos)")
+    print(f"Cuantiles de /stats/percentiles recalculados ({bins} bins)")
+
+
+def command_prune_stats(args):
+    from DB import retention
+
+    days = retention.STATS_MINUTE_RETENTION_DAYS if args.days is None else args.days
+    deleted = retention.prune_minute_rollups(days)
+    print(f"Cubos por minuto borrados: {deleted}")
+
+
+def command_sweep_workers(args):
+    from DB.db_control import db_sweep_workers
+
+    swept = db_sweep_workers()
+    for status, worker_ids in swept.items():
+        print(f"Workers marcados {status}: {len(worker_ids)}")
+
+
+def command_prune_events(args):
+    from DB.liveness import EVENTS_RETENTION
+    from DB.crud_change_events import prune_change_events
+
+    seconds = EVENTS_RETENTION if args.seconds is None else args.seconds
+    deleted = prune_change_events(seconds)
+    print(f"Eventos borrados: {deleted}")
+
+
+def command_archive(args):
+    from DB import retention
+
+    days = retention.RETENTION_DAYS if args.days is None else args.days
+    keep_per_worker = (
+        retention.RETENTION_KEEP_PER_WORKER
+        if args.keep_per_worker is None
+        else args.keep_per_worker
+    )
+
+    if not days and not keep_per_worker:
+        print(
+            "Sin política de retención (--days / --keep-per-worker): nada que archivar"
+        )
+        return
+
+    archived = retention.archive_finished_processes(
+        days=days,
+        keep_per_worker=keep_per_worker,
+        batch_size=args.batch_size or retention.RETENTION_BATCH_SIZE,
+        max_batches=args.max_batches,
+    )
+    print(f"Procesos archivados: {archived}")
+
+
+def command_export(args):
+    import sys
+    from datetime import datetime
+    from DB.export import export_chunks
+
+    chunks = export_chunks(
+        datetime.fromisoformat(args.since),
+        datetime.fromisoformat(args.until),
+        worker_id=args.worker,
+        history=args.history,
+        file_format=args.format,
+    )
+
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Process monitor: mantenimiento")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate = commands.add_parser("migrate", help="aplica las migraciones pendientes")
+    migrate.set_defaults(func=command_migrate)
+
+    rebuild = commands.add_parser(
+        "rebuild-summaries",
+        help="recalcula los contadores de workers y procesos desde las tablas",
+    )
+    rebuild.set_defaults(func=command_rebuild_summaries)
+
+    rebuild_stats = commands.add_parser(
+        "rebuild-stats",
+        help="recalcula /stats/timeseries y /stats/percentiles desde las tablas",
+    )
+    rebuild_stats.set_defaults(func=command_rebuild_stats)
+
+    prune_stats = commands.add_parser(
+        "prune-stats", help="borra los cubos por minuto antiguos de /stats/timeseries"
+    )
+    prune_stats.add_argument(
+        "--days", type=float, help="borra los de hace más de N días"
+    )
+    prune_stats.set_defaults(func=command_prune_stats)
+
+    sweep = commands.add_parser(
+        "sweep-workers",
+        help="marca online/ofline los workers según su último latido",
+    )
+    sweep.set_defaults(func=command_sweep_workers)
+
+    prune_events = commands.add_parser(
+        "prune-events", help="borra los change_events antiguos de /stream"
+    )
+    prune_events.add_argument(
+        "--seconds", type=float, help="borra los de hace más de N segundos"
+    )
+    prune_events.set_defaults(func=command_prune_events)
+
+    # los valores por defecto salen de RETENTION_* (ver DB/retention.py)
+    archive = commands.add_parser(
+        "archive",
+        help="mueve los procesos terminados fuera de la retención a las tablas de archivo",
+    )
+    archive.add_argument(
+        "--days", type=float, help="archiva los terminados hace más de N días"
+    )
+    archive.add_argument(
+        "--keep-per-worker",
+        type=int,
+        help="deja solo los N procesos más recientes de cada worker",
+    )
+    archive.add_argument("--batch-size", type=int, help="procesos por transacción")
+    archive.add_argument("--max-batches", type=int, help="para después de N lotes")
+    archive.set_defaults(func=command_archive)
+
+    export = commands.add_parser(
+        "export",
+        help="exporta las tareas de los procesos creados en [since, until)",
+    )
+    export.add_argument("--since", required=True, help="fecha ISO, p. ej. 2024-09-01")
+    export.add_argument("--until", required=True, help="fecha ISO, p. ej. 2024-10-01")
+    export.add_argument("--worker", help="solo los procesos de este worker")
+    export.add_argument("--format", choices=["csv", "arrow", "parquet"], default="csv")
+    export.add_argument(
+        "--history", action="store_true", help="incluye los procesos archivados"
+    )
+    export.add_argument("-o", "--output", help="fichero de salida (por defecto stdout)")
+    export.set_defaults(func=command_export)
+
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    args.func(args)
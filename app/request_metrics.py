@@ -0,0 +1,60 @@
+"""Middleware ASGI con las métricas HTTP de /metrics (ver DB/metrics.py).
+
+Por cada petición cuenta el método, la ruta y el código de respuesta, mide su
+duración y las peticiones en curso, y suma las consultas SQL que hace y su
+tiempo. La ruta es la plantilla de FastAPI ("/dashboard_tasks/{id}"), no la
+URL, para que el número de series no crezca con los ids; las peticiones que
+no coinciden con ninguna ruta se agrupan en "unmatched".
+
+Es un middleware ASGI puro y no BaseHTTPMiddleware para no añadir una tarea
+por petición ni romper las respuestas en streaming (/stream, /export/tasks).
+"""
+
+import time
+
+from DB.metrics import (
+    METRICS_ENABLED,
+    http_db_duration,
+    http_db_queries,
+    http_duration,
+    http_in_progress,
+    http_requests,
+    request_queries,
+)
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        status = [500]  # si la aplicación falla antes de responder
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        queries = [0, 0.0]
+        token = request_queries.set(queries)
+        http_in_progress.inc(method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_in_progress.dec(method)
+            request_queries.reset(token)
+
+            # el router de Starlette deja la ruta encontrada en el scope
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+
+            http_requests.inc(method, path, str(status[0]))
+            http_duration.observe(method, path, value=elapsed)
+            http_db_queries.observe(path, value=queries[0])
+            http_db_duration.observe(path, value=queries[1])
@@ -0,0 +1,105 @@
+"""Caché de las respuestas de los dashboards con ETag y 304 Not Modified.
+
+La versión de cada respuesta es el último seq de /changes de su ámbito (ver
+db_dashboard_version): las escrituras de db_control lo cambian en la misma
+transacción, con o sin change_events, así que la invalidación vale para todos
+los procesos de gunicorn sin compartir memoria. A la versión se le suma un tramo de tiempo de
+DASHBOARD_CACHE_TTL segundos, porque el runtime de las tareas depende de la
+hora (el estado online/ofline sí cambia el seq, ver DB/liveness.py). El tramo
+recoge también las transacciones que se confirman tarde con un seq menor que
+el último del ámbito, que no cambian la versión (ver DB/crud_changes.py).
+
+Con la versión se calcula el ETag antes de consultar nada más: si el cliente
+ya lo tiene se responde 304 sin cuerpo, y si este proceso tiene el JSON ya
+serializado para ese ETag se devuelve tal cual. respond se ejecuta en la
+misma llamada a la sesión que lee la versión (db_dashboard_response), con
+una sola conexión por petición.
+"""
+
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+from fastapi import Response
+
+from serialization import json_body
+
+
+DASHBOARD_CACHE_TTL = float(os.environ.get("DASHBOARD_CACHE_TTL", 5))  # segundos
+DASHBOARD_CACHE_SIZE = int(os.environ.get("DASHBOARD_CACHE_SIZE", 1000))
+
+
+def if_none_match(request):
+    header = request.headers.get("if-none-match", "")
+    return {tag.strip() for tag in header.split(",") if tag.strip()}
+
+
+class ResponseCache:
+    def __init__(self, ttl=DASHBOARD_CACHE_TTL, max_entries=DASHBOARD_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # clave -> (etag, cuerpo, cabeceras)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def etag(self, key, version):
+        bucket = int(time.time() // self.ttl) if self.ttl > 0 else 0
+        digest = hashlib.sha1(f"{key}|{version}|{bucket}".encode()).hexdigest()
+        return f'W/"{digest[:20]}"'
+
+    def get(self, key, etag):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != etag:
+                return None
+            self.entries.move_to_end(key)
+            return entry[1], entry[2]
+
+    def put(self, key, etag, body, headers):
+        with self.lock:
+            self.entries[key] = (etag, body, headers)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def respond(self, request, key, version, load):
+        """Respuesta JSON de la clave en esta versión.
+
+        load devuelve (datos serializables, cabeceras) y solo se llama si ni
+        el cliente ni la caché tienen esta versión.
+        """
+        etag = self.etag(key, version)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+        if etag in if_none_match(request) or "*" in if_none_match(request):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+
+        cached = self.get(key, etag)
+        if cached is None:
+            self.misses += 1
+            data, extra_headers = load()
+            cached = json_body(data), extra_headers
+            self.put(key, etag, *cached)
+        else:
+            self.hits += 1
+
+        body, extra_headers = cached
+        return Response(
+            body, media_type="application/json", headers={**headers, **extra_headers}
+        )
+
+    def snapshot(self):
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+        }
+
+
+dashboard_cache = ResponseCache()
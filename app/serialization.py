@@ -0,0 +1,63 @@
+"""Serialización rápida de las filas de los dashboards y de /changes.
+
+db_control ya construye cada fila con los tipos de su modelo de respuesta
+(TaskDetailOut, ProcessDetailOut, WorkerDetailOut), así que por defecto no se
+vuelven a validar con pydantic: de cada fila se toman los campos del modelo y
+se codifican directamente con orjson (con json de la biblioteca estándar si
+orjson no está instalado). El JSON es el mismo que con el modelo; lo comprueba
+benchmarks/response_encoding.py.
+
+Con STRICT_RESPONSES=1 (para desarrollo) las filas pasan por el modelo como
+antes, y una fila con un tipo incorrecto falla en lugar de salir tal cual.
+"""
+
+import os
+import json
+from datetime import date, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+try:
+    import orjson
+except ImportError:  # opcional: sin orjson se usa json
+    orjson = None
+
+
+STRICT_RESPONSES = os.environ.get("STRICT_RESPONSES", "0") == "1"
+
+_timedelta = TypeAdapter(timedelta)
+
+
+def encode_value(value):
+    # los tipos que no conocen json u orjson, con el mismo formato que pydantic
+    if isinstance(value, timedelta):
+        return _timedelta.dump_python(value, mode="json")
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"No se puede convertir a JSON: {type(value).__name__}")
+
+
+def json_body(data):
+    if orjson is not None:
+        return orjson.dumps(data, default=encode_value)
+    return json.dumps(
+        data, ensure_ascii=False, separators=(",", ":"), default=encode_value
+    ).encode("utf-8")
+
+
+def serialize_rows(model, rows):
+    """Filas de db_control listas para json_body, con los campos de model."""
+    if STRICT_RESPONSES:
+        return jsonable_encoder([model(**row) for row in rows])
+
+    fields = list(model.model_fields)
+    return [{field: row[field] for field in fields} for row in rows]
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse que codifica con json_body (orjson si está instalado)."""
+
+    def render(self, content):
+        return json_body(content)
@@ -0,0 +1,85 @@
+"""Compara dos resultados de benchmarks/load_test.py (p. ej. de dos commits).
+
+Uso:
+
+    python benchmarks/compare.py base.json new.json --threshold 10
+
+Muestra la variación de req/s y de p50/p95/p99 por endpoint y termina con
+código 1 si algún percentil empeora más del umbral (en %), para usarlo en CI.
+"""
+
+import sys
+import json
+import argparse
+
+
+METRICS = ["rps", "p50_ms", "p95_ms", "p99_ms"]
+
+
+def change(base, new):
+    if not base:
+        return None
+    return (new - base) / base * 100
+
+
+def compare(base, new, threshold, min_requests):
+    regressions = []
+
+    print(f"base {base.get('commit')}  ->  new {new.get('commit')}")
+    print(f"{'endpoint':<26}" + "".join(f"{metric:>18}" for metric in METRICS))
+
+    for name in sorted(set(base["endpoints"]) | set(new["endpoints"])):
+        if name not in base["endpoints"] or name not in new["endpoints"]:
+            print(
+                f"{name:<26}  solo en {'new' if name in new['endpoints'] else 'base'}"
+            )
+            continue
+
+        line = f"{name:<26}"
+        for metric in METRICS:
+            old_value = base["endpoints"][name][metric]
+            new_value = new["endpoints"][name][metric]
+            delta = change(old_value, new_value)
+            line += f"{new_value:>10.2f}" + (
+                f"{delta:>+7.1f}%" if delta is not None else f"{'':>8}"
+            )
+
+            # con pocas peticiones los percentiles son solo ruido
+            enough = new["endpoints"][name]["requests"] >= min_requests
+            if metric != "rps" and enough and delta is not None and delta > threshold:
+                regressions.append(f"{name} {metric} {delta:+.1f}%")
+        print(line)
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=10,
+        help="empeoramiento máximo de un percentil, en %%",
+    )
+    parser.add_argument(
+        "--min-requests",
+        type=int,
+        default=50,
+        help="no avisar de endpoints con menos peticiones",
+    )
+    args = parser.parse_args()
+
+    with open(args.base) as base, open(args.new) as new:
+        regressions = compare(
+            json.load(base), json.load(new), args.threshold, args.min_requests
+        )
+
+    if regressions:
+        print("Regresiones: " + ", ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
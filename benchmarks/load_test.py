@@ -0,0 +1,366 @@
+"""Prueba de carga de la API: una flota de workers y varios dashboards a la vez.
+
+Arranca app/api.py con uvicorn sobre una base de datos SQLite nueva (o sobre
+la MariaDB de las variables MYSQL_* con --db mysql, o usa un servidor ya
+arrancado con --url) y durante --duration segundos:
+
+- cada worker se matricula (/matricula), manda latidos (/healthchecker) y
+  repite procesos completos: /newprocess, start y success de cada tarea
+  (/actualizar_task, o /actualizar_tasks con --batch-updates) y /endprocess;
+- cada dashboard consulta /dashboard_workers, /dashboard_process/{id} y
+  /dashboard_tasks/{id} cada --poll-interval segundos, con If-None-Match
+  como el dashboard de Dash.
+
+Al final muestra, por endpoint, peticiones, errores, peticiones por segundo
+y latencias p50/p95/p99/max, y las guarda en JSON (--output) junto con el
+commit y la configuración, para compararlas con benchmarks/compare.py.
+
+Uso (desde la raíz del repositorio):
+
+    python benchmarks/load_test.py --workers 20 --dashboards 5 --duration 60 -o base.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from datetime import datetime
+
+import requests
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(ROOT, "app")
+TOKEN = os.environ.get("TOKEN", "mysecrettoken")
+
+
+class Stats:
+    """Latencias (en segundos) y errores por endpoint, compartidas entre hilos."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.not_modified = {}
+
+    def record(self, endpoint, elapsed, ok, not_modified=False):
+        with self.lock:
+            self.latencies.setdefault(endpoint, []).append(elapsed)
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+            if not_modified:
+                self.not_modified[endpoint] = self.not_modified.get(endpoint, 0) + 1
+
+    def summary(self, duration):
+        endpoints = {}
+        with self.lock:
+            for endpoint, latencies in sorted(self.latencies.items()):
+                latencies = sorted(latencies)
+                endpoints[endpoint] = {
+                    "requests": len(latencies),
+                    "errors": self.errors.get(endpoint, 0),
+                    "not_modified": self.not_modified.get(endpoint, 0),
+                    "rps": round(len(latencies) / duration, 2),
+                    "p50_ms": percentile_ms(latencies, 50),
+                    "p95_ms": percentile_ms(latencies, 95),
+                    "p99_ms": percentile_ms(latencies, 99),
+                    "max_ms": round(latencies[-1] * 1000, 3),
+                }
+        return endpoints
+
+
+def percentile_ms(ordered, percent):
+    # rango más cercano sobre la lista ya ordenada
+    index = max(0, min(len(ordered) - 1, -(-len(ordered) * percent // 100) - 1))
+    return round(ordered[index] * 1000, 3)
+
+
+class ApiSession:
+    """requests.Session que mide cada petición con el nombre de su endpoint."""
+
+    def __init__(self, base_url, stats):
+        self.base_url = base_url
+        self.stats = stats
+        self.session = requests.Session()
+        self.session.headers["Authorization"] = f"Bearer {TOKEN}"
+
+    def request(self, method, endpoint, path, expected=(200,), **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.session.request(
+                method, f"{self.base_url}{path}", timeout=30, **kwargs
+            )
+        except requests.exceptions.RequestException:
+            self.stats.record(endpoint, time.perf_counter() - start, ok=False)
+            return None
+
+        elapsed = time.perf_counter() - start
+        ok = response.status_code in expected
+        self.stats.record(endpoint, elapsed, ok, response.status_code == 304)
+        return response if ok else None
+
+    def post(self, endpoint, payload):
+        response = self.request("POST", endpoint, endpoint, json=payload)
+        return response.json() if response is not None else None
+
+    def close(self):
+        self.session.close()
+
+
+def run_worker(number, args, stats, stop, worker_ids):
+    api = ApiSession(args.url, stats)
+    tasks = [
+        {"name": f"task_{order}", "version": "bench"}
+        for order in range(args.tasks_per_process)
+    ]
+    registered = api.post(
+        "/matricula",
+        {"name": f"bench_worker_{number}", "version": "bench", "tasks": tasks},
+    )
+    if registered is None:
+        api.close()
+        return
+    worker_id = registered["id"]
+    worker_ids.append(worker_id)
+
+    rng = random.Random(args.seed + number)
+    next_heartbeat = 0
+    while not stop.is_set():
+        if time.monotonic() >= next_heartbeat:
+            api.post("/healthchecker", {"id": worker_id})
+            next_heartbeat = time.monotonic() + args.heartbeat_interval
+
+        process = api.post("/newprocess", {"id": worker_id})
+        if process is None:
+            continue
+
+        failed = rng.random() < args.error_rate
+        for son in process["sons"]:
+            updates = [
+                {"task_id": son["id"], "status": "start"},
+                {"task_id": son["id"], "status": "error" if failed else "success"},
+            ]
+            if args.batch_updates:
+                api.post("/actualizar_tasks", updates)
+            else:
+                for update in updates:
+                    api.post("/actualizar_task", update)
+            if args.task_time:
+                time.sleep(rng.uniform(0, 2 * args.task_time))
+
+        api.post("/endprocess", {"id": process["father"]})
+
+    api.close()
+
+
+def run_dashboard(number, args, stats, stop, worker_ids):
+    api = ApiSession(args.url, stats)
+    etags = {}
+    rng = random.Random(args.seed + 10000 + number)
+
+    def get(endpoint, path):
+        headers = {}
+        if args.etag and path in etags:
+            headers["If-None-Match"] = etags[path]
+        response = api.request("GET", endpoint, path, (200, 304), headers=headers)
+        if response is None:
+            return None
+        if "ETag" in response.headers:
+            etags[path] = response.headers["ETag"]
+        return response.json() if response.status_code == 200 else None
+
+    while not stop.wait(rng.uniform(0.5, 1.5) * args.poll_interval):
+        get("/dashboard_workers", "/dashboard_workers")
+        if not worker_ids:
+            continue
+
+        worker_id = rng.choice(worker_ids)
+        processes = get("/dashboard_process/{id}", f"/dashboard_process/{worker_id}")
+        if processes:
+            process_id = rng.choice(processes)["id"]
+            get("/dashboard_tasks/{id}", f"/dashboard_tasks/{process_id}")
+
+    api.close()
+
+
+def start_server(args):
+    env = dict(os.environ, DB_ENGINE=args.db, TOKEN=TOKEN)
+    database = None
+    if args.db == "sqlite":
+        database = tempfile.NamedTemporaryFile(suffix=".db", delete=False).name
+        env["SQLITE_PATH"] = database
+
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "api:app",
+            "--port",
+            str(args.port),
+            "--log-level",
+            "warning",
+        ],
+        cwd=APP_DIR,
+        env=env,
+    )
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f"{args.url}/version", timeout=1)
+            return server, database
+        except requests.exceptions.RequestException:
+            if server.poll() is not None:
+                break
+            time.sleep(0.2)
+
+    server.kill()
+    raise SystemExit("No se pudo arrancar la API")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            text=True,
+            stderr=subprocess.DEVNULL,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    stats = Stats()
+    stop = threading.Event()
+    worker_ids = []
+
+    threads = [
+        threading.Thread(target=run_worker, args=(n, args, stats, stop, worker_ids))
+        for n in range(args.workers)
+    ] + [
+        threading.Thread(target=run_dashboard, args=(n, args, stats, stop, worker_ids))
+        for n in range(args.dashboards)
+    ]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - start
+
+    endpoints = stats.summary(duration)
+    total = sum(endpoint["requests"] for endpoint in endpoints.values())
+    return {
+        "commit": git_commit(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "duration_s": round(duration, 3),
+        "total": {
+            "requests": total,
+            "errors": sum(endpoint["errors"] for endpoint in endpoints.values()),
+            "rps": round(total / duration, 2),
+        },
+        "endpoints": endpoints,
+    }
+
+
+def print_report(result):
+    print(
+        f"{'endpoint':<26}{'reqs':>8}{'err':>6}{'304':>6}{'req/s':>9}"
+        f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+    )
+    for name, endpoint in result["endpoints"].items():
+        print(
+            f"{name:<26}{endpoint['requests']:>8}{endpoint['errors']:>6}"
+            f"{endpoint['not_modified']:>6}{endpoint['rps']:>9.1f}"
+            f"{endpoint['p50_ms']:>9.2f}{endpoint['p95_ms']:>9.2f}"
+            f"{endpoint['p99_ms']:>9.2f}{endpoint['max_ms']:>9.2f}"
+        )
+    total = result["total"]
+    print(
+        f"total: {total['requests']} peticiones, {total['errors']} errores, "
+        f"{total['rps']} req/s en {result['duration_s']} s"
+    )
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=10)
+    parser.add_argument("--dashboards", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=30, help="segundos")
+    parser.add_argument("--tasks-per-process", type=int, default=5)
+    parser.add_argument(
+        "--task-time",
+        type=float,
+        default=0,
+        help="segundos medios de trabajo entre tareas (0: sin pausa)",
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.05, help="procesos que fallan"
+    )
+    parser.add_argument("--heartbeat-interval", type=float, default=10)
+    parser.add_argument("--poll-interval", type=float, default=2)
+    parser.add_argument(
+        "--batch-updates",
+        action="store_true",
+        help="enviar las tareas con /actualizar_tasks",
+    )
+    parser.add_argument(
+        "--no-etag",
+        dest="etag",
+        action="store_false",
+        help="los dashboards no envían If-None-Match",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--db",
+        choices=["sqlite", "mysql"],
+        default="sqlite",
+        help="base de datos del servidor que se arranca (mysql: variables MYSQL_*)",
+    )
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--url", help="usar un servidor ya arrancado en lugar de lanzar uno"
+    )
+    parser.add_argument("-o", "--output", help="fichero JSON con los resultados")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+
+    server = database = None
+    if not args.url:
+        args.url = f"http://127.0.0.1:{args.port}"
+        server, database = start_server(args)
+
+    try:
+        result = run(args)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        if database:
+            os.remove(database)
+
+    print_report(result)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(result, output, indent=2)
+            output.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""Presupuesto de consultas SQL por endpoint, para detectar N+1.
+
+QueryCounter cuenta las sentencias SQL que se ejecutan mientras está activo
+(con un evento before_cursor_execute sobre todos los engines, también el
+asíncrono) y query_budget falla si se pasan de un máximo:
+
+    with query_budget(2, "/dashboard_workers"):
+        client.get("/dashboard_workers")
+
+Ejecutado como script, siembra una base de datos SQLite con conjuntos de
+datos cada vez más grandes (N workers con N procesos de N tareas) y comprueba
+que cada endpoint hace el mismo número de consultas con cualquier N y que
+no supera su presupuesto en BUDGETS. Termina con código 1 si alguno falla:
+
+    python benchmarks/query_budget.py
+    python benchmarks/query_budget.py --sizes 2 10 40 -v
+
+tests/test_query_budget.py hace la misma comprobación con pytest.
+"""
+
+import os
+import sys
+import argparse
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# máximo de consultas por petición, con la caché de respuestas vacía; el
+# lote de /actualizar_tasks aplica cada tarea por separado: se mide con una
+# tarea y lo que añade cada tarea más (los procesos se bloquean, y las series
+# de /stats/timeseries y los cuantiles de /stats/percentiles se escriben, una
+# vez por lote). El seq de /changes va en los mismos UPDATE e INSERT de cada
+# fila, sin sentencias propias
+BUDGETS = {
+    "GET /dashboard_workers": 2,
+    "GET /dashboard_process/{id}": 3,
+    "GET /dashboard_tasks/{id}": 3,
+    "GET /dashboard_task/{id}": 3,
+    "POST /healthchecker": 2,
+    "POST /newprocess": 8,
+    "POST /actualizar_tasks (1 tarea)": 8,
+    "POST /actualizar_tasks (por tarea más)": 5,
+    "POST /actualizar_task": 9,
+    "POST /endprocess": 7,
+}
+
+
+class QueryCounter:
+    """Sentencias SQL ejecutadas (en cualquier hilo) mientras está activo."""
+
+    def __init__(self):
+        self.statements = []
+        self._lock = threading.Lock()
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        with self._lock:
+            self.statements.append(statement)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def __enter__(self):
+        event.listen(Engine, "before_cursor_execute", self._count)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(Engine, "before_cursor_execute", self._count)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def query_budget(max_queries, label=""):
+    """Falla con QueryBudgetExceeded si el bloque hace más de max_queries consultas."""
+    with QueryCounter() as counter:
+        yield counter
+
+    if counter.count > max_queries:
+        statements = "\n".join(
+            f"  {number}. {' '.join(statement.split())[:160]}"
+            for number, statement in enumerate(counter.statements, 1)
+        )
+        raise QueryBudgetExceeded(
+            f"{label}: {counter.count} consultas (máximo {max_queries})\n{statements}"
+        )
+
+
+def create_client():
+    # la API sobre una base de datos SQLite nueva, con los latidos escritos al
+    # momento para que cuenten en la petición que los recibe; se asignan (no
+    # setdefault) para no escribir nunca en la base de datos configurada en el
+    # entorno. La aplicación lee estas variables al importarse: solo una vez
+    # por proceso
+    database = tempfile.NamedTemporaryFile(suffix=".db", delete=False).name
+    os.environ["DB_ENGINE"] = "sqlite"
+    os.environ["SQLITE_PATH"] = database
+    os.environ["HEARTBEAT_FLUSH_INTERVAL"] = "0"
+    sys.path.insert(0, os.path.join(ROOT, "app"))
+
+    from fastapi.testclient import TestClient
+    from api import app, VALID_TOKEN
+    from response_cache import dashboard_cache
+
+    client = TestClient(app)
+    client.headers["Authorization"] = f"Bearer {VALID_TOKEN}"
+    return client, dashboard_cache, database
+
+
+def call(client, method, path, payload=None):
+    response = client.request(method, path, json=payload)
+    response.raise_for_status()
+    return response.json()
+
+
+def seed(client, size, batch):
+    """size workers con size tareas y size procesos terminados cada uno."""
+    workers = []
+    for number in range(size):
+        tasks = [{"name": f"task_{order}", "version": "v1"} for order in range(size)]
+        worker = call(
+            client,
+            "POST",
+            "/matricula",
+            {"name": f"worker_{batch}_{number}", "version": "v1", "tasks": tasks},
+        )["id"]
+        for _ in range(size):
+            process = call(client, "POST", "/newprocess", {"id": worker})
+            updates = [
+                {"task_id": son["id"], "status": status}
+                for son in process["sons"]
+                for status in ("start", "success")
+            ]
+            call(client, "POST", "/actualizar_tasks", updates)
+            call(client, "POST", "/endprocess", {"id": process["father"]})
+        workers.append(worker)
+    return workers
+
+
+def measure(client, dashboard_cache, worker_id):
+    """Consultas de cada endpoint para un worker con procesos y tareas sembrados."""
+    counts = {}
+    statements = {}
+
+    def counted(name, method, path, payload=None):
+        dashboard_cache.entries.clear()  # siempre el camino sin caché
+        with QueryCounter() as counter:
+            result = call(client, method, path, payload)
+        counts[name] = counter.count
+        statements[name] = counter.statements
+        return result
+
+    processes = counted("GET /dashboard_workers", "GET", "/dashboard_workers")
+    processes = counted(
+        "GET /dashboard_process/{id}", "GET", f"/dashboard_process/{worker_id}"
+    )
+    tasks = counted(
+        "GET /dashboard_tasks/{id}", "GET", f"/dashboard_tasks/{processes[0]['id']}"
+    )
+    counted("GET /dashboard_task/{id}", "GET", f"/dashboard_task/{tasks[0]['id']}")
+    counted("POST /healthchecker", "POST", "/healthchecker", {"id": worker_id})
+
+    process = counted("POST /newprocess", "POST", "/newprocess", {"id": worker_id})
+    sons = process["sons"]
+    one, extra = (
+        "POST /actualizar_tasks (1 tarea)",
+        "POST /actualizar_tasks (por tarea más)",
+    )
+    batch = [{"task_id": son["id"], "status": "start"} for son in sons]
+    counted(one, "POST", "/actualizar_tasks", batch[:1])
+    counted(extra, "POST", "/actualizar_tasks", batch)
+    counts[extra] = (counts[extra] - counts[one]) / (len(batch) - 1)
+    counted(
+        "POST /actualizar_task",
+        "POST",
+        "/actualizar_task",
+        {"task_id": sons[0]["id"], "status": "success"},
+    )
+    counted("POST /endprocess", "POST", "/endprocess", {"id": process["father"]})
+    return counts, statements
+
+
+def measure_sizes(client, dashboard_cache, sizes):
+    """(N, consultas, sentencias) de measure tras sembrar cada N de sizes."""
+    results = []
+    for batch, size in enumerate(sorted(sizes)):
+        workers = seed(client, size, batch)
+        counts, statements = measure(client, dashboard_cache, workers[-1])
+        results.append((size, counts, statements))
+    return results
+
+
+def budget_failures(results):
+    """Endpoints cuyas consultas crecen con N o pasan de su máximo en BUDGETS."""
+    failures = []
+    for name in results[0][1]:
+        counts = [result[1][name] for result in results]
+        budget = BUDGETS.get(name)
+        if len(set(counts)) > 1:
+            failures.append(f"{name}: crece con los datos ({counts})")
+        if budget is not None and max(counts) > budget:
+            failures.append(f"{name}: {max(counts):g} consultas (máximo {budget})")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[2, 5, 10],
+        help="N de cada conjunto de datos (N workers, N procesos, N tareas)",
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="mostrar las sentencias"
+    )
+    args = parser.parse_args()
+
+    client, dashboard_cache, database = create_client()
+    try:
+        results = measure_sizes(client, dashboard_cache, args.sizes)
+    finally:
+        client.close()
+        os.remove(database)
+
+    print(f"{'endpoint':<40}" + "".join(f"{'N=' + str(s):>8}" for s, _, _ in results))
+    for name in results[0][1]:
+        counts = [result[1][name] for result in results]
+        budget = BUDGETS.get(name)
+        line = f"{name:<40}" + "".join(f"{count:>8g}" for count in counts)
+        print(line + (f"   máximo {budget}" if budget is not None else ""))
+
+        if args.verbose:
+            for statement in results[-1][2][name]:
+                print(f"    {' '.join(statement.split())[:120]}")
+
+    failures = budget_failures(results)
+    if failures:
+        print("\n".join(["", "Fallos:"] + failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
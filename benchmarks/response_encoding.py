@@ -0,0 +1,148 @@
+"""Serialización de los dashboards: camino rápido frente a validar con pydantic.
+
+Construye filas de tareas, procesos y workers con las mismas funciones que
+db_control (task_dashboard_row, ...) y las serializa de las dos formas que
+tiene app/serialization.py: pasándolas por el modelo de respuesta
+(STRICT_RESPONSES=1) y tomando los campos tal cual. Comprueba que el JSON
+resultante es el mismo y muestra el tiempo de cada camino. Termina con
+código 1 si algún JSON difiere:
+
+    python benchmarks/response_encoding.py
+    python benchmarks/response_encoding.py --rows 50000
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from datetime import timedelta
+from types import SimpleNamespace
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_app():
+    # db_control importa DB.structure, que necesita una base de datos
+    database = tempfile.NamedTemporaryFile(suffix=".db", delete=False).name
+    os.environ.setdefault("DB_ENGINE", "sqlite")
+    os.environ.setdefault("SQLITE_PATH", database)
+    sys.path.insert(0, os.path.join(ROOT, "app"))
+
+    import api
+    import serialization
+    from DB import db_control
+
+    return api, serialization, db_control, database
+
+
+def sample_rows(db_control, count):
+    """count filas de cada dashboard, con fechas sin microsegundos, None y texto no ASCII."""
+    now = db_control.generate_datetime()
+    tasks, processes, workers = [], [], []
+    for number in range(count):
+        created = now - timedelta(days=number % 3, seconds=number)
+        if number % 7 == 0:
+            created = created.replace(microsecond=0)
+        started = None if number % 5 == 0 else created + timedelta(milliseconds=number)
+        # las listas llevan has_details sin details; /dashboard_task/{id}, los dos
+        details = "detalle " * (number % 4) if number % 2 == 0 else None
+        task = SimpleNamespace(
+            uuid=f"task_{number}",
+            name=f"tarea_ñ_{number % 10}",
+            version="1.0",
+            status=["pending", "running", "success", "error"][number % 4],
+            create=created,
+            started=started,
+            update=None if number % 3 == 0 else now,
+            father=f"process_{number // 10}",
+            order=number % 10 + 1,
+            has_details=details is not None,
+        )
+        tasks.append(
+            db_control.task_dashboard_row(task, 10, details if number % 3 else None)
+        )
+
+        process = SimpleNamespace(
+            father=f"process_{number}",
+            step=f"tarea_{number % 10}",
+            step_status=["pending", "running", "success"][number % 3],
+            last_update=None if number % 3 == 0 else created,
+            tasks_total=10,
+            tasks_updated=number % 11,
+            tasks_finished=number % 11,
+        )
+        processes.append(db_control.process_dashboard_row(process, "worker ñ"))
+
+        worker = SimpleNamespace(
+            id=f"worker_{number}",
+            status="online" if number % 2 else "ofline",
+            processed=number,
+            running=number % 3,
+            success=number,
+            error=number % 5,
+            duration_sum=number * 3,
+            duration_count=number % 4,
+        )
+        workers.append(db_control.worker_dashboard_row(worker))
+    return tasks, processes, workers
+
+
+def strict(serialization, model, rows):
+    serialization.STRICT_RESPONSES = True
+    try:
+        return serialization.json_body(serialization.serialize_rows(model, rows))
+    finally:
+        serialization.STRICT_RESPONSES = False
+
+
+def fast(serialization, model, rows):
+    return serialization.json_body(serialization.serialize_rows(model, rows))
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--rows", type=int, default=20000, help="filas de cada dashboard"
+    )
+    args = parser.parse_args()
+
+    api, serialization, db_control, database = load_app()
+    try:
+        tasks, processes, workers = sample_rows(db_control, args.rows)
+        datasets = [
+            ("tareas", api.TaskDetailOut, tasks),
+            ("tarea", api.TaskWithDetailsOut, tasks),
+            ("procesos", api.ProcessDetailOut, processes),
+            ("workers", api.WorkerDetailOut, workers),
+        ]
+
+        encoder = "orjson" if serialization.orjson is not None else "json"
+        print(f"{args.rows} filas, {encoder}")
+        print(f"{'dashboard':<12}{'validando':>12}{'rápido':>12}{'igual':>8}")
+        failed = False
+        for name, model, rows in datasets:
+            expected, strict_time = timed(strict, serialization, model, rows)
+            body, fast_time = timed(fast, serialization, model, rows)
+            same = json.loads(body) == json.loads(expected)
+            failed = failed or not same
+            print(
+                f"{name:<12}{strict_time * 1000:>10.1f}ms{fast_time * 1000:>10.1f}ms"
+                f"{'sí' if same else 'NO':>8}"
+            )
+    finally:
+        os.unlink(database)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+"""Cliente Python de la API de Process monitor para los workers.
+
+ProcessMonitorClient (requests) y AsyncProcessMonitorClient (httpx, opcional).
+"""
+
+from process_monitor_client._common import TASK_STATES, ProcessMonitorError
+from process_monitor_client.client import ProcessMonitorClient
+
+try:
+    from process_monitor_client.async_client import AsyncProcessMonitorClient
+except ImportError:  # httpx no está instalado
+    AsyncProcessMonitorClient = None
+
+
+__all__ = [
+    "ProcessMonitorClient",
+    "AsyncProcessMonitorClient",
+    "ProcessMonitorError",
+    "TASK_STATES",
+]
@@ -0,0 +1,94 @@
+import logging
+from datetime import datetime, timezone
+
+
+logger = logging.getLogger("process_monitor_client")
+
+TASK_STATES = ["start", "error", "success"]
+
+DEFAULT_TIMEOUT = 10  # segundos por petición
+DEFAULT_BATCH_SIZE = 100  # actualizaciones de tareas por POST /actualizar_tasks
+DEFAULT_FLUSH_INTERVAL = 1.0  # segundos como máximo que espera una actualización
+DEFAULT_HEARTBEAT_INTERVAL = 10.0  # debe ser menor que MAX_HEALTHCHECK (30 s)
+MAX_BUFFERED_UPDATES = 100000
+
+
+class ProcessMonitorError(Exception):
+    """Error devuelto por la API o de comunicación con ella."""
+
+
+def auth_headers(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def worker_payload(name, version, tasks):
+    """Cuerpo de /matricula; tasks puede ser una lista de nombres o de dicts."""
+    return {
+        "name": name,
+        "version": version,
+        "tasks": [
+            task if isinstance(task, dict) else {"name": task, "version": version}
+            for task in tasks
+        ],
+    }
+
+
+def task_update(task_id, status, details=None):
+    if status not in TASK_STATES:
+        raise ValueError(
+            f"Estado de tarea no válido: {status} ({', '.join(TASK_STATES)})"
+        )
+    # las actualizaciones salen por lotes: la hora del cambio viaja con él, en
+    # UTC, para que la duración de la tarea no dependa de cuándo se envía
+    update = {
+        "task_id": task_id,
+        "status": status,
+        "at": datetime.now(timezone.utc).isoformat(),
+    }
+    if details is not None:  # la API no acepta details: null
+        update["details"] = details
+    return update
+
+
+def end_process_payload(process_id, details=None):
+    payload = {"id": process_id}
+    if details is not None:
+        payload["details"] = details
+    return payload
+
+
+def log_rejected_updates(results):
+    for result in results:
+        if result.get("status") != "ok":
+            logger.warning(
+                "Actualización rechazada: %s (%s)", result["task_id"], result["status"]
+            )
+
+
+class UpdateBuffer:
+    """Cola de actualizaciones pendientes, sin bloqueo (lo pone cada cliente)."""
+
+    def __init__(self, max_size=MAX_BUFFERED_UPDATES):
+        self.updates = []
+        self.max_size = max_size
+
+    def add(self, update):
+        self.updates.append(update)
+        if len(self.updates) > self.max_size:
+            # la API no responde: se descartan las más antiguas
+            dropped = len(self.updates) - self.max_size
+            del self.updates[:dropped]
+            logger.warning("Buffer lleno: %s actualizaciones descartadas", dropped)
+        return len(self.updates)
+
+    def take(self, batch_size):
+        batch = self.updates[:batch_size]
+        del self.updates[:batch_size]
+        return batch
+
+    def put_back(self, batch):
+        # si el envío falla vuelven al principio, en el mismo orden
+        self.updates[:0] = batch
+
+    def __len__(self):
+        return len(self.updates)
@@ -0,0 +1,174 @@
+"""Cliente asíncrono (httpx) de la API de Process monitor."""
+
+import asyncio
+
+import httpx
+
+from process_monitor_client._common import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_FLUSH_INTERVAL,
+    DEFAULT_HEARTBEAT_INTERVAL,
+    DEFAULT_TIMEOUT,
+    ProcessMonitorError,
+    UpdateBuffer,
+    auth_headers,
+    end_process_payload,
+    log_rejected_updates,
+    logger,
+    task_update,
+    worker_payload,
+)
+
+
+class AsyncProcessMonitorClient:
+    """Versión asyncio de ProcessMonitorClient, con un httpx.AsyncClient persistente.
+
+    El envío de lotes y el latido son tareas de asyncio del bucle en el que se
+    llama a register (o al entrar en el contexto con worker_id).
+
+        async with AsyncProcessMonitorClient("http://localhost:8000", token) as client:
+            await client.register("mi_worker", "v1", ["descarga", "proceso"])
+            process = await client.new_process()
+            client.update_task(process["sons"][0]["id"], "start")
+            ...
+            await client.end_process(process["father"])
+    """
+
+    def __init__(
+        self,
+        base_url,
+        token,
+        worker_id=None,
+        batch_size=DEFAULT_BATCH_SIZE,
+        flush_interval=DEFAULT_FLUSH_INTERVAL,
+        heartbeat_interval=DEFAULT_HEARTBEAT_INTERVAL,
+        timeout=DEFAULT_TIMEOUT,
+        max_connections=4,
+    ):
+        self.worker_id = worker_id
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.heartbeat_interval = heartbeat_interval
+
+        self.http = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            headers=auth_headers(token),
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections),
+        )
+
+        self._buffer = UpdateBuffer()
+        self._send_lock = None  # se crea dentro del bucle de eventos
+        self._flush_now = None
+        self._tasks = []
+
+    # peticiones
+
+    async def _post(self, path, payload):
+        try:
+            response = await self.http.post(path, json=payload)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            raise ProcessMonitorError(f"POST {path}: {e}") from e
+        return response.json()
+
+    async def register(self, name, version, tasks):
+        """Registra el worker (/matricula) y arranca el latido y el envío de lotes."""
+        response = await self._post("/matricula", worker_payload(name, version, tasks))
+        self.worker_id = response["id"]
+        self._start_background()
+        return self.worker_id
+
+    async def new_process(self):
+        """Nuevo proceso del worker: {"father": id, "sons": [{"name", "id"}, ...]}."""
+        return await self._post("/newprocess", {"id": self.worker_id})
+
+    def update_task(self, task_id, status, details=None):
+        """Encola el cambio de estado de una tarea; no hace ninguna petición."""
+        pending = self._buffer.add(task_update(task_id, status, details))
+        if pending >= self.batch_size and self._flush_now is not None:
+            self._flush_now.set()
+
+    async def end_process(self, process_id, details=None):
+        """Envía antes las actualizaciones pendientes, para que lleguen en orden."""
+        await self.flush()
+        response = await self._post(
+            "/endprocess", end_process_payload(process_id, details)
+        )
+        return response["status"]
+
+    async def healthcheck(self):
+        response = await self._post("/healthchecker", {"id": self.worker_id})
+        return bool(response["health"])
+
+    async def flush(self):
+        """Envía ya todas las actualizaciones pendientes."""
+        if self._send_lock is None:
+            self._send_lock = asyncio.Lock()
+
+        async with self._send_lock:
+            while True:
+                batch = self._buffer.take(self.batch_size)
+                if not batch:
+                    return
+
+                try:
+                    results = await self._post("/actualizar_tasks", batch)
+                except ProcessMonitorError:
+                    self._buffer.put_back(batch)
+                    raise
+
+                log_rejected_updates(results)
+
+    # tareas en segundo plano
+
+    def _start_background(self):
+        if self._tasks:
+            return
+
+        self._flush_now = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._flush_loop()),
+            asyncio.create_task(self._heartbeat_loop()),
+        ]
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+
+            try:
+                await self.flush()
+            except ProcessMonitorError as e:
+                logger.warning("No se pudieron enviar las actualizaciones: %s", e)
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self.healthcheck()
+            except ProcessMonitorError as e:
+                logger.warning("Fallo en el latido: %s", e)
+
+    async def close(self):
+        """Envía lo pendiente, para las tareas y cierra el cliente HTTP."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        try:
+            await self.flush()
+        finally:
+            await self.http.aclose()
+
+    async def __aenter__(self):
+        if self.worker_id:
+            self._start_background()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
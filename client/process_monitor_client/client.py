@@ -0,0 +1,176 @@
+"""Cliente síncrono (requests) de la API de Process monitor."""
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from process_monitor_client._common import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_FLUSH_INTERVAL,
+    DEFAULT_HEARTBEAT_INTERVAL,
+    DEFAULT_TIMEOUT,
+    ProcessMonitorError,
+    UpdateBuffer,
+    auth_headers,
+    end_process_payload,
+    log_rejected_updates,
+    logger,
+    task_update,
+    worker_payload,
+)
+
+
+class ProcessMonitorClient:
+    """Cliente para los workers.
+
+    Usa una sola requests.Session (conexiones keep-alive reutilizadas). Las
+    actualizaciones de tareas se guardan en memoria y un hilo las envía en
+    lotes a /actualizar_tasks cada flush_interval segundos o al llegar a
+    batch_size; otro hilo envía el latido del worker cada heartbeat_interval.
+
+        with ProcessMonitorClient("http://localhost:8000", token) as client:
+            client.register("mi_worker", "v1", ["descarga", "proceso"])
+            process = client.new_process()
+            client.update_task(process["sons"][0]["id"], "start")
+            ...
+            client.end_process(process["father"])
+    """
+
+    def __init__(
+        self,
+        base_url,
+        token,
+        worker_id=None,
+        batch_size=DEFAULT_BATCH_SIZE,
+        flush_interval=DEFAULT_FLUSH_INTERVAL,
+        heartbeat_interval=DEFAULT_HEARTBEAT_INTERVAL,
+        timeout=DEFAULT_TIMEOUT,
+        pool_maxsize=4,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.worker_id = worker_id
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        self.session.headers.update(auth_headers(token))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._buffer = UpdateBuffer()
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()  # un lote en vuelo a la vez, en orden
+        self._flush_now = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+
+        if worker_id:
+            self._start_background()
+
+    # peticiones
+
+    def _post(self, path, payload):
+        try:
+            response = self.session.post(
+                f"{self.base_url}{path}", json=payload, timeout=self.timeout
+            )
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            raise ProcessMonitorError(f"POST {path}: {e}") from e
+        return response.json()
+
+    def register(self, name, version, tasks):
+        """Registra el worker (/matricula) y arranca el latido y el envío de lotes."""
+        response = self._post("/matricula", worker_payload(name, version, tasks))
+        self.worker_id = response["id"]
+        self._start_background()
+        return self.worker_id
+
+    def new_process(self):
+        """Nuevo proceso del worker: {"father": id, "sons": [{"name", "id"}, ...]}."""
+        return self._post("/newprocess", {"id": self.worker_id})
+
+    def update_task(self, task_id, status, details=None):
+        """Encola el cambio de estado de una tarea; no espera a la API."""
+        update = task_update(task_id, status, details)
+        with self._lock:
+            pending = self._buffer.add(update)
+        if pending >= self.batch_size:
+            self._flush_now.set()
+
+    def end_process(self, process_id, details=None):
+        """Envía antes las actualizaciones pendientes, para que lleguen en orden."""
+        self.flush()
+        response = self._post("/endprocess", end_process_payload(process_id, details))
+        return response["status"]
+
+    def healthcheck(self):
+        return bool(self._post("/healthchecker", {"id": self.worker_id})["health"])
+
+    def flush(self):
+        """Envía ya todas las actualizaciones pendientes."""
+        with self._send_lock:
+            while True:
+                with self._lock:
+                    batch = self._buffer.take(self.batch_size)
+                if not batch:
+                    return
+
+                try:
+                    results = self._post("/actualizar_tasks", batch)
+                except ProcessMonitorError:
+                    with self._lock:
+                        self._buffer.put_back(batch)
+                    raise
+
+                log_rejected_updates(results)
+
+    # hilos en segundo plano
+
+    def _start_background(self):
+        if self._threads:
+            return
+
+        for target in (self._flush_loop, self._heartbeat_loop):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _flush_loop(self):
+        while not self._stop.is_set():
+            self._flush_now.wait(self.flush_interval)
+            self._flush_now.clear()
+            try:
+                self.flush()
+            except ProcessMonitorError as e:
+                logger.warning("No se pudieron enviar las actualizaciones: %s", e)
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            try:
+                self.healthcheck()
+            except ProcessMonitorError as e:
+                logger.warning("Fallo en el latido: %s", e)
+
+    def close(self):
+        """Envía lo pendiente, para los hilos y cierra la sesión."""
+        self._stop.set()
+        self._flush_now.set()
+        for thread in self._threads:
+            thread.join(timeout=self.timeout)
+        self._threads = []
+
+        try:
+            self.flush()
+        finally:
+            self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,6 +1,10 @@
 import os
+import json
+import time
+import threading
+from collections import OrderedDict
 import dash
-from dash import Dash, dcc, html, Input, Output, dash_table, State
+from dash import Dash, dcc, html, Input, Output, dash_table, State, Patch
 import pandas as pd
 import dash_bootstrap_components as dbc
 import requests
@@ -11,14 +15,45 @@ BACKEND = os.environ.get("BACKEND")
 API_WORKERS_URL = f"http://{BACKEND}/dashboard_workers"
 API_PROCESS_URL = f"http://{BACKEND}/dashboard_process"
 API_TASK_URL = f"http://{BACKEND}/dashboard_tasks"
+API_TASK_DETAIL_URL = f"http://{BACKEND}/dashboard_task"
+API_STREAM_URL = f"http://{BACKEND}/stream"
+
+# con /stream conectado las tablas se actualizan cada LIVE_REFRESH segundos con los
+# cambios recibidos, sin consultar la API; si no, se recargan cada FULL_REFRESH
+LIVE_REFRESH = int(os.environ.get("LIVE_REFRESH", 2))
+FULL_REFRESH = 15
+MAX_LIVE_ROWS = 10000
+
+# la tabla de procesos se pagina en la API (cursor en la cabecera X-Next-Cursor)
+PAGE_SIZE = 10
+MAX_TASKS = 1000
+
+
+_api_responses = {}  # (url, params) -> (etag, datos, cabeceras)
+
+
+def api_get(url, params=None):
+    """GET con If-None-Match: si la API responde 304 se reutilizan los datos guardados."""
+    key = (url, tuple(sorted((params or {}).items())))
+    etag, data, headers = _api_responses.get(key, (None, None, None))
+
+    response = requests.get(
+        url, params=params, headers={"If-None-Match": etag} if etag else {}
+    )
+    if response.status_code == 304:
+        return data, headers
+
+    response.raise_for_status()
+    data, headers = response.json(), response.headers
+    if response.headers.get("ETag"):
+        _api_responses[key] = (response.headers["ETag"], data, headers)
+    return data, headers
 
 
 # Función para obtener los datos desde la API de trabajadores
 def fetch_workers_data():
     try:
-        response = requests.get(API_WORKERS_URL)
-        response.raise_for_status()
-        data = response.json()
+        data, _ = api_get(API_WORKERS_URL)
         return pd.DataFrame(data)
     except requests.exceptions.RequestException as e:
         print(f"Error al obtener datos de la API: {e}")
@@ -26,12 +61,15 @@ def fetch_workers_data():
 
 
 # Función para obtener los datos desde la API de procesos
-def fetch_process_data(worker_id):
+def fetch_process_data(worker_id, cursor=None, status=None):
+    """Una página de procesos (la más reciente sin cursor) y el cursor de la siguiente."""
+    params = {"limit": PAGE_SIZE, "cursor": cursor, "status": status}
     try:
-        response = requests.get(f"{API_PROCESS_URL}/{worker_id}")
-        response.raise_for_status()
-        data = response.json()
+        data, headers = api_get(f"{API_PROCESS_URL}/{worker_id}", params)
+        next_cursor = headers.get("X-Next-Cursor")
         df_process = pd.DataFrame(data)
+        if df_process.empty:
+            return df_process, None
         # Ordenar por Status (Errores primero) y luego por Last_update (más reciente primero)
         df_process["Status"] = pd.Categorical(
             df_process["status"],
@@ -41,10 +79,10 @@ def fetch_process_data(worker_id):
         df_process = df_process.sort_values(
             by=["Status", "last_update"], ascending=[True, False]
         )
-        return df_process
+        return df_process, next_cursor
     except requests.exceptions.RequestException as e:
         print(f"Error al obtener datos de la API de procesos: {e}")
-        return pd.DataFrame([])
+        return pd.DataFrame([]), None
 
 
 # Función para obtener los datos desde la API de tareas
@@ -71,15 +109,106 @@ def fetch_task_data(process_id):
 # Función para obtener los datos desde la API de tareas
 def fetch_task_data(process_id):
     try:
-        response = requests.get(f"{API_TASK_URL}/{process_id}")
-        response.raise_for_status()
-        data = response.json()
+        # las tareas de un proceso son las definidas por el worker: caben en una página
+        data, _ = api_get(f"{API_TASK_URL}/{process_id}", {"limit": MAX_TASKS})
         return pd.DataFrame(data)
     except requests.exceptions.RequestException as e:
         print(f"Error al obtener datos de la API de tareas: {e}")
         return pd.DataFrame([])
 
 
+# Detalles de una tarea: la lista de tareas solo dice si los tiene (has_details)
+def fetch_task_details(task_id):
+    try:
+        data, _ = api_get(f"{API_TASK_DETAIL_URL}/{task_id}")
+        return data["details"]
+    except requests.exceptions.RequestException as e:
+        print(f"Error al obtener los detalles de la tarea: {e}")
+        return None
+
+
+class LiveFeed:
+    """Consume /stream en un hilo y guarda la última fila de cada worker, proceso y tarea."""
+
+    def __init__(self, url):
+        self.url = url
+        self.rows = {
+            "worker": OrderedDict(),
+            "process": OrderedDict(),
+            "task": OrderedDict(),
+        }
+        self.connected = False
+        self.last_event_id = None
+        self.lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            # al reconectar, Last-Event-ID pide los eventos que se hayan perdido
+            headers = (
+                {"Last-Event-ID": self.last_event_id} if self.last_event_id else {}
+            )
+            try:
+                with requests.get(
+                    self.url, stream=True, headers=headers, timeout=(5, 60)
+                ) as response:
+                    response.raise_for_status()
+                    self.connected = True
+                    event_id = None
+                    for line in response.iter_lines(decode_unicode=True):
+                        if line.startswith("id:"):
+                            event_id = line[3:].strip()
+                        elif line.startswith("data:"):
+                            self._apply(json.loads(line[5:]))
+                            self.last_event_id = event_id
+            except (requests.exceptions.RequestException, ValueError) as e:
+                print(f"Error en el stream de la API: {e}")
+
+            self.connected = False
+            time.sleep(5)
+
+    def _apply(self, event):
+        with self.lock:
+            rows = self.rows[event["kind"]]
+            rows[event["id"]] = event
+            rows.move_to_end(event["id"])
+            if len(rows) > MAX_LIVE_ROWS:
+                rows.popitem(last=False)
+
+    def patch(self, kind, data, belongs=lambda event: True):
+        """Patch de Dash con las filas de data que han cambiado y las nuevas (None si no hay cambios)."""
+        with self.lock:
+            events = list(self.rows[kind].values())
+
+        index = {row["id"]: i for i, row in enumerate(data)}
+        patch = Patch()
+        changed = False
+        for event in events:
+            row = event["row"]
+            i = index.get(row["id"])
+            if i is None:
+                if belongs(event):
+                    patch.append(row)
+                    changed = True
+            elif any(data[i].get(key) != value for key, value in row.items()):
+                patch[i].update(row)
+                changed = True
+
+        return patch if changed else None
+
+
+def full_refresh_due(n_intervals):
+    return n_intervals % max(1, FULL_REFRESH // LIVE_REFRESH) == 0
+
+
+live_feed = LiveFeed(API_STREAM_URL)
+
+
 # Crear la aplicación Dash con un tema de Bootstrap
 app = Dash(__name__, external_stylesheets=[dbc.themes.FLATLY])
 
@@ -106,8 +235,8 @@ app.layout = html.Div(
                     "Workers Status Table", className="text-center"
                 ),  # Título de la tabla de trabajadores
                 dcc.Interval(
-                    id="interval-workers", interval=15 * 1000, n_intervals=0
-                ),  # Intervalo de 15 segundos
+                    id="interval-workers", interval=LIVE_REFRESH * 1000, n_intervals=0
+                ),  # Cambios de /stream (o recarga completa cada 15 segundos)
                 dash_table.DataTable(
                     id="table",
                     columns=[],  # Las columnas se establecerán dinámicamente
@@ -140,9 +269,16 @@ app.layout = html.Div(
                 ),  # Título de la tabla de procesos
                 dcc.Store(id="process-filter-store", data={"filter_query": ""}),
                 dcc.Store(id="task-filter-store", data={"filter_query": ""}),
+                dcc.Store(id="process-cursors", data={}),  # página -> cursor
+                dcc.Dropdown(
+                    id="process-status-filter",
+                    options=["error", "running", "pending", "success"],
+                    placeholder="Filter by status",
+                    className="mb-2",
+                ),
                 dcc.Interval(
-                    id="interval-processes", interval=15 * 1000, n_intervals=0
-                ),  # Intervalo de 15 segundos
+                    id="interval-processes", interval=LIVE_REFRESH * 1000, n_intervals=0
+                ),  # Cambios de /stream (o recarga completa cada 15 segundos)
                 html.Div(
                     id="process-table-container",
                     children=[
@@ -156,8 +292,8 @@ app.layout = html.Div(
                     "Tasks Table", className="text-center mt-4"
                 ),  # Título de la tabla de tareas
                 dcc.Interval(
-                    id="interval-tasks", interval=15 * 1000, n_intervals=0
-                ),  # Intervalo de 15 segundos
+                    id="interval-tasks", interval=LIVE_REFRESH * 1000, n_intervals=0
+                ),  # Cambios de /stream (o recarga completa cada 15 segundos)
                 html.Div(
                     id="task-content",
                     children=[
@@ -167,6 +303,7 @@ app.layout = html.Div(
                         )
                     ],
                 ),
+                html.Div(id="task-details"),  # Detalles de la tarea seleccionada
             ],
             className="my-4",
         ),
@@ -185,12 +322,20 @@ app.layout = html.Div(
 )
 
 
-# Callback para actualizar la tabla de trabajadores cada 15 segundos
+# Callback para actualizar la tabla de trabajadores
 @app.callback(
     [Output("table", "data"), Output("table", "columns")],
     [Input("interval-workers", "n_intervals")],
+    State("table", "data"),
 )
-def refresh_workers_table(_):
+def refresh_workers_table(n_intervals, data):
+    if data and live_feed.connected:
+        patch = live_feed.patch("worker", data)
+        return patch if patch is not None else dash.no_update, dash.no_update
+
+    if data and not full_refresh_due(n_intervals):
+        return dash.no_update, dash.no_update
+
     df_workers = fetch_workers_data()
     data = df_workers.to_dict("records")
     columns = [{"name": i.capitalize(), "id": i} for i in df_workers.columns]
@@ -201,45 +346,53 @@ def refresh_workers_table(_):
 @app.callback(
     Output("url", "pathname"),
     Input("table", "selected_rows"),
+    State("table", "data"),
     prevent_initial_call=True,
 )
-def update_url(selected_rows):
-    df_workers = fetch_workers_data()  # Volver a cargar los datos
+def update_url(selected_rows, data):
     if selected_rows:
-        selected_id = df_workers.iloc[selected_rows[0]]["id"]
+        selected_id = data[selected_rows[0]]["id"]
         return f"/details/{selected_id}"
     return dash.no_update
 
 
-# Callback para mostrar la página de detalles con la tabla de procesos
+# Callback para mostrar la página de detalles con la tabla de procesos (primera página)
 @app.callback(
-    Output("process-table-container", "children"),
-    [Input("url", "pathname"), Input("interval-processes", "n_intervals")],
+    [
+        Output("process-table-container", "children"),
+        Output("process-cursors", "data"),
+    ],
+    [Input("url", "pathname"), Input("process-status-filter", "value")],
 )
-def display_processes(pathname, _):
+def display_processes(pathname, status):
     if pathname and pathname.startswith("/details/"):
         worker_id = pathname.split("/")[-1]
-        df_process = fetch_process_data(worker_id)
+        df_process, next_cursor = fetch_process_data(worker_id, status=status)
 
         if df_process.empty:
-            return html.Div(
-                [
-                    html.Br(),
-                    html.H3(
-                        f"No data found for Worker ID: {worker_id}",
-                        className="text-center my-4",
-                    ),
-                    dbc.Button("Go back", href="/", color="primary", className="mt-4"),
-                ],
-                className="text-center",
+            return (
+                html.Div(
+                    [
+                        html.Br(),
+                        html.H3(
+                            f"No data found for Worker ID: {worker_id}",
+                            className="text-center my-4",
+                        ),
+                        dbc.Button(
+                            "Go back", href="/", color="primary", className="mt-4"
+                        ),
+                    ],
+                    className="text-center",
+                ),
+                {},
             )
 
-        return dash_table.DataTable(
+        table = dash_table.DataTable(
             id="process_table",
             columns=[{"name": i.capitalize(), "id": i} for i in df_process.columns],
             data=df_process.to_dict("records"),
             row_selectable="single",
-            filter_action="native",  # Permitir filtrado en la tabla
+            filter_action="native",  # Permitir filtrado en la página
             style_table={"overflowX": "auto"},
             style_header={
                 "backgroundColor": "rgb(230, 230, 230)",
@@ -258,19 +411,74 @@ def display_processes(pathname, _):
                     "backgroundColor": "rgb(248, 248, 248)",
                 }
             ],
-            page_size=10,  # Paginación con 10 filas por página
+            page_action="custom",  # cada página se pide a la API
+            page_current=0,
+            page_size=PAGE_SIZE,
+            page_count=2 if next_cursor else 1,
         )
-    return dash.no_update
+        return table, {"0": None, "1": next_cursor}
+    return dash.no_update, dash.no_update
+
+
+# Callback para cambiar de página y actualizar la tabla de procesos del worker seleccionado
+@app.callback(
+    [
+        Output("process_table", "data"),
+        Output("process_table", "page_count"),
+        Output("process-cursors", "data", allow_duplicate=True),
+    ],
+    [
+        Input("interval-processes", "n_intervals"),
+        Input("process_table", "page_current"),
+    ],
+    [
+        State("url", "pathname"),
+        State("process-status-filter", "value"),
+        State("process_table", "data"),
+        State("process-cursors", "data"),
+    ],
+    prevent_initial_call=True,
+)
+def refresh_processes(n_intervals, page_current, pathname, status, data, cursors):
+    if not (pathname and pathname.startswith("/details/")) or not data:
+        return dash.no_update, dash.no_update, dash.no_update
+
+    worker_id = pathname.split("/")[-1]
+    page_changed = dash.ctx.triggered_id == "process_table"
+
+    if not page_changed and live_feed.connected:
+        # solo las filas de la página visible; los procesos nuevos salen al recargar
+        patch = live_feed.patch("process", data, lambda event: False)
+        return (
+            patch if patch is not None else dash.no_update,
+            dash.no_update,
+            dash.no_update,
+        )
+
+    if not page_changed and not full_refresh_due(n_intervals):
+        return dash.no_update, dash.no_update, dash.no_update
+
+    page = page_current or 0
+    df_process, next_cursor = fetch_process_data(
+        worker_id, cursors.get(str(page)), status
+    )
+    cursors[str(page + 1)] = next_cursor
+
+    return (
+        df_process.to_dict("records"),
+        page + 2 if next_cursor else page + 1,
+        cursors,
+    )
 
 
 # Callback para manejar el clic en la fila de la tabla de procesos y mostrar la tabla de tareas
 @app.callback(
     Output("task-content", "children"),
-    [Input("process_table", "selected_rows"), Input("interval-tasks", "n_intervals")],
+    Input("process_table", "selected_rows"),
     State("process_table", "data"),
     prevent_initial_call=True,
 )
-def display_tasks(selected_rows, _, process_data):
+def display_tasks(selected_rows, process_data):
     if selected_rows:
         process_id = process_data[selected_rows[0]]["id"]
         df_tasks = fetch_task_data(process_id)
@@ -289,6 +497,7 @@ def display_tasks(selected_rows, _, process_data):
             id="task_table",
             columns=[{"name": i.capitalize(), "id": i} for i in df_tasks.columns],
             data=df_tasks.to_dict("records"),
+            row_selectable="single",  # al seleccionar una tarea se ven sus detalles
             filter_action="native",  # Permitir filtrado en la tabla
             style_table={"overflowX": "auto"},
             style_header={
@@ -313,6 +522,54 @@ def display_tasks(selected_rows, _, process_data):
     return dash.no_update
 
 
+# Callback para mostrar los detalles de la tarea seleccionada: solo se piden a la
+# API (/dashboard_task/{id}) si la tarea los tiene
+@app.callback(
+    Output("task-details", "children"),
+    Input("task_table", "selected_rows"),
+    State("task_table", "data"),
+    prevent_initial_call=True,
+)
+def display_task_details(selected_rows, data):
+    if not selected_rows or not data:
+        return None
+
+    task = data[selected_rows[0]]
+    if not task.get("has_details"):
+        return html.P(
+            f"No details for Task ID: {task['id']}", className="text-center my-2"
+        )
+    return html.Pre(fetch_task_details(task["id"]) or "", className="my-2")
+
+
+# Callback para actualizar la tabla de tareas del proceso seleccionado
+@app.callback(
+    Output("task_table", "data"),
+    Input("interval-tasks", "n_intervals"),
+    [
+        State("process_table", "selected_rows"),
+        State("process_table", "data"),
+        State("task_table", "data"),
+    ],
+    prevent_initial_call=True,
+)
+def refresh_tasks(n_intervals, selected_rows, process_data, data):
+    if not selected_rows or not data:
+        return dash.no_update
+
+    process_id = process_data[selected_rows[0]]["id"]
+    if live_feed.connected:
+        patch = live_feed.patch(
+            "task", data, lambda event: event["process_id"] == process_id
+        )
+        return patch if patch is not None else dash.no_update
+
+    if not full_refresh_due(n_intervals):
+        return dash.no_update
+
+    return fetch_task_data(process_id).to_dict("records")
+
+
 @app.callback(
     Output("process-filter-store", "data"), Input("process_table", "filter_query")
 )
@@ -327,4 +584,5 @@ def update_task_filter(filter_query):
 
 # Ejecutar la aplicación
 if __name__ == "__main__":
+    live_feed.start()
     app.run_server(host="0.0.0.0", port=8050, debug=True)
@@ -0,0 +1,27 @@
+"""La API sobre una base de datos SQLite temporal, compartida por los tests.
+
+DB.structure crea el engine al importarse, así que la aplicación se importa
+una sola vez por sesión de pytest (con benchmarks/query_budget.create_client,
+que asigna DB_ENGINE y SQLITE_PATH antes). Cada test registra sus propios
+workers y no depende de los datos de los demás.
+"""
+
+import os
+import sys
+
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import query_budget  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def app_client():
+    """(client, dashboard_cache) con el token ya puesto en las cabeceras."""
+    client, dashboard_cache, database = query_budget.create_client()
+    yield client, dashboard_cache
+    client.close()
+    os.remove(database)
@@ -0,0 +1,58 @@
+"""/changes no pierde las transacciones que se confirman tarde.
+
+El seq es la hora a la que cada transacción lo toma, no la de su commit: una
+transacción puede hacerse visible con un seq menor que otro ya leído. Mientras
+no quedan más páginas, el siguiente since no pasa de CHANGES_LOOKBACK segundos
+antes de ahora y esas filas llegan en la consulta siguiente.
+"""
+
+from query_budget import call
+
+
+def test_late_commit_with_older_seq_is_not_skipped(app_client, monkeypatch):
+    from DB import crud_changes
+
+    client, _ = app_client
+    worker = call(
+        client,
+        "POST",
+        "/matricula",
+        {"name": "tarde", "version": "v1", "tasks": [{"name": "t", "version": "v1"}]},
+    )["id"]
+    since = call(client, "GET", "/changes")["seq"]
+
+    first = call(client, "POST", "/newprocess", {"id": worker})
+    changes = call(client, "GET", f"/changes?since={since}")
+    assert first["father"] in [row["id"] for row in changes["processes"]]
+    first_seq = max(row["seq"] for row in changes["processes"])
+
+    # otra transacción tomó su seq antes que la primera y se confirma ahora
+    late_seq = first_seq - 1000
+    monkeypatch.setattr(crud_changes, "now_seq", lambda: late_seq)
+    late = call(client, "POST", "/newprocess", {"id": worker})
+    monkeypatch.undo()
+
+    changes = call(client, "GET", f"/changes?since={changes['seq']}")
+    assert late["father"] in [row["id"] for row in changes["processes"]]
+
+
+def test_cursor_stays_behind_the_lookback_window(app_client):
+    from DB.crud_changes import changes_horizon
+
+    client, _ = app_client
+    since = call(client, "GET", "/changes")["seq"]
+    assert since <= changes_horizon()
+
+    worker = call(
+        client,
+        "POST",
+        "/matricula",
+        {"name": "ventana", "version": "v1", "tasks": [{"name": "t", "version": "v1"}]},
+    )["id"]
+    changes = call(client, "GET", f"/changes?since={since}")
+    assert worker in [row["id"] for row in changes["workers"]]
+    assert changes["seq"] <= changes_horizon()
+
+    # las filas recientes se repiten hasta que salen de la ventana
+    again = call(client, "GET", f"/changes?since={changes['seq']}")
+    assert worker in [row["id"] for row in again["workers"]]
@@ -0,0 +1,131 @@
+"""El cliente envía las actualizaciones por lotes y lo pendiente al cerrarse.
+
+Los dos clientes (requests y httpx) hablan con la API de los tests a través
+de _post, que aquí llama al TestClient y apunta cada lote enviado.
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+from query_budget import call
+
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "client"),
+)
+
+from process_monitor_client import (  # noqa: E402
+    AsyncProcessMonitorClient,
+    ProcessMonitorClient,
+)
+
+
+def new_process(client, name, tasks):
+    worker = call(
+        client,
+        "POST",
+        "/matricula",
+        {
+            "name": name,
+            "version": "v1",
+            "tasks": [{"name": f"t{order}", "version": "v1"} for order in range(tasks)],
+        },
+    )["id"]
+    process = call(client, "POST", "/newprocess", {"id": worker})
+    return worker, [son["id"] for son in process["sons"]]
+
+
+def task_state(client, task_id):
+    return call(client, "GET", f"/dashboard_task/{task_id}")["state"]
+
+
+def route(client, batches):
+    """_post que envía a la API de los tests y guarda los lotes de /actualizar_tasks."""
+
+    def post(path, payload):
+        if path == "/actualizar_tasks":
+            batches.append([update["task_id"] for update in payload])
+        return call(client, "POST", path, payload)
+
+    return post
+
+
+def test_client_splits_updates_in_batches_and_flushes_on_close(app_client):
+    client, _ = app_client
+    _, tasks = new_process(client, "cliente_lotes", 3)
+
+    batches = []
+    monitor = ProcessMonitorClient("http://api", "token", batch_size=2)
+    monitor._post = route(client, batches)
+
+    for task_id in tasks:
+        monitor.update_task(task_id, "start")
+    assert batches == []  # update_task solo encola
+
+    monitor.close()
+
+    assert batches == [tasks[:2], tasks[2:]]
+    assert [task_state(client, task_id) for task_id in tasks] == ["running"] * 3
+
+
+def test_client_sends_a_full_batch_without_waiting(app_client):
+    client, _ = app_client
+    worker, tasks = new_process(client, "cliente_lleno", 2)
+
+    batches = []
+    monitor = ProcessMonitorClient(
+        "http://api", "token", batch_size=2, flush_interval=60, heartbeat_interval=60
+    )
+    monitor._post = route(client, batches)
+    monitor.worker_id = worker
+    monitor._start_background()
+
+    for task_id in tasks:
+        monitor.update_task(task_id, "start")
+
+    deadline = time.monotonic() + 5
+    while not batches and time.monotonic() < deadline:
+        time.sleep(0.01)
+    monitor.close()
+
+    assert batches == [tasks]
+
+
+def test_async_client_batches_and_flushes_on_close(app_client):
+    client, _ = app_client
+    worker, tasks = new_process(client, "cliente_async", 3)
+    batches = []
+    post = route(client, batches)
+
+    async def run():
+        monitor = AsyncProcessMonitorClient(
+            "http://api",
+            "token",
+            worker_id=worker,
+            batch_size=2,
+            flush_interval=60,
+            heartbeat_interval=60,
+        )
+
+        async def async_post(path, payload):
+            return post(path, payload)
+
+        monitor._post = async_post
+        async with monitor:
+            for task_id in tasks[:2]:
+                monitor.update_task(task_id, "start")
+            # el lote lleno sale en segundo plano; el resto al cerrar
+            for _ in range(500):
+                if batches:
+                    break
+                await asyncio.sleep(0.01)
+            assert batches == [tasks[:2]]
+            monitor.update_task(tasks[2], "start")
+
+    asyncio.run(run())
+
+    assert batches == [tasks[:2], tasks[2:]]
+    assert [task_state(client, task_id) for task_id in tasks] == ["running"] * 3
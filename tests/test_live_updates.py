@@ -0,0 +1,107 @@
+"""/stream no pierde eventos al reconectar ni los que se confirman tarde.
+
+Un cliente que reconecta con Last-Event-ID recibe todos los eventos guardados
+con un seq posterior, aunque sean más de un lote. Un sondeo que vuelve a
+arrancar empieza ahora, no donde se quedó el anterior, y un evento que se
+confirma después de otros con un seq mayor (o con un id mayor) se envía una
+sola vez.
+"""
+
+import asyncio
+import json
+
+
+class ClosedRequest:
+    """Petición cuyo cliente se desconecta en cuanto recibe lo pendiente."""
+
+    async def is_disconnected(self):
+        return True
+
+
+def add_events(count, process_id):
+    from DB.crud_change_events import create_change_event
+    from DB.structure import get_session
+
+    with get_session() as db:
+        for number in range(count):
+            create_change_event(
+                "task", str(number), {"order": number}, db, process_id=process_id
+            )
+        db.commit()
+
+
+async def read_stream(live, last_event_id, process_id):
+    chunks = [
+        chunk
+        async for chunk in live.stream(
+            ClosedRequest(), process_id=process_id, last_event_id=last_event_id
+        )
+    ]
+    live._task.cancel()
+    return chunks
+
+
+def test_reconnect_receives_every_event_after_last_event_id(app_client):
+    from DB.crud_changes import now_seq
+    from DB.structure import new_id
+    from live_updates import EVENTS_BATCH_SIZE, LiveUpdates
+
+    process_id = new_id("process")
+    last_event_id = now_seq() - 1
+    count = EVENTS_BATCH_SIZE * 2 + 20
+    add_events(count, process_id)  # una transacción: todos con el mismo seq
+
+    chunks = asyncio.run(read_stream(LiveUpdates(), str(last_event_id), process_id))
+
+    orders = [json.loads(chunk.split("data: ")[1])["row"]["order"] for chunk in chunks]
+    assert orders == list(range(count))
+    positions = {int(chunk.split("\n")[0][len("id: ") :]) for chunk in chunks}
+    assert max(positions) < now_seq()
+
+
+def test_poller_restarts_now(app_client):
+    from DB.crud_changes import changes_horizon
+    from DB.structure import new_id
+    from live_updates import LiveUpdates
+
+    live = LiveUpdates()
+    live.position = 0  # posición de un sondeo anterior, ya sin clientes
+    add_events(3, new_id("process"))
+
+    async def start_poller():
+        subscriber = live.subscribe()
+        await asyncio.sleep(0.1)
+        live.unsubscribe(subscriber)
+        live._task.cancel()
+        return subscriber.queue.qsize()
+
+    before = changes_horizon()
+    assert asyncio.run(start_poller()) == 0
+    assert live.position >= before
+
+
+def test_late_commit_is_published_once(app_client, monkeypatch):
+    from DB import crud_changes
+    from DB.structure import new_id
+    from live_updates import LiveUpdates
+
+    live = LiveUpdates()
+    live._start()
+    process_id = new_id("process")
+    late_seq = crud_changes.now_seq()  # la transacción tardía toma su seq
+
+    async def poll_around_late_commit():
+        subscriber = live.subscribe(process_id=process_id)
+        live._task.cancel()  # los sondeos se hacen a mano
+
+        add_events(1, process_id)  # otra con un seq mayor confirma antes
+        await live.poll()
+        monkeypatch.setattr(crud_changes, "now_seq", lambda: late_seq)
+        add_events(1, process_id)  # y la tardía confirma después
+        monkeypatch.undo()
+        await live.poll()
+        await live.poll()
+        return [subscriber.queue.get_nowait() for _ in range(subscriber.queue.qsize())]
+
+    events = asyncio.run(poll_around_late_commit())
+    assert [event["seq"] > late_seq for event in events] == [True, False]
@@ -0,0 +1,210 @@
+"""Una base de datos con el esquema original (antes de las migraciones) se
+actualiza a la versión actual al arrancar la aplicación.
+
+La aplicación crea el engine y migra al importar DB.structure, así que cada
+comprobación se ejecuta en un proceso aparte con su propio SQLITE_PATH.
+"""
+
+import os
+import sqlite3
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+
+WORKER = "worker_86e2204a-caf5-11f1-9813-02fc00000001"
+FINISHED = "process_b8106412-a16b-4655-8bd9-beb3a45e6b9a"
+RUNNING = "process_5847b335-5188-42c9-9236-c02ee96e966d"
+FAILED_TASK = "task_b20e9ce7-413d-4ec5-a456-d5eb33b9cf9c"
+
+# esquema y datos de la versión original con DB_ENGINE=sqlite
+BASELINE = f"""
+CREATE TABLE workers (
+    id VARCHAR NOT NULL,
+    nombre VARCHAR,
+    version VARCHAR,
+    last_healthcheker DATETIME,
+    datetime DATETIME,
+    tasks JSON,
+    PRIMARY KEY (id)
+);
+CREATE INDEX ix_workers_id ON workers (id);
+CREATE TABLE processes (
+    father VARCHAR NOT NULL,
+    process VARCHAR,
+    created DATETIME,
+    finished DATETIME,
+    status VARCHAR,
+    error VARCHAR,
+    PRIMARY KEY (father),
+    FOREIGN KEY(process) REFERENCES workers (id)
+);
+CREATE TABLE history_tasks (
+    uuid VARCHAR NOT NULL,
+    name VARCHAR,
+    status VARCHAR,
+    "order" INTEGER,
+    version VARCHAR,
+    "create" DATETIME,
+    started DATETIME,
+    "update" DATETIME,
+    details VARCHAR,
+    father VARCHAR,
+    PRIMARY KEY (uuid),
+    FOREIGN KEY(father) REFERENCES processes (father)
+);
+INSERT INTO workers VALUES (
+    '{WORKER}', 'w', '1', '2026-10-18 13:12:10.396087', '2026-10-18 13:12:10.396087',
+    '[{{"name": "t0", "version": "1", "order": 1}}, {{"name": "t1", "version": "1", "order": 2}}]'
+);
+INSERT INTO processes VALUES
+    ('{FINISHED}', '{WORKER}', '2026-10-18 13:12:10.405215', '2026-10-18 13:12:10.419258',
+     'error', 'fallo del proceso'),
+    ('{RUNNING}', '{WORKER}', '2026-10-18 13:12:10.422865', NULL, 'running', NULL);
+INSERT INTO history_tasks VALUES
+    ('{FAILED_TASK}', 't0', 'error', 1, '1', '2026-10-18 13:12:10.408567',
+     '2026-10-18 13:12:10.413818', '2026-10-18 13:12:10.416975', 'boom', '{FINISHED}'),
+    ('task_d0c65be5-5e16-45ea-9ed3-f363a34d3c6c', 't1', 'pending', 2, '1',
+     '2026-10-18 13:12:10.412060', NULL, NULL, NULL, '{FINISHED}'),
+    ('task_9ac4657a-662d-4622-9374-b7e6574fe6b8', 't0', 'pending', 1, '1',
+     '2026-10-18 13:12:10.424432', NULL, NULL, NULL, '{RUNNING}'),
+    ('task_060b9601-3630-4c2b-960f-3168428dd15c', 't1', 'pending', 2, '1',
+     '2026-10-18 13:12:10.425921', NULL, NULL, NULL, '{RUNNING}');
+"""
+
+CHECK = textwrap.dedent(
+    f"""
+    import sys
+    sys.path.insert(0, ".")
+
+    from sqlalchemy import inspect
+    from DB.structure import Base, engine
+    from DB.migrations import MIGRATIONS, applied_migrations
+    from DB import db_control
+
+    assert applied_migrations(engine) == {{v for v, _, _ in MIGRATIONS}}
+
+    # mismas columnas e índices que una base de datos creada desde cero
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        columns = {{c["name"] for c in inspector.get_columns(table.name)}}
+        assert columns == {{c.name for c in table.columns}}, table.name
+        indexes = {{i["name"] for i in inspector.get_indexes(table.name)}}
+        assert {{i.name for i in table.indexes}} <= indexes, table.name
+
+    [worker] = db_control.db_dashboard_workers()
+    assert worker["id"] == "{WORKER}", worker
+    assert (worker["processed"], worker["active"], worker["failed"]) == (2, 1, 1)
+
+    tasks, _ = db_control.db_dashboard_tasks("{FINISHED}")
+    assert [t["state"] for t in tasks] == ["error", "pending"], tasks
+    assert db_control.get_task_details("{FAILED_TASK}") == "boom"
+
+    processes, _ = db_control.db_dashboard_process("{WORKER}")
+    assert {{p["id"] for p in processes}} == {{"{FINISHED}", "{RUNNING}"}}
+    """
+)
+
+
+# SQLite no comprueba que una clave foránea y la columna a la que apunta tengan
+# el mismo tipo; MariaDB sí (errno 150). Con FOREIGN_KEYS la comprobación
+# activa las claves foráneas y falla si se crea una tabla cuya clave foránea
+# apunta a una columna que en la base de datos sigue siendo texto
+FOREIGN_KEYS = textwrap.dedent(
+    """
+    from sqlalchemy import Table, event, inspect
+    from sqlalchemy.pool import Pool
+
+
+    @event.listens_for(Pool, "connect")
+    def _enable_foreign_keys(dbapi_connection, connection_record):
+        dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+
+    @event.listens_for(Table, "before_create")
+    def _check_foreign_key_types(table, connection, **kw):
+        inspector = inspect(connection)
+        for fk in table.foreign_keys:
+            target = fk.column.table.name
+            if not inspector.has_table(target):
+                continue
+            types = {c["name"]: c["type"] for c in inspector.get_columns(target)}
+            assert "CHAR" not in str(types[fk.column.name]), (table.name, fk.target_fullname)
+    """
+)
+
+
+@pytest.mark.parametrize("prelude", ["", FOREIGN_KEYS], ids=["default", "foreign_keys"])
+def test_baseline_schema_upgrades_to_head(tmp_path, prelude):
+    database = tmp_path / "baseline.db"
+    with sqlite3.connect(database) as conn:
+        conn.executescript(BASELINE)
+
+    env = {**os.environ, "DB_ENGINE": "sqlite", "SQLITE_PATH": str(database)}
+    result = subprocess.run(
+        [sys.executable, "-c", prelude + CHECK],
+        cwd=APP,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+
+
+# la primera ejecución se corta dentro de la 0006 después de borrar las copias
+# <tabla>_pre_0006 y antes de recalcular los contadores (en MySQL/MariaDB los
+# DROP ya han hecho commit): los contadores quedan sin calcular y la 0006 sin
+# registrar
+INTERRUPTED = textwrap.dedent(
+    """
+    import sys
+    sys.path.insert(0, ".")
+
+    from unittest import mock
+    from DB import migrations
+
+    version, description, binary_ids = migrations.MIGRATIONS[5]
+    assert version == 6
+
+
+    def interrupted(conn, metadata):
+        with mock.patch("DB.crud_process.rebuild_process_summaries"), mock.patch(
+            "DB.crud_worker_summary.rebuild_worker_summaries"
+        ):
+            binary_ids(conn, metadata)
+
+
+    migrations.MIGRATIONS[5] = (version, description, interrupted)
+
+    from sqlalchemy import delete
+    from DB.structure import engine
+
+    with engine.begin() as conn:
+        conn.execute(
+            delete(migrations.schema_migrations).where(
+                migrations.schema_migrations.c.version == 6
+            )
+        )
+    """
+)
+
+
+def test_interrupted_binary_ids_migration_resumes(tmp_path):
+    database = tmp_path / "baseline.db"
+    with sqlite3.connect(database) as conn:
+        conn.executescript(BASELINE)
+
+    env = {**os.environ, "DB_ENGINE": "sqlite", "SQLITE_PATH": str(database)}
+    for script in [INTERRUPTED, CHECK]:
+        result = subprocess.run(
+            [sys.executable, "-c", script],
+            cwd=APP,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        assert result.returncode == 0, result.stderr
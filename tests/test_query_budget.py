@@ -0,0 +1,16 @@
+"""Los endpoints no pasan del presupuesto de consultas de benchmarks/query_budget.py.
+
+Usa las mismas funciones que el script: siembra la base de datos temporal
+(ver conftest.py) con dos tamaños y falla si algún endpoint hace más
+consultas con más datos o más de las de BUDGETS.
+"""
+
+import query_budget
+
+
+def test_endpoints_stay_within_query_budget(app_client):
+    client, dashboard_cache = app_client
+    results = query_budget.measure_sizes(client, dashboard_cache, [2, 5])
+
+    assert set(query_budget.BUDGETS) <= set(results[0][1])
+    assert query_budget.budget_failures(results) == []
@@ -0,0 +1,28 @@
+"""Los contadores recalculados con `manage.py rebuild-summaries` salen en /changes.
+
+Todas las filas recalculadas llevan un seq nuevo, así los clientes de /changes
+y las versiones de los dashboards ven los contadores corregidos.
+"""
+
+from query_budget import call
+
+
+def test_rebuild_stamps_workers_and_processes(app_client):
+    from DB.db_control import db_rebuild_summaries
+
+    client, _ = app_client
+    worker = call(
+        client,
+        "POST",
+        "/matricula",
+        {"name": "rebuild", "version": "v1", "tasks": [{"name": "t", "version": "v1"}]},
+    )["id"]
+    process = call(client, "POST", "/newprocess", {"id": worker})["father"]
+    since = call(client, "GET", "/changes")["seq"]
+
+    db_rebuild_summaries()
+
+    changes = call(client, "GET", f"/changes?since={since}")
+    assert changes["seq"] > since
+    assert worker in [row["id"] for row in changes["workers"]]
+    assert process in [row["id"] for row in changes["processes"]]
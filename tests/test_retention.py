@@ -0,0 +1,63 @@
+"""La retención mueve los procesos con sus tareas, detalles y errores.
+
+task_details y process_errors de un proceso archivado pasan a sus tablas de
+archivo en el mismo lote; /dashboard_task/{id}?history=true sigue devolviendo
+los detalles de una tarea archivada.
+"""
+
+from sqlalchemy import select
+
+from query_budget import call
+
+
+def test_archive_moves_details_and_errors(app_client):
+    from DB.retention import archive_finished_processes
+    from DB.structure import (
+        ProcessError,
+        TaskDetail,
+        get_session,
+        process_errors_archive,
+        task_details_archive,
+    )
+
+    client, _ = app_client
+    worker = call(
+        client,
+        "POST",
+        "/matricula",
+        {
+            "name": "retencion",
+            "version": "v1",
+            "tasks": [{"name": "t", "version": "v1"}],
+        },
+    )["id"]
+
+    old = call(client, "POST", "/newprocess", {"id": worker})
+    task = old["sons"][0]["id"]
+    call(
+        client,
+        "POST",
+        "/actualizar_task",
+        {"task_id": task, "status": "error", "details": "detalle archivado"},
+    )
+    call(client, "POST", "/endprocess", {"id": old["father"], "details": "fallo largo"})
+
+    recent = call(client, "POST", "/newprocess", {"id": worker})
+    call(client, "POST", "/endprocess", {"id": recent["father"]})
+
+    archive_finished_processes(keep_per_worker=1, pause=0)
+
+    with get_session() as db:
+        assert db.get(TaskDetail, task) is None
+        assert db.get(ProcessError, old["father"]) is None
+        archived_details = select(task_details_archive.c.details).where(
+            task_details_archive.c.uuid == task
+        )
+        assert db.execute(archived_details).scalar() == "detalle archivado"
+        archived_error = select(process_errors_archive.c.error).where(
+            process_errors_archive.c.father == old["father"]
+        )
+        assert db.execute(archived_error).scalar() == "fallo largo"
+
+    archived = call(client, "GET", f"/dashboard_task/{task}?history=true")
+    assert archived["details"] == "detalle archivado"
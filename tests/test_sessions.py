@@ -0,0 +1,49 @@
+"""Cada petición a un dashboard saca una sola conexión del pool.
+
+La versión (ETag) y los datos se leen en la misma llamada a la sesión de la
+petición (db_dashboard_response), también cuando la caché está vacía.
+"""
+
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+
+from query_budget import call
+
+
+def checkouts(client, path, headers=None):
+    counted = []
+
+    def count(dbapi_connection, connection_record, connection_proxy):
+        counted.append(connection_record)
+
+    event.listen(Pool, "checkout", count)
+    try:
+        response = client.get(path, headers=headers or {})
+    finally:
+        event.remove(Pool, "checkout", count)
+    return response, len(counted)
+
+
+def test_dashboard_requests_check_out_one_connection(app_client):
+    client, dashboard_cache = app_client
+    worker = call(
+        client,
+        "POST",
+        "/matricula",
+        {"name": "sesion", "version": "v1", "tasks": [{"name": "t", "version": "v1"}]},
+    )["id"]
+    process = call(client, "POST", "/newprocess", {"id": worker})["father"]
+
+    for path in [
+        "/dashboard_workers",
+        f"/dashboard_process/{worker}",
+        f"/dashboard_tasks/{process}",
+    ]:
+        dashboard_cache.entries.clear()
+        response, count = checkouts(client, path)
+        assert (response.status_code, count) == (200, 1), path
+
+        # con el ETag del cliente solo se lee la versión: 304 con la misma conexión
+        etag = {"If-None-Match": response.headers["ETag"]}
+        response, count = checkouts(client, path, etag)
+        assert (response.status_code, count) == (304, 1), path
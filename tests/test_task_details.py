@@ -0,0 +1,39 @@
+"""Las listas de tareas no llevan details; solo has_details.
+
+Los dashboards piden los detalles con /dashboard_task/{id} al seleccionar una
+tarea que los tiene.
+"""
+
+from query_budget import call
+
+
+def test_task_list_has_flag_and_single_task_has_details(app_client):
+    client, _ = app_client
+    worker = call(
+        client,
+        "POST",
+        "/matricula",
+        {
+            "name": "detalles",
+            "version": "v1",
+            "tasks": [{"name": f"t{order}", "version": "v1"} for order in range(2)],
+        },
+    )["id"]
+    process = call(client, "POST", "/newprocess", {"id": worker})
+    with_details, without_details = [son["id"] for son in process["sons"]]
+    call(
+        client,
+        "POST",
+        "/actualizar_task",
+        {"task_id": with_details, "status": "error", "details": "traza"},
+    )
+
+    tasks = call(client, "GET", f"/dashboard_tasks/{process['father']}")
+    assert all("details" not in task for task in tasks)
+    assert {task["id"]: task["has_details"] for task in tasks} == {
+        with_details: True,
+        without_details: False,
+    }
+
+    assert call(client, "GET", f"/dashboard_task/{with_details}")["details"] == "traza"
+    assert call(client, "GET", f"/dashboard_task/{without_details}")["details"] is None
@@ -0,0 +1,91 @@
+"""La duración de una tarea es la del worker aunque el cliente envíe por lotes.
+
+El cliente guarda las actualizaciones y las envía juntas; cada una lleva la
+hora a la que ocurrió (at), y la API la usa para started/update, las series
+de /stats/timeseries y los cuantiles de /stats/percentiles.
+"""
+
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from query_budget import call
+
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "client"),
+)
+
+from process_monitor_client import ProcessMonitorClient  # noqa: E402
+
+
+def new_task(client, name):
+    worker = call(
+        client,
+        "POST",
+        "/matricula",
+        {"name": name, "version": "v1", "tasks": [{"name": name, "version": "v1"}]},
+    )["id"]
+    process = call(client, "POST", "/newprocess", {"id": worker})
+    return worker, process["sons"][0]["id"]
+
+
+def task_p50(client, name):
+    [stats] = call(client, "GET", f"/stats/percentiles?name={name}&by=name")
+    return stats["p50"]
+
+
+def test_batched_start_and_finish_keep_their_duration(app_client):
+    client, _ = app_client
+    _, task_id = new_task(client, "tarea_lote")
+
+    # las dos horas quedan entre la creación de la tarea y la hora del servidor
+    start = datetime.now(timezone.utc)
+    finish = start + timedelta(seconds=0.8)
+    time.sleep(0.85)
+    updates = [
+        {"task_id": task_id, "status": "start", "at": start.isoformat()},
+        {"task_id": task_id, "status": "success", "at": finish.isoformat()},
+    ]
+    results = call(client, "POST", "/actualizar_tasks", updates)
+
+    assert [result["status"] for result in results] == ["ok", "ok"]
+    # error relativo del sketch: 1 %
+    assert abs(task_p50(client, "tarea_lote") - 0.8) <= 0.8 * 0.011
+
+
+def test_change_time_is_never_after_the_server_clock(app_client):
+    client, _ = app_client
+    _, task_id = new_task(client, "tarea_futura")
+
+    future = datetime.now(timezone.utc) + timedelta(hours=1)
+    call(
+        client,
+        "POST",
+        "/actualizar_task",
+        {"task_id": task_id, "status": "start", "at": future.isoformat()},
+    )
+
+    task = call(client, "GET", f"/dashboard_task/{task_id}")
+    assert datetime.fromisoformat(task["started"]) <= datetime.now()
+
+
+def test_client_stamps_buffered_updates(app_client, monkeypatch):
+    client, _ = app_client
+    worker, task_id = new_task(client, "tarea_cliente")
+
+    monitor = ProcessMonitorClient("http://api", "token")
+    monitor.worker_id = worker
+    monkeypatch.setattr(
+        monitor, "_post", lambda path, payload: call(client, "POST", path, payload)
+    )
+
+    monitor.update_task(task_id, "start")
+    time.sleep(0.3)
+    monitor.update_task(task_id, "success")
+    monitor.flush()  # los dos cambios en el mismo lote
+    monitor.session.close()
+
+    assert 0.29 <= task_p50(client, "tarea_cliente") < 0.5